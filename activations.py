@@ -0,0 +1,323 @@
+"""Intermediate activations of the MNIST models, recorded with forward hooks.
+
+A model lists the layers it exposes in ACTIVATION_LAYERS as (name, module
+attribute, call index) triples, since SimpleNN and SimpleCNN reuse their
+relu and pool modules. Models without the attribute expose the first call
+of each of their leaf modules. The hooks are installed once per model and
+record only while extract_activations runs in the current thread, so
+concurrent forward passes never see each other's layers. TorchScript
+graphs cannot run Python hooks: trace_layers() records the layers once,
+while tracing, and the graph returns them next to the logits.
+
+Requests choose the layers, a channel (or neuron) range, a spatial
+downsample or a per-map summary, and the encoding of the values: layers
+that are not requested are never copied, sliced or converted.
+
+torch and numpy are imported by the functions using them: the options and
+hook helpers can be imported without loading torch.
+"""
+
+import base64
+import threading
+import warnings
+
+# "json" (nested lists) or compact typed arrays, base64 in the JSON
+# response: "f32", "f16" or "u8" (quantized)
+ACTIVATION_ENCODINGS = ("json", "f32", "f16", "u8")
+
+# Spatial downsample factors accepted (1 keeps the full resolution)
+MAX_DOWNSAMPLE = 28
+
+_recording = threading.local()
+
+
+# ============================================================================
+# OPTIONS
+# ============================================================================
+
+class ActivationOptions:
+    """Which activations a request wants and in what form.
+
+    layers: layer names to return ("input" included), None for all of them;
+    "output" (the probabilities) is always returned.
+    channels: (start, end) range kept on axis 1 of every hooked layer
+    (feature maps or neurons), or {layer name: (start, end)}.
+    downsample: average pooling factor applied to feature maps.
+    summary: per-map min/max/mean instead of the feature map values.
+    encoding: one of ACTIVATION_ENCODINGS.
+    """
+
+    def __init__(self, layers=None, channels=None, downsample=1, summary=False,
+                 encoding="json"):
+        self.layers = None if layers is None else tuple(layers)
+        self.channels = channels
+        self.downsample = downsample
+        self.summary = summary
+        self.encoding = encoding
+
+    @classmethod
+    def from_request(cls, data):
+        """Options from a request body; raises ValueError on invalid values."""
+        layers = data.get("layers")
+        if layers is not None:
+            if not isinstance(layers, list) or not all(isinstance(n, str) for n in layers):
+                raise ValueError("layers")
+
+        channels = data.get("channels")
+        if isinstance(channels, dict):
+            channels = {name: _channel_range(value) for name, value in channels.items()}
+        elif channels is not None:
+            channels = _channel_range(channels)
+
+        downsample = data.get("downsample", 1)
+        if (not isinstance(downsample, int) or isinstance(downsample, bool)
+                or not 1 <= downsample <= MAX_DOWNSAMPLE):
+            raise ValueError("downsample")
+
+        encoding = data.get("encoding", "json")
+        if encoding not in ACTIVATION_ENCODINGS:
+            raise ValueError("encoding")
+
+        return cls(layers, channels, downsample, bool(data.get("summary", False)), encoding)
+
+    def key(self):
+        """Hashable form: requests with equal keys share a forward pass."""
+        channels = self.channels
+        if isinstance(channels, dict):
+            channels = tuple(sorted(channels.items()))
+        return (self.layers, channels, self.downsample, self.summary, self.encoding)
+
+    def wants(self, name):
+        return self.layers is None or name == "output" or name in self.layers
+
+    def channel_range(self, name):
+        if isinstance(self.channels, dict):
+            return self.channels.get(name)
+        return self.channels
+
+    def reduce(self, name, output):
+        """Keep the requested part of one layer's (N, ...) output."""
+        import torch.nn.functional as F
+        channels = self.channel_range(name)
+        if channels is not None:
+            output = output[:, channels[0]:channels[1]]
+        if output.dim() != 4:
+            return output
+        if self.summary:
+            maps = output.flatten(2)
+            return {
+                "shape": list(output.shape[1:]),
+                "min": maps.amin(dim=2),
+                "max": maps.amax(dim=2),
+                "mean": maps.mean(dim=2),
+            }
+        if self.downsample > 1:
+            output = F.avg_pool2d(output, self.downsample, ceil_mode=True)
+        return output
+
+
+def _channel_range(value):
+    if (not isinstance(value, list) or len(value) != 2
+            or not all(isinstance(v, int) and not isinstance(v, bool) for v in value)
+            or not 0 <= value[0] < value[1]):
+        raise ValueError("channels")
+    return tuple(value)
+
+
+# ============================================================================
+# HOOKS
+# ============================================================================
+
+def activation_layers(model):
+    """(name, module attribute, call index) of the layers a model exposes."""
+    layers = getattr(model, "ACTIVATION_LAYERS", None)
+    if layers is None:
+        layers = [(name, name, 0) for name, module in model.named_children()
+                  if not list(module.children())]
+    return layers
+
+
+def layer_names(model):
+    """Names accepted in ActivationOptions.layers for this model."""
+    return ["input"] + [name for name, _, _ in activation_layers(model)] + ["output"]
+
+
+def install_hooks(model):
+    """Register the recording hooks of a model (once).
+
+    Models with a forward_layers() method return their layers themselves
+    and get no hooks.
+    """
+    if hasattr(model, "forward_layers") or getattr(model, "_activation_hooks", None) is not None:
+        return
+    names_by_module = {}  # attribute -> {call index: layer name}
+    for name, attribute, index in activation_layers(model):
+        names_by_module.setdefault(attribute, {})[index] = name
+    model._activation_hooks = [
+        getattr(model, attribute).register_forward_hook(_make_hook(attribute, names))
+        for attribute, names in names_by_module.items()
+    ]
+
+
+def _make_hook(attribute, names):
+    def hook(module, inputs, output):
+        recorder = getattr(_recording, "recorder", None)
+        if recorder is not None:
+            recorder.record(attribute, names, output)
+    return hook
+
+
+class _Recorder:
+    """Outputs of the requested layers during one forward pass."""
+
+    def __init__(self, options):
+        self.options = options
+        self.calls = {}  # attribute -> calls seen so far
+        self.outputs = {}
+
+    def record(self, attribute, names, output):
+        index = self.calls.get(attribute, 0)
+        self.calls[attribute] = index + 1
+        name = names.get(index)
+        if name is not None and self.options.wants(name):
+            self.outputs[name] = self.options.reduce(name, output)
+
+
+def record_layers(model, x, options):
+    """(logits, {layer name: reduced output}) of one forward pass."""
+    if hasattr(model, "forward_layers"):
+        logits, outputs = model.forward_layers(x)
+        return logits, {name: options.reduce(name, output)
+                        for name, output in outputs.items() if options.wants(name)}
+
+    install_hooks(model)
+    recorder = _Recorder(options)
+    _recording.recorder = recorder
+    try:
+        logits = model(x)
+    finally:
+        _recording.recorder = None
+    return logits, recorder.outputs
+
+
+def trace_layers(model, example):
+    """Frozen TorchScript graph of model returning (logits, *layer outputs),
+    the layers in activation_layers() order, unreduced."""
+    import torch
+    install_hooks(model)
+    names = [name for name, _, _ in activation_layers(model)]
+    everything = ActivationOptions()
+
+    class LayerOutputs(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.model = model
+
+        def forward(self, x):
+            logits, outputs = record_layers(self.model, x, everything)
+            return (logits,) + tuple(outputs[name] for name in names)
+
+    # Both calls warn that TorchScript is deprecated (see inference.py)
+    with torch.no_grad(), warnings.catch_warnings():
+        warnings.filterwarnings("ignore", category=FutureWarning, module=r"torch\.jit\.")
+        graph = torch.jit.trace(LayerOutputs().eval(), example)
+        return torch.jit.freeze(graph)
+
+
+# ============================================================================
+# EXTRACTION
+# ============================================================================
+
+def extract_activations(model, images, options):
+    """Forward a (N, 28, 28) batch through model, recording activations.
+
+    Returns (predictions, activations), one activations dict per image in
+    layer order: input, the model's layers, output.
+    """
+    import torch.nn.functional as F
+    logits, outputs = record_layers(model, images.unsqueeze(1), options)
+    probs = F.softmax(logits, dim=1)
+
+    layers = {}
+    if options.wants("input"):
+        layers["input"] = images
+    for name, _, _ in activation_layers(model):
+        if name in outputs:
+            layers[name] = outputs[name]
+    layers["output"] = probs
+
+    predictions = probs.argmax(dim=1).tolist()
+    return predictions, split_activations(layers, options.encoding)
+
+
+# ============================================================================
+# SERIALIZATION
+# ============================================================================
+
+def feature_maps(x):
+    """Per-sample {"shape", "maps"} dicts of a (N, C, H, W) batch."""
+    shape = list(x.shape[1:])
+    return [{"shape": shape, "maps": maps} for maps in x.tolist()]
+
+
+def map_summaries(summary):
+    """Per-sample {"shape", "min", "max", "mean"} dicts of a batch summary."""
+    stats = {stat: summary[stat].tolist() for stat in ("min", "max", "mean")}
+    return [{"shape": summary["shape"], **{stat: values[i] for stat, values in stats.items()}}
+            for i in range(len(stats["min"]))]
+
+
+def encode_array(values, encoding):
+    """Compact form of one activation tensor.
+
+    Returns {"dtype", "shape", "data"} with data the little-endian bytes in
+    base64, viewable as a typed array by the client. "u8" maps each feature
+    map (or the whole tensor below 3 dimensions) linearly onto 0..255:
+    value = min + q * scale, with "min" and "scale" given per map.
+    """
+    import numpy as np
+    array = values.numpy()
+    entry = {"shape": list(array.shape)}
+    if encoding == "u8":
+        rows = array.reshape(len(array), -1) if array.ndim == 3 else array.reshape(1, -1)
+        low = rows.min(axis=1, keepdims=True)
+        scale = (rows.max(axis=1, keepdims=True) - low) / 255
+        scale[scale == 0] = 1.0
+        data = np.rint((rows - low) / scale).astype(np.uint8)
+        entry["dtype"] = "uint8"
+        if array.ndim == 3:
+            entry["min"] = low.ravel().tolist()
+            entry["scale"] = scale.ravel().tolist()
+        else:
+            entry["min"] = float(low[0, 0])
+            entry["scale"] = float(scale[0, 0])
+    elif encoding == "f16":
+        data = array.astype("<f2")
+        entry["dtype"] = "float16"
+    else:
+        data = array.astype("<f4")
+        entry["dtype"] = "float32"
+    entry["data"] = base64.b64encode(data.tobytes()).decode("ascii")
+    return entry
+
+
+def split_activations(layers, encoding="json"):
+    """One activations dict per image from batched layer tensors.
+
+    "output" (the probabilities) and map summaries always stay lists of
+    floats.
+    """
+    count = len(layers["output"])
+    converted = {}
+    for name, values in layers.items():
+        if isinstance(values, dict):
+            converted[name] = map_summaries(values)
+        elif encoding != "json" and name != "output":
+            converted[name] = [encode_array(values[i], encoding) for i in range(count)]
+        elif values.dim() == 4:
+            converted[name] = feature_maps(values)
+        else:
+            # One tolist() per layer, then split per image
+            converted[name] = values.tolist()
+    return [{name: values[i] for name, values in converted.items()}
+            for i in range(count)]
@@ -1,122 +1,308 @@
 """Flask backend for MNIST Neural Network Visualizer."""
 
+import time
+
+_import_start = time.perf_counter()
+
+import atexit
+import hashlib
 import json
+import os
 import random
-import numpy as np
-import torch
-import torch.nn.functional as F
+import threading
+import uuid
+from collections import OrderedDict
 import chess
-from flask import Flask, jsonify, request, send_from_directory
-from torchvision import datasets, transforms
-
-from train import SimpleNN, SimpleCNN
+from flask import Flask, Response, jsonify, request, send_from_directory
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from micro_batching import MicroBatcher
+from chess_jobs import ChessJobQueue, JobFailed, JobRejected
+from chess_store import ChessStore
+from response_cache import ResponseCache
+from activations import ActivationOptions, extract_activations, install_hooks, layer_names
+from inference import build_backend
 from chess_engine import (
     DEFAULT_EVAL_CODE, board_to_array, get_legal_moves_uci,
-    get_game_status, find_best_move, compile_user_eval, execute_eval,
+    get_game_status, get_compiled_eval, execute_eval, is_default_eval,
+    eval_code_hash, default_quiescence, TranspositionTable,
 )
 
 app = Flask(__name__, static_folder="static")
 
-# --------------- Load models ---------------
+# Reverse proxies in front of the app: their X-Forwarded-For header gives
+# the client address used for the per-client job limit
+PROXY_COUNT = int(os.environ.get("PROXY_COUNT", "0"))
+if PROXY_COUNT:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_COUNT)
+
+# "inline", "thread" or "sandbox" (see chess_engine.find_best_move)
+CHESS_EVAL_MODE = os.environ.get("CHESS_EVAL_MODE", "inline")
+# Processes splitting the root moves of a search: the default, and the most
+# a request may ask for (the size of each worker's search process pool)
+CHESS_SEARCH_WORKERS = int(os.environ.get("CHESS_SEARCH_WORKERS", "1"))
+# Play book moves, forced moves and mates in one without searching
+CHESS_SHORTCUTS = os.environ.get("CHESS_SHORTCUTS", "1") == "1"
+# Optional Polyglot opening book used by the shortcuts
+CHESS_BOOK_PATH = os.environ.get("CHESS_BOOK_PATH") or None
+
+# Recent search trees kept so clients can fetch subtrees on demand: in the
+# store shared by the workers, the most recent ones also in this worker
+MAX_STORED_TREES = 32
+MAX_LOCAL_TREES = 4
+search_trees = OrderedDict()
+search_trees_lock = threading.Lock()
+# Background search jobs (see chess_jobs.py): "process" runs each search in
+# a separate process, "thread" in a runner thread of the web worker
+CHESS_JOB_MODE = os.environ.get("CHESS_JOB_MODE", "process")
+# Searches running at once per web worker
+CHESS_JOB_WORKERS = int(os.environ.get("CHESS_JOB_WORKERS", "1"))
+# Searches waiting for a runner before new ones are refused (429)
+CHESS_JOB_QUEUE = int(os.environ.get("CHESS_JOB_QUEUE", "16"))
+# Searches a client may have queued or running at once
+CHESS_JOBS_PER_CLIENT = int(os.environ.get("CHESS_JOBS_PER_CLIENT", "2"))
+# Seconds a finished job stays available for polling
+CHESS_JOB_TTL = int(os.environ.get("CHESS_JOB_TTL", "300"))
+# Seconds a search without time_ms may run before its process is killed
+CHESS_JOB_MAX_SECONDS = int(os.environ.get("CHESS_JOB_MAX_SECONDS", "60"))
+# Job records shared by the web workers (see chess_store.py); created when
+# the app is imported, i.e. once in the gunicorn master
+chess_store = ChessStore(os.environ.get("CHESS_STATE_DB") or None)
+atexit.register(chess_store.remove)
+chess_jobs = ChessJobQueue(chess_store, CHESS_JOB_WORKERS, CHESS_JOB_MODE, CHESS_JOB_QUEUE,
+                           CHESS_JOBS_PER_CLIENT, CHESS_JOB_TTL, CHESS_JOB_MAX_SECONDS)
+# Requests waiting for their search in the request thread (/api/chess/move
+# and its stream) at once per worker: fewer than the worker's threads, so
+# polls and predictions always find a free thread
+CHESS_BLOCKING_REQUESTS = int(os.environ.get(
+    "CHESS_BLOCKING_REQUESTS", max(0, int(os.environ.get("WEB_THREADS", "2")) - 1)))
+blocking_searches = threading.BoundedSemaphore(CHESS_BLOCKING_REQUESTS or 1)
+SESSION_CONFLICT = "Partie modifiee par une autre requete"
+
+# Server-side games: board with its history, transposition table and PV
+# kept between moves. Idle games expire; the least recently used ones are
+# dropped past the memory budget.
+CHESS_SESSION_TTL = int(os.environ.get("CHESS_SESSION_TTL", "1800"))
+CHESS_SESSION_MEMORY_MB = int(os.environ.get("CHESS_SESSION_MEMORY_MB", "256"))
+MAX_GAME_SESSIONS = 1024
+# Approximate memory of one played move (move stack entry and board state)
+SESSION_MOVE_BYTES = 300
+game_sessions = OrderedDict()  # game_id -> session, least recently used first
+game_sessions_lock = threading.Lock()
+
+# --------------- Lazy loading ---------------
+
+# torch, the models and the MNIST test set load on first use (or in
+# warm_up()), so chess-only and static-only workers never import torch.
+_components = {}
+_components_lock = threading.RLock()
+startup_times = {}  # component -> seconds spent loading it
+
+# Inference backend of the MNIST models: "eager", "int8" or "torchscript"
+# (see inference.py)
+MNIST_BACKEND = os.environ.get("MNIST_BACKEND", "eager")
+
+
+def load_component(name, loader):
+    """loader() once across threads, timed and logged."""
+    component = _components.get(name)
+    if component is not None:
+        return component
+    with _components_lock:
+        if name not in _components:
+            start = time.perf_counter()
+            _components[name] = loader()
+            elapsed = time.perf_counter() - start
+            startup_times[name] = round(elapsed, 3)
+            print(f"Loaded {name} in {elapsed * 1000:.0f} ms")
+        return _components[name]
+
+
+def _import_torch():
+    import torch
+    return torch
+
+
+def get_torch():
+    """The torch module, imported on first use."""
+    return load_component("torch", _import_torch)
+
+
+def _load_model(model_type):
+    import torch
+    from train import SimpleNN, SimpleCNN
+
+    if model_type == "cnn":
+        model, path = SimpleCNN(), "models/cnn_model.pth"
+    else:
+        model, path = SimpleNN(), "models/nn_model.pth"
+    model.load_state_dict(torch.load(path, weights_only=True))
+    model.eval()
+    model = build_backend(model, MNIST_BACKEND)
+    install_hooks(model)
+    return model
+
+
+def get_model(model_type):
+    """The trained NN or CNN, loaded on first use."""
+    name = "cnn_model" if model_type == "cnn" else "nn_model"
+    model = _components.get(name)
+    if model is None:
+        get_torch()
+        model = load_component(name, lambda: _load_model(model_type))
+    return model
+
+
+def get_test_samples():
+    """Memory-mapped (N, 785) uint8 MNIST test set (see mnist_samples.py)."""
+    from mnist_samples import open_samples
+    return load_component("test_samples", open_samples)
+
+
+def load_mnist():
+    """Load torch, both models and the test set, without running them.
+
+    Called by the gunicorn master before forking (see gunicorn.conf.py):
+    the workers then share these pages copy-on-write.
+    """
+    get_torch()
+    get_model("nn")
+    get_model("cnn")
+    get_test_samples()
+
+
+def warm_up():
+    """Load everything the MNIST endpoints use and run one forward pass per
+    model, so the first requests do not pay for it."""
+    start = time.perf_counter()
+    load_mnist()
+    torch = get_torch()
+    with torch.no_grad():
+        for model_type in ("nn", "cnn"):
+            predict_batch(model_type, torch.zeros(1, 28, 28))
+    print(f"Warm-up done in {(time.perf_counter() - start) * 1000:.0f} ms")
 
-nn_model = SimpleNN()
-nn_model.load_state_dict(torch.load("models/nn_model.pth", weights_only=True))
-nn_model.eval()
 
-cnn_model = SimpleCNN()
-cnn_model.load_state_dict(torch.load("models/cnn_model.pth", weights_only=True))
-cnn_model.eval()
+# --------------- Activation extraction ---------------
 
-# --------------- Load test dataset ---------------
+# Images accepted by one /api/predict/batch request
+MAX_PREDICT_BATCH = 256
 
-transform = transforms.Compose([
-    transforms.ToTensor(),
-    transforms.Normalize((0.1307,), (0.3081,)),
-])
+# Micro-batching of concurrent /api/predict calls (a max batch of 1 disables it)
+PREDICT_MAX_BATCH = int(os.environ.get("PREDICT_MAX_BATCH", "32"))
+PREDICT_MAX_WAIT_MS = float(os.environ.get("PREDICT_MAX_WAIT_MS", "5"))
+predict_batchers = {}  # (model_type, activations) -> MicroBatcher
+predict_batchers_lock = threading.Lock()
 
-test_dataset = datasets.MNIST("data", train=False, download=True, transform=transform)
+# Serialized /api/predict responses, keyed by model, image and options
+# (0 disables the cache)
+PREDICT_CACHE_MB = int(os.environ.get("PREDICT_CACHE_MB", "64"))
+predict_cache = ResponseCache(PREDICT_CACHE_MB * 1024 * 1024)
 
-# Store raw (unnormalized) images for display
-raw_transform = transforms.ToTensor()
-raw_test_dataset = datasets.MNIST("data", train=False, download=True, transform=raw_transform)
 
+def get_nn_activations_batch(images, options=None):
+    """Intermediate activations of the fully connected NN for a batch.
 
-# --------------- Activation extraction ---------------
+    images: (N, 28, 28) tensor. Returns (predictions, activations), one
+    activations dict per image.
+    """
+    return extract_activations(get_model("nn"), images, options or ActivationOptions())
 
-def get_nn_activations(image_tensor):
-    """Get intermediate activations for the fully connected NN."""
-    activations = {}
-    x = image_tensor.view(-1, 784)
-    activations["input"] = image_tensor.squeeze().tolist()
 
-    x = nn_model.fc1(x)
-    x = nn_model.relu(x)
-    activations["fc1_relu"] = x.squeeze().tolist()
+def get_cnn_activations_batch(images, options=None):
+    """Intermediate activations of the CNN for a batch.
 
-    x = nn_model.fc2(x)
-    x = nn_model.relu(x)
-    activations["fc2_relu"] = x.squeeze().tolist()
+    images: (N, 28, 28) tensor. Returns (predictions, activations), one
+    activations dict per image.
+    """
+    return extract_activations(get_model("cnn"), images, options or ActivationOptions())
 
-    x = nn_model.fc3(x)
-    probs = F.softmax(x, dim=1)
-    activations["output"] = probs.squeeze().tolist()
 
-    prediction = int(probs.argmax(dim=1).item())
-    return prediction, activations
+def get_nn_activations(image_tensor, options=None):
+    """Get intermediate activations for the fully connected NN."""
+    predictions, activations = get_nn_activations_batch(image_tensor.view(1, 28, 28), options)
+    return predictions[0], activations[0]
 
 
-def get_cnn_activations(image_tensor):
+def get_cnn_activations(image_tensor, options=None):
     """Get intermediate activations for the CNN."""
-    activations = {}
-    x = image_tensor.unsqueeze(0)  # (1,1,28,28)
-    activations["input"] = image_tensor.squeeze().tolist()
-
-    # Conv1 + ReLU
-    x = cnn_model.conv1(x)
-    x = cnn_model.relu(x)
-    conv1_maps = x.squeeze(0).detach()
-    activations["conv1"] = {
-        "shape": list(conv1_maps.shape),
-        "maps": [conv1_maps[i].tolist() for i in range(conv1_maps.shape[0])],
-    }
-
-    # Pool1
-    x = cnn_model.pool(x)
-    pool1_maps = x.squeeze(0).detach()
-    activations["pool1"] = {
-        "shape": list(pool1_maps.shape),
-        "maps": [pool1_maps[i].tolist() for i in range(pool1_maps.shape[0])],
-    }
+    predictions, activations = get_cnn_activations_batch(image_tensor.view(1, 28, 28), options)
+    return predictions[0], activations[0]
 
-    # Conv2 + ReLU
-    x = cnn_model.conv2(x)
-    x = cnn_model.relu(x)
-    conv2_maps = x.squeeze(0).detach()
-    activations["conv2"] = {
-        "shape": list(conv2_maps.shape),
-        "maps": [conv2_maps[i].tolist() for i in range(conv2_maps.shape[0])],
-    }
 
-    # Pool2
-    x = cnn_model.pool(x)
-    pool2_maps = x.squeeze(0).detach()
-    activations["pool2"] = {
-        "shape": list(pool2_maps.shape),
-        "maps": [pool2_maps[i].tolist() for i in range(pool2_maps.shape[0])],
-    }
+def parse_activation_options(model_type, data):
+    """ActivationOptions of a predict request, or an error message."""
+    try:
+        options = ActivationOptions.from_request(data)
+    except ValueError:
+        return None, "Options d'activation invalides"
+    unknown = set(options.layers or ()) - set(layer_names(get_model(model_type)))
+    if unknown:
+        return None, f"Couche inconnue : {', '.join(sorted(unknown))}"
+    return options, None
 
-    # Flatten + FC
-    x = x.view(-1, 64 * 7 * 7)
-    x = cnn_model.fc1(x)
-    x = cnn_model.relu(x)
-    activations["fc1_relu"] = x.squeeze().tolist()
 
-    x = cnn_model.fc2(x)
-    probs = F.softmax(x, dim=1)
-    activations["output"] = probs.squeeze().tolist()
+def predict_batch(model_type, images):
+    """Forward pass only (no activation extraction) for a (N, 28, 28) batch.
 
-    prediction = int(probs.argmax(dim=1).item())
-    return prediction, activations
+    Returns (predictions, probabilities).
+    """
+    model = get_model(model_type)
+    if model_type == "cnn":
+        logits = model(images.unsqueeze(1))
+    else:
+        logits = model(images)
+    probs = get_torch().softmax(logits, dim=1)
+    return probs.argmax(dim=1).tolist(), probs.tolist()
+
+
+def image_key(image_tensor):
+    """Hash of a normalized image quantized back to 8-bit grey levels.
+
+    Canvas and sample images are 8-bit: their pixels fall on exact levels,
+    so float noise from the client never changes the key.
+    """
+    import numpy as np
+    levels = (image_tensor.numpy() * 0.3081 + 0.1307) * 255
+    quantized = np.rint(levels).astype(np.int32)
+    return hashlib.blake2b(quantized.tobytes(), digest_size=16).hexdigest()
+
+
+def get_predict_batcher(model_type, activations):
+    """MicroBatcher running /api/predict requests of one kind together.
+
+    Each item is a (28, 28) image, with its ActivationOptions when
+    activations are requested; each result is (prediction, activations) or
+    (prediction, probabilities) in prediction-only mode.
+    """
+    key = (model_type, activations)
+    with predict_batchers_lock:
+        if key not in predict_batchers:
+            def run(items):
+                torch = get_torch()
+                # no_grad is per thread: the batcher thread needs its own
+                with torch.no_grad():
+                    if not activations:
+                        return list(zip(*predict_batch(model_type, torch.stack(items))))
+
+                    # One forward pass per distinct set of options
+                    groups = {}
+                    for i, (_, options) in enumerate(items):
+                        groups.setdefault(options.key(), []).append(i)
+                    results = [None] * len(items)
+                    for indices in groups.values():
+                        batch = torch.stack([items[i][0] for i in indices])
+                        options = items[indices[0]][1]
+                        group = extract_activations(get_model(model_type), batch, options)
+                        for i, result in zip(indices, zip(*group)):
+                            results[i] = result
+                    return results
+
+            predict_batchers[key] = MicroBatcher(
+                run, PREDICT_MAX_BATCH, PREDICT_MAX_WAIT_MS,
+                name=f"predict-{model_type}{'-activations' if activations else ''}",
+            )
+        return predict_batchers[key]
 
 
 # --------------- Routes ---------------
@@ -168,34 +354,124 @@ def serve_static(path):
 
 @app.route("/api/sample")
 def get_sample():
-    idx = random.randint(0, len(test_dataset) - 1)
-    image, label = test_dataset[idx]
-    raw_image, _ = raw_test_dataset[idx]
+    from mnist_samples import get_sample
+    samples = get_test_samples()
+    image, raw_image, label = get_sample(samples, random.randrange(len(samples)))
     return jsonify({
-        "image": image.squeeze().tolist(),
-        "raw_image": raw_image.squeeze().tolist(),
-        "label": int(label),
+        "image": image.tolist(),
+        "raw_image": raw_image.tolist(),
+        "label": label,
     })
 
 
 @app.route("/api/predict", methods=["POST"])
 def predict():
+    torch = get_torch()
     data = request.get_json()
-    model_type = data.get("model", "nn")
+    model_type = "cnn" if data.get("model", "nn") == "cnn" else "nn"
     pixels = data.get("image")  # 28x28 array, normalized
+    # Prediction only: skip activation extraction
+    with_activations = bool(data.get("activations", True))
+    if with_activations:
+        # Layers, channel ranges, downsample/summary and encoding
+        options, error = parse_activation_options(model_type, data)
+        if error:
+            return jsonify({"error": error}), 400
+
+    try:
+        image_tensor = torch.tensor(pixels, dtype=torch.float32).unsqueeze(0)  # (1,28,28)
+    except (ValueError, TypeError):
+        return jsonify({"error": "Image invalide"}), 400
+    if image_tensor.shape != (1, 28, 28):
+        return jsonify({"error": "Image invalide"}), 400
+
+    if PREDICT_CACHE_MB > 0:
+        cache_key = (model_type, image_key(image_tensor),
+                     options.key() if with_activations else None)
+        body = predict_cache.get(cache_key)
+        if body is not None:
+            return Response(body, mimetype="application/json",
+                            headers={"X-Cache": "hit"})
+
+    if PREDICT_MAX_BATCH > 1:
+        # Batched with the concurrent requests of the same kind
+        batcher = get_predict_batcher(model_type, with_activations)
+        item = (image_tensor[0], options) if with_activations else image_tensor[0]
+        prediction, result = batcher.submit(item)
+    else:
+        with torch.no_grad():
+            if not with_activations:
+                predictions, probabilities = predict_batch(model_type, image_tensor)
+                prediction, result = predictions[0], probabilities[0]
+            elif model_type == "cnn":
+                prediction, result = get_cnn_activations(image_tensor, options)
+            else:
+                prediction, result = get_nn_activations(image_tensor, options)
+
+    if not with_activations:
+        response = jsonify({"prediction": prediction, "probabilities": result})
+    else:
+        response = jsonify({
+            "prediction": prediction,
+            "activations": result,
+        })
+    if PREDICT_CACHE_MB > 0:
+        predict_cache.put(cache_key, response.get_data())
+        response.headers["X-Cache"] = "miss"
+    return response
+
+
+@app.route("/api/predict/metrics")
+def predict_metrics():
+    """Micro-batching metrics (queue depth, batch sizes, wait and run times)
+    and response cache metrics."""
+    with predict_batchers_lock:
+        batchers = dict(predict_batchers)
+    metrics = {
+        f"{model_type}{'_activations' if activations else ''}": batcher.get_stats()
+        for (model_type, activations), batcher in batchers.items()
+    }
+    metrics["cache"] = predict_cache.get_stats()
+    return jsonify(metrics)
+
 
-    image_tensor = torch.tensor(pixels, dtype=torch.float32).unsqueeze(0)  # (1,28,28)
+@app.route("/api/predict/batch", methods=["POST"])
+def predict_batch_route():
+    """Predict N images in one forward pass.
+
+    Body: {"model": "nn"|"cnn", "images": [28x28 arrays], "activations": bool}
+    plus the activation options of /api/predict ("layers", "channels",
+    "downsample", "summary", "encoding"). Without "activations" (prediction
+    only), the response has the predictions and probabilities; with it,
+    per-image activations as in /api/predict.
+    """
+    torch = get_torch()
+    data = request.get_json()
+    if not data or not data.get("images"):
+        return jsonify({"error": "Donnees manquantes"}), 400
+    model_type = "cnn" if data.get("model", "nn") == "cnn" else "nn"
+    pixels = data["images"]
+    if len(pixels) > MAX_PREDICT_BATCH:
+        return jsonify({"error": f"Trop d'images (maximum {MAX_PREDICT_BATCH})"}), 400
+    options, error = parse_activation_options(model_type, data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    try:
+        images = torch.tensor(pixels, dtype=torch.float32)
+    except (ValueError, TypeError):
+        return jsonify({"error": "Images invalides"}), 400
+    if images.shape[1:] != (28, 28):
+        return jsonify({"error": "Images invalides"}), 400
 
     with torch.no_grad():
-        if model_type == "cnn":
-            prediction, activations = get_cnn_activations(image_tensor)
-        else:
-            prediction, activations = get_nn_activations(image_tensor)
+        if not data.get("activations", False):
+            predictions, probabilities = predict_batch(model_type, images)
+            return jsonify({"predictions": predictions, "probabilities": probabilities})
 
-    return jsonify({
-        "prediction": prediction,
-        "activations": activations,
-    })
+        predictions, activations = extract_activations(get_model(model_type), images, options)
+
+    return jsonify({"predictions": predictions, "activations": activations})
 
 
 @app.route("/api/model-info/<model_type>")
@@ -229,8 +505,12 @@ def model_info(model_type):
 @app.route("/api/cnn-filters")
 def cnn_filters():
     """Get Conv1 filters (weights) from the trained CNN model."""
+    # A TorchScript backend keeps the eager model as .module; int8 leaves
+    # the convolutions of the model itself in float32
+    model = get_model("cnn")
+    model = getattr(model, "module", model)
     # Conv1 has shape [32, 1, 3, 3] (32 filters, 1 input channel, 3x3 kernel)
-    conv1_weights = cnn_model.conv1.weight.data.cpu().numpy()
+    conv1_weights = model.conv1.weight.data.cpu().numpy()
 
     # Extract first 8 filters for visualization
     filters = []
@@ -247,8 +527,127 @@ def cnn_filters():
 
 # --------------- Chess API ---------------
 
+def parse_tree_options(source):
+    """Read SearchTree.render() caps from a dict (JSON body or query args)."""
+    options = {}
+    for key in ("max_depth", "max_children", "max_nodes"):
+        if source.get(key) is not None:
+            options[key] = max(0, int(source.get(key)))
+    if source.get("format") in ("nested", "arrays"):
+        options["format"] = source.get("format")
+    return options
+
+
+def store_search_tree(tree, search_id=None):
+    """Keep a search tree for /api/chess/tree and return its id."""
+    if tree is None:
+        return None
+    search_id = search_id or uuid.uuid4().hex
+    cache_search_tree(search_id, tree)
+    chess_store.add_tree(search_id, tree, MAX_STORED_TREES)
+    return search_id
+
+
+def cache_search_tree(search_id, tree):
+    with search_trees_lock:
+        search_trees[search_id] = tree
+        search_trees.move_to_end(search_id)
+        while len(search_trees) > MAX_LOCAL_TREES:
+            search_trees.popitem(last=False)
+
+
+def get_search_tree(search_id):
+    """Stored tree of a search made by any worker, or None."""
+    with search_trees_lock:
+        tree = search_trees.get(search_id)
+        if tree is not None:
+            search_trees.move_to_end(search_id)
+            return tree
+    tree = chess_store.get_tree(search_id)
+    if tree is not None:
+        cache_search_tree(search_id, tree)
+    return tree
+
+
+def session_bytes(session):
+    return (session["tt"].approx_bytes()
+            + SESSION_MOVE_BYTES * len(session["board"].move_stack))
+
+
+def evict_game_sessions():
+    """Drop expired games, then the least recently used ones over the caps.
+
+    Must be called with game_sessions_lock held.
+    """
+    now = time.time()
+    while game_sessions:
+        session = next(iter(game_sessions.values()))
+        if now - session["last_used"] <= CHESS_SESSION_TTL:
+            break
+        game_sessions.popitem(last=False)
+
+    total = sum(session_bytes(session) for session in game_sessions.values())
+    budget = CHESS_SESSION_MEMORY_MB * 1024 * 1024
+    while game_sessions and (total > budget or len(game_sessions) > MAX_GAME_SESSIONS):
+        _, session = game_sessions.popitem(last=False)
+        total -= session_bytes(session)
+
+
+def create_game_session(board):
+    """Start a server-side game from board and return its id."""
+    game_id = uuid.uuid4().hex
+    with game_sessions_lock:
+        game_sessions[game_id] = {
+            "board": board,
+            "tt": TranspositionTable(),
+            # (eval code hash, quiescence) the table's values were searched with
+            "tt_key": None,
+            "pv": [],  # UCI moves expected from the current position
+            "version": 0,  # number of saved moves, detects concurrent requests
+            "last_used": time.time(),
+        }
+        evict_game_sessions()
+    return game_id
+
+
+def get_game_session(game_id):
+    with game_sessions_lock:
+        evict_game_sessions()
+        session = game_sessions.get(game_id)
+        if session is not None:
+            game_sessions.move_to_end(game_id)
+            session["last_used"] = time.time()
+        return session
+
+
+def save_game_session(move_request, result=None):
+    """Store the position reached by a move request in its game.
+
+    Returns False when another request moved in the same game meanwhile;
+    this move is then dropped.
+    """
+    session = move_request["session"]
+    if session is None:
+        return True
+    with game_sessions_lock:
+        if session["version"] != move_request["session_version"]:
+            return False
+        session["version"] += 1
+        session["board"] = move_request["board"]
+        # Process searches fill a copy of the table and send it back
+        if result and result.get("tt") is not None and session["tt"] is move_request["tt"]:
+            session["tt"] = result["tt"]
+        # After the AI move, the PV continues with the expected user reply
+        session["pv"] = result["pv"][1:] if result else []
+        session["last_used"] = time.time()
+        evict_game_sessions()
+    return True
+
+
 @app.route("/api/chess/new", methods=["POST"])
 def chess_new():
+    """Start a game. With "session": true the game is kept server-side and
+    later moves can send its game_id instead of a FEN."""
     data = request.get_json() or {}
     fen = data.get("fen")
     try:
@@ -256,7 +655,10 @@ def chess_new():
     except ValueError:
         return jsonify({"error": "FEN invalide"}), 400
 
+    game_id = create_game_session(board.copy()) if data.get("session") else None
+
     return jsonify({
+        "game_id": game_id,
         "fen": board.fen(),
         "board": board_to_array(board),
         "legal_moves": get_legal_moves_uci(board),
@@ -266,75 +668,393 @@ def chess_new():
     })
 
 
-@app.route("/api/chess/move", methods=["POST"])
-def chess_move():
-    data = request.get_json()
+def prepare_chess_move(data):
+    """Validate a move request and apply the user's move.
+
+    The position comes from the game_id's session when given, otherwise
+    from the FEN (stateless clients). An unknown or expired game_id sent
+    with a FEN restarts a session from that FEN.
+
+    Returns (move_request, error_response). move_request holds the board
+    after the user's move and the search parameters.
+    """
     if not data:
-        return jsonify({"error": "Donnees manquantes"}), 400
+        return None, (jsonify({"error": "Donnees manquantes"}), 400)
 
     fen = data.get("fen")
     user_move_uci = data.get("user_move")
-    eval_code = data.get("eval_code", DEFAULT_EVAL_CODE)
     depth = min(int(data.get("depth", 3)), 4)
 
-    try:
-        board = chess.Board(fen)
-    except (ValueError, TypeError):
-        return jsonify({"error": "FEN invalide"}), 400
+    # Optional time budget: iterative deepening up to a higher depth
+    time_ms = data.get("time_ms")
+    if time_ms is not None:
+        time_ms = max(50, min(int(time_ms), 10000))
+        depth = min(int(data.get("depth", 6)), 8)
+
+    game_id = data.get("game_id")
+    session = get_game_session(game_id) if game_id else None
+    if game_id and session is None:
+        if not fen:
+            return None, (jsonify({"error": "Partie introuvable"}), 404)
+        try:
+            game_id = create_game_session(chess.Board(fen))
+        except (ValueError, TypeError):
+            return None, (jsonify({"error": "FEN invalide"}), 400)
+        session = get_game_session(game_id)
+
+    if session is not None:
+        with game_sessions_lock:
+            board = session["board"].copy()
+            session_version = session["version"]
+            expected = session["pv"]
+    else:
+        game_id = None
+        session_version = None
+        expected = []
+        try:
+            board = chess.Board(fen)
+        except (ValueError, TypeError):
+            return None, (jsonify({"error": "FEN invalide"}), 400)
 
     # Apply user move
     try:
         move = chess.Move.from_uci(user_move_uci)
         if move not in board.legal_moves:
-            return jsonify({"error": "Coup illegal"}), 400
+            return None, (jsonify({"error": "Coup illegal"}), 400)
         user_move_san = board.san(move)
         board.push(move)
     except (ValueError, TypeError):
-        return jsonify({"error": "Coup invalide"}), 400
+        return None, (jsonify({"error": "Coup invalide"}), 400)
 
-    fen_after_user = board.fen()
+    # Warm start: the user played the reply the previous search expected
+    pv = None
+    if expected and expected[0] == move.uci():
+        pv = [chess.Move.from_uci(uci) for uci in expected[1:]]
 
-    # Check game over after user move
-    status = get_game_status(board)
-    if status != "playing":
-        return jsonify({
-            "user_move_san": user_move_san,
-            "ai_move": None,
-            "ai_move_san": None,
-            "fen_after_user": fen_after_user,
-            "fen_after_ai": None,
-            "board": board_to_array(board),
-            "legal_moves": [],
-            "turn": "black" if board.turn == chess.BLACK else "white",
-            "status": status,
-            "tree": None,
-            "eval_error": None,
-            "stats": None,
-        })
+    eval_code = data.get("eval_code", DEFAULT_EVAL_CODE)
+    quiescence = data.get("quiescence")
+    if quiescence is None:
+        quiescence = default_quiescence(eval_code, CHESS_EVAL_MODE)
+
+    # Stored values are only valid for the evaluation and quiescence setting
+    # they were searched with: start a new table when either changes
+    tt = None
+    if session is not None:
+        tt_key = (eval_code_hash(eval_code), bool(quiescence))
+        with game_sessions_lock:
+            if session["tt_key"] != tt_key:
+                session["tt"] = TranspositionTable()
+                session["tt_key"] = tt_key
+            tt = session["tt"]
+
+    return {
+        "game_id": game_id,
+        "session": session,
+        "session_version": session_version,
+        "tt": tt,
+        "pv": pv,
+        "board": board,
+        "user_move_san": user_move_san,
+        "fen_after_user": board.fen(),
+        "eval_code": eval_code,
+        "depth": depth,
+        "time_ms": time_ms,
+        "tree_options": parse_tree_options(data.get("tree_options") or {}),
+        "workers": max(1, min(int(data.get("workers", CHESS_SEARCH_WORKERS)),
+                              CHESS_SEARCH_WORKERS)),
+        "quiescence": bool(quiescence),
+        "show_quiescence": bool(data.get("show_quiescence", False)),
+        "shortcuts": bool(data.get("shortcuts", CHESS_SHORTCUTS)),
+    }, None
+
+
+def game_over_payload(move_request, status):
+    """Response body when the user's move ended the game."""
+    board = move_request["board"]
+    return {
+        "game_id": move_request["game_id"],
+        "user_move_san": move_request["user_move_san"],
+        "ai_move": None,
+        "ai_move_san": None,
+        "fen_after_user": move_request["fen_after_user"],
+        "fen_after_ai": None,
+        "board": board_to_array(board),
+        "legal_moves": [],
+        "turn": "black" if board.turn == chess.BLACK else "white",
+        "status": status,
+        "tree": None,
+        "search_id": None,
+        "eval_error": None,
+        "stats": None,
+    }
 
-    # AI plays
-    result = find_best_move(board, eval_code, depth)
 
+def move_payload(move_request, result, search_id):
+    """Play the AI move and build the response body."""
+    board = move_request["board"]
     if result["ai_move"]:
         ai_move = chess.Move.from_uci(result["ai_move"])
         board.push(ai_move)
 
-    return jsonify({
-        "user_move_san": user_move_san,
+    return {
+        "game_id": move_request["game_id"],
+        "user_move_san": move_request["user_move_san"],
         "ai_move": result["ai_move"],
         "ai_move_san": result["ai_move_san"],
-        "fen_after_user": fen_after_user,
+        "fen_after_user": move_request["fen_after_user"],
         "fen_after_ai": board.fen(),
         "board": board_to_array(board),
         "legal_moves": get_legal_moves_uci(board),
         "turn": "white" if board.turn == chess.WHITE else "black",
         "status": get_game_status(board),
         "tree": result["tree"],
+        "search_id": search_id,
         "eval_error": result["eval_error"],
         "stats": result["stats"],
+    }
+
+
+def submit_search_job(move_request, search_id=None):
+    """Queue the AI search of a move request; raises JobRejected.
+
+    The job's payload is the /api/chess/move response body, built once the
+    search is done (the session is saved at that point).
+    """
+    board = move_request["board"]
+    pv = move_request["pv"]
+    task = {
+        "fen": board.root().fen(),
+        "history": [move.uci() for move in board.move_stack],
+        "eval_code": move_request["eval_code"],
+        "depth": move_request["depth"],
+        "time_ms": move_request["time_ms"],
+        "eval_mode": CHESS_EVAL_MODE,
+        "tree_options": move_request["tree_options"],
+        "workers": move_request["workers"],
+        "quiescence": move_request["quiescence"],
+        "show_quiescence": move_request["show_quiescence"],
+        "shortcuts": move_request["shortcuts"],
+        "book_path": CHESS_BOOK_PATH,
+        "pv": [move.uci() for move in pv] if pv else None,
+        # Sent to the search process and back in process mode
+        "tt": move_request["tt"],
+    }
+    search_id = search_id or uuid.uuid4().hex
+
+    def finish(result):
+        store_search_tree(result["search_tree"], search_id)
+        payload = move_payload(move_request, result, search_id)
+        if not save_game_session(move_request, result):
+            raise JobFailed(SESSION_CONFLICT)
+        return payload
+
+    return chess_jobs.submit(request.remote_addr, task, finish, search_id)
+
+
+def job_rejected_response(error):
+    return jsonify({"error": str(error)}), 429, {"Retry-After": "2"}
+
+
+def acquire_blocking_search():
+    """Reserve one of the worker's blocking search slots, or return the 429
+    response pointing to the job API."""
+    if CHESS_BLOCKING_REQUESTS and blocking_searches.acquire(blocking=False):
+        return None
+    return job_rejected_response(
+        "Trop de recherches en attente sur ce serveur, utilisez /api/chess/jobs")
+
+
+@app.route("/api/chess/move", methods=["POST"])
+def chess_move():
+    move_request, error = prepare_chess_move(request.get_json())
+    if error:
+        return error
+
+    # Check game over after user move
+    status = get_game_status(move_request["board"])
+    if status != "playing":
+        if not save_game_session(move_request):
+            return jsonify({"error": SESSION_CONFLICT}), 409
+        return jsonify(game_over_payload(move_request, status))
+
+    # AI plays
+    error = acquire_blocking_search()
+    if error:
+        return error
+    try:
+        job = submit_search_job(move_request)
+        job.done.wait()
+    except JobRejected as e:
+        return job_rejected_response(e)
+    finally:
+        blocking_searches.release()
+    if job.error:
+        return jsonify({"error": job.error}), 409 if job.error == SESSION_CONFLICT else 500
+    return jsonify(job.payload)
+
+
+def sse_event(name, payload):
+    return f"event: {name}\ndata: {json.dumps(payload)}\n\n"
+
+
+@app.route("/api/chess/move/stream", methods=["POST"])
+def chess_move_stream():
+    """Same as /api/chess/move, streamed as Server-Sent Events.
+
+    Events: "start" (search_id, job_id), "progress" (nodes, nodes/sec,
+    current best move), "iteration" (stats and tree of each completed
+    depth) and finally "result" (the /api/chess/move response body).
+    Closing the connection or calling /api/chess/search/<search_id>/cancel
+    stops the search.
+    """
+    move_request, error = prepare_chess_move(request.get_json())
+    if error:
+        return error
+
+    status = get_game_status(move_request["board"])
+    search_id = uuid.uuid4().hex
+    job = None
+    if status == "playing":
+        error = acquire_blocking_search()
+        if error:
+            return error
+        try:
+            job = submit_search_job(move_request, search_id)
+        except JobRejected as e:
+            blocking_searches.release()
+            return job_rejected_response(e)
+        events = job.listen()
+
+    def stream():
+        yield sse_event("start", {
+            "search_id": search_id,
+            "job_id": job.id if job else None,
+            "user_move_san": move_request["user_move_san"],
+            "fen_after_user": move_request["fen_after_user"],
+        })
+        if job is None:
+            if save_game_session(move_request):
+                yield sse_event("result", game_over_payload(move_request, status))
+            else:
+                yield sse_event("error", {"error": SESSION_CONFLICT})
+            return
+
+        try:
+            while True:
+                item = events.get()
+                if item is None:
+                    break
+                yield sse_event(*item)
+            if job.error:
+                yield sse_event("error", {"error": job.error})
+            else:
+                yield sse_event("result", job.payload)
+        finally:
+            # Client disconnected (or search done): stop the search
+            chess_jobs.cancel(job.id)
+
+    response = Response(stream(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+    if job is not None:
+        # Also called when the client leaves before the stream starts
+        response.call_on_close(blocking_searches.release)
+    return response
+
+
+@app.route("/api/chess/game/<game_id>", methods=["GET", "DELETE"])
+def chess_game(game_id):
+    """State of a server-side game (GET) or end it (DELETE)."""
+    if request.method == "DELETE":
+        with game_sessions_lock:
+            session = game_sessions.pop(game_id, None)
+        if session is None:
+            return jsonify({"error": "Partie introuvable"}), 404
+        return jsonify({"deleted": True})
+
+    session = get_game_session(game_id)
+    if session is None:
+        return jsonify({"error": "Partie introuvable"}), 404
+    with game_sessions_lock:
+        board = session["board"].copy()
+    return jsonify({
+        "game_id": game_id,
+        "fen": board.fen(),
+        "moves": [move.uci() for move in board.move_stack],
+        "board": board_to_array(board),
+        "legal_moves": get_legal_moves_uci(board),
+        "turn": "white" if board.turn == chess.WHITE else "black",
+        "status": get_game_status(board),
     })
 
 
+@app.route("/api/chess/search/<search_id>/cancel", methods=["POST"])
+def chess_cancel_search(search_id):
+    # The search stops and plays its best move so far
+    if not chess_jobs.cancel(search_id=search_id, keep_result=True):
+        return jsonify({"error": "Recherche introuvable"}), 404
+    return jsonify({"cancelled": True})
+
+
+@app.route("/api/chess/jobs", methods=["GET", "POST"])
+def chess_jobs_route():
+    """POST: queue the AI reply to a move (same body as /api/chess/move)
+    and return its job_id at once (202), or 429 when the queue or the
+    client's job limit is full. GET: job queue metrics."""
+    if request.method == "GET":
+        return jsonify(chess_jobs.get_stats())
+
+    move_request, error = prepare_chess_move(request.get_json())
+    if error:
+        return error
+
+    status = get_game_status(move_request["board"])
+    if status != "playing":
+        if not save_game_session(move_request):
+            return jsonify({"error": SESSION_CONFLICT}), 409
+        return jsonify({"job_id": None, "status": "done",
+                        "result": game_over_payload(move_request, status)})
+
+    try:
+        job = submit_search_job(move_request)
+    except JobRejected as e:
+        return job_rejected_response(e)
+    return jsonify({"job_id": job.id, "status": job.status,
+                    "position": chess_jobs.position(job)}), 202
+
+
+@app.route("/api/chess/jobs/<job_id>", methods=["GET", "DELETE"])
+def chess_job(job_id):
+    """GET: job status, its "iteration" events from index `since` on (the
+    response's "next" is the index to ask for next time), the latest
+    progress and, once done, the result. DELETE: cancel the job."""
+    if request.method == "DELETE":
+        if not chess_jobs.cancel(job_id):
+            return jsonify({"error": "Recherche introuvable"}), 404
+        return jsonify({"cancelled": True})
+
+    since = max(0, request.args.get("since", 0, type=int))
+    job = chess_jobs.poll(job_id, since)
+    if job is None:
+        return jsonify({"error": "Recherche introuvable"}), 404
+    return jsonify(job)
+
+
+@app.route("/api/chess/tree/<search_id>/<int:node_id>")
+def chess_subtree(search_id, node_id):
+    """Render a subtree of a recent search (e.g. when the user expands a node)."""
+    tree = get_search_tree(search_id)
+    if tree is None:
+        return jsonify({"error": "Recherche introuvable"}), 404
+    if not 0 <= node_id < len(tree):
+        return jsonify({"error": "Noeud introuvable"}), 404
+
+    options = parse_tree_options(request.args)
+    options.setdefault("max_depth", 2)
+    return jsonify({"search_id": search_id, "tree": tree.render(node_id, **options)})
+
+
 @app.route("/api/chess/validate-eval", methods=["POST"])
 def chess_validate_eval():
     data = request.get_json()
@@ -349,17 +1069,47 @@ def chess_validate_eval():
     except (ValueError, TypeError):
         board = chess.Board()
 
-    eval_fn, error = compile_user_eval(eval_code)
-    if error:
-        return jsonify({"valid": False, "score": None, "error": error})
-
-    score, exec_error = execute_eval(eval_fn, board)
-    if exec_error:
-        return jsonify({"valid": False, "score": None, "error": exec_error})
+    if CHESS_EVAL_MODE == "sandbox" and not is_default_eval(eval_code):
+        # Compiled and run in a sandbox process only, never in this one
+        from eval_sandbox import validate_eval
+        score, error = validate_eval(eval_code, board)
+        if error:
+            return jsonify({"valid": False, "score": None, "error": error})
+        return jsonify({"valid": True, "score": round(score, 1), "error": None})
+
+    compiled = get_compiled_eval(eval_code)
+    if compiled.error:
+        return jsonify({"valid": False, "score": None, "error": compiled.error})
+
+    # Failures are not cached: a timeout may come from a busy server
+    fen_key = board.fen()
+    score = compiled.get_validation(fen_key)
+    if score is None:
+        score, exec_error = execute_eval(compiled.new_eval_fn(), board)
+        if exec_error:
+            return jsonify({"valid": False, "score": None, "error": exec_error})
+        compiled.set_validation(fen_key, score)
 
     return jsonify({"valid": True, "score": round(score, 1), "error": None})
 
 
+# --------------- Startup ---------------
+
+startup_times["app_import"] = round(time.perf_counter() - _import_start, 3)
+print(f"Imported app in {startup_times['app_import'] * 1000:.0f} ms")
+
+# Load the MNIST models and test set now rather than on first use
+if os.environ.get("APP_WARM_UP", "0") == "1":
+    warm_up()
+
+
+@app.route("/api/startup")
+def startup_info():
+    """Seconds spent importing the app and loading each component so far."""
+    return jsonify({"times": startup_times, "loaded": sorted(_components),
+                    "mnist_backend": MNIST_BACKEND})
+
+
 if __name__ == "__main__":
     print("Starting Neura'TN on http://localhost:5000")
     app.run(host="0.0.0.0", port=5000, debug=False)
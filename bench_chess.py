@@ -0,0 +1,228 @@
+"""Benchmark the chess engine on a fixed set of positions.
+
+Runs find_best_move over every (eval code, depth, position) combination and
+writes one JSON document with nodes, nodes pruned, nodes/sec, time, JSON tree
+size and peak memory per search. With --baseline, a previous output is
+compared against the new one.
+
+    python bench_chess.py --depths 2 3 --output bench.json
+    python bench_chess.py --baseline bench.json
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import chess
+
+import chess_engine
+from chess_engine import DEFAULT_EVAL_CODE, TranspositionTable, find_best_move
+
+
+# --------------- Positions ---------------
+
+POSITIONS = [
+    # Openings
+    ("start", "opening", chess.STARTING_FEN),
+    ("italian", "opening",
+     "r1bqkbnr/pppp1ppp/2n5/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 3 3"),
+    ("sicilian", "opening",
+     "rnbqkbnr/pp1ppppp/8/2p5/4P3/5N2/PPPP1PPP/RNBQKB1R b KQkq - 1 2"),
+    # Middlegames
+    ("kiwipete", "middlegame",
+     "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"),
+    ("closed_center", "middlegame",
+     "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10"),
+    # Tactics
+    ("scholar_mate", "tactical",
+     "r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4"),
+    ("legal_mate", "tactical",
+     "r2qkbnr/ppp2ppp/2np4/4N3/2B1P3/2N5/PPPP1PPP/R1BbK2R w KQkq - 0 6"),
+    ("back_rank", "tactical", "6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1"),
+    # Endgames
+    ("rook_pawns", "endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1"),
+    ("lucena", "endgame", "1K1k4/1P6/8/8/8/8/r7/2R5 w - - 0 1"),
+    ("king_pawn", "endgame", "8/8/8/4k3/8/8/4P3/4K3 w - - 0 1"),
+]
+
+# --------------- Evaluation codes ---------------
+
+POSITIONAL_EVAL_CODE = '''\
+def evaluate(board):
+    piece_values = {
+        chess.PAWN: 100, chess.KNIGHT: 320, chess.BISHOP: 330,
+        chess.ROOK: 500, chess.QUEEN: 900, chess.KING: 0,
+    }
+    center = [chess.D4, chess.E4, chess.D5, chess.E5]
+
+    score = 0
+    for square, piece in board.piece_map().items():
+        value = piece_values[piece.piece_type]
+        if square in center:
+            value += 20
+        score += value if piece.color == chess.WHITE else -value
+
+    mobility = board.legal_moves.count()
+    score += mobility if board.turn == chess.WHITE else -mobility
+    return score
+'''
+
+EVAL_CODES = {
+    # Unmodified default code: native evaluator
+    "default": DEFAULT_EVAL_CODE,
+    # Same code once edited: runs as user code behind the eval cache
+    "user_material": DEFAULT_EVAL_CODE + "\n# modifie\n",
+    "user_positional": POSITIONAL_EVAL_CODE,
+}
+
+
+# --------------- Benchmark ---------------
+
+def run_search(fen, eval_code, depth):
+    """One search from a cold state (new transposition table, empty eval cache)."""
+    chess_engine.eval_cache.clear()
+    board = chess.Board(fen)
+    start = time.perf_counter()
+    result = find_best_move(board, eval_code, depth, tt=TranspositionTable())
+    return result, time.perf_counter() - start
+
+
+def measure_peak_memory(fen, eval_code, depth):
+    """Peak traced allocation of a search, in bytes (separate run: tracing
+    slows the search down)."""
+    tracemalloc.start()
+    run_search(fen, eval_code, depth)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def bench(depths, eval_names, position_names, repeat, memory):
+    results = []
+    for eval_name in eval_names:
+        eval_code = EVAL_CODES[eval_name]
+        for depth in depths:
+            for name, category, fen in POSITIONS:
+                if position_names and name not in position_names:
+                    continue
+
+                # Best of `repeat` runs for the timing
+                times = []
+                for _ in range(repeat):
+                    result, elapsed = run_search(fen, eval_code, depth)
+                    times.append(elapsed)
+                elapsed = min(times)
+                stats = result["stats"]
+                nodes = stats["nodes_explored"]
+
+                entry = {
+                    "eval": eval_name,
+                    "depth": depth,
+                    "position": name,
+                    "category": category,
+                    "best_move": result["ai_move"],
+                    "nodes": nodes,
+                    "nodes_pruned": stats["nodes_pruned"],
+                    "quiescence_nodes": stats.get("quiescence_nodes", 0),
+                    "time_ms": round(elapsed * 1000, 2),
+                    "nodes_per_sec": round(nodes / elapsed) if elapsed > 0 else None,
+                    "tree_json_bytes": len(json.dumps(result["tree"])),
+                    "eval_error": result["eval_error"],
+                }
+                if memory:
+                    entry["peak_memory_bytes"] = measure_peak_memory(fen, eval_code, depth)
+                results.append(entry)
+                print(f"  {eval_name:16s} d={depth} {name:14s} {entry['best_move']:6s} "
+                      f"{nodes:8d} nodes {entry['time_ms']:10.1f} ms", file=sys.stderr)
+    return results
+
+
+def summarize(results):
+    """Totals per (eval, depth)."""
+    summary = {}
+    for entry in results:
+        key = f"{entry['eval']}/d{entry['depth']}"
+        total = summary.setdefault(key, {"nodes": 0, "time_ms": 0.0})
+        total["nodes"] += entry["nodes"]
+        total["time_ms"] = round(total["time_ms"] + entry["time_ms"], 2)
+    for total in summary.values():
+        seconds = total["time_ms"] / 1000
+        total["nodes_per_sec"] = round(total["nodes"] / seconds) if seconds > 0 else None
+    return summary
+
+
+def compare(results, baseline):
+    """Per-search ratios against a previous output (new / baseline)."""
+    previous = {
+        (entry["eval"], entry["depth"], entry["position"]): entry
+        for entry in baseline["results"]
+    }
+    comparison = []
+    for entry in results:
+        old = previous.get((entry["eval"], entry["depth"], entry["position"]))
+        if old is None:
+            continue
+        row = {
+            "eval": entry["eval"],
+            "depth": entry["depth"],
+            "position": entry["position"],
+            "same_move": entry["best_move"] == old["best_move"],
+        }
+        for field in ("nodes", "time_ms", "tree_json_bytes", "peak_memory_bytes"):
+            if entry.get(field) and old.get(field):
+                row[f"{field}_ratio"] = round(entry[field] / old[field], 3)
+        comparison.append(row)
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--depths", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--evals", nargs="+", choices=sorted(EVAL_CODES),
+                        default=sorted(EVAL_CODES))
+    parser.add_argument("--positions", nargs="+", default=None,
+                        help="subset of position names (default: all)")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="runs per search, the fastest one is kept")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip the traced run measuring peak memory")
+    parser.add_argument("--output", help="write the JSON here (default: stdout)")
+    parser.add_argument("--baseline", help="previous output to compare against")
+    args = parser.parse_args()
+
+    results = bench(args.depths, args.evals, args.positions, args.repeat,
+                    not args.no_memory)
+    report = {
+        "python": platform.python_version(),
+        "chess": chess.__version__,
+        "platform": platform.platform(),
+        "summary": summarize(results),
+        "results": results,
+    }
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        report["comparison"] = compare(results, baseline)
+        for key, total in report["summary"].items():
+            old = baseline.get("summary", {}).get(key)
+            if old and old["time_ms"]:
+                print(f"{key:24s} time x{total['time_ms'] / old['time_ms']:.3f} "
+                      f"nodes x{total['nodes'] / old['nodes']:.3f}", file=sys.stderr)
+        changed = [row for row in report["comparison"] if not row["same_move"]]
+        if changed:
+            print(f"{len(changed)} searches chose a different move", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Compare the MNIST inference backends on the test set.
+
+For each model (nn, cnn) and backend (see inference.py), measures the test
+set accuracy, the agreement with the eager model's predictions, the largest
+probability difference from it, the build time, single-image latencies
+(prediction only, and with every activation as the visualizer asks for
+them) and the throughput of larger batches. Writes one JSON document.
+
+    python bench_inference.py --output inference.json
+    python bench_inference.py --models cnn --batch-sizes 32 --threads 1
+    python bench_inference.py --threads 1 --markdown   # DOCKER.md table rows
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+
+import numpy as np
+import torch
+
+from activations import ActivationOptions, extract_activations
+from inference import INFERENCE_BACKENDS, build_backend
+from mnist_samples import MNIST_MEAN, MNIST_STD, open_samples
+from train import SimpleCNN, SimpleNN
+
+MODELS = {
+    "nn": (SimpleNN, "models/nn_model.pth"),
+    "cnn": (SimpleCNN, "models/cnn_model.pth"),
+}
+
+
+def load_eager(model_type):
+    model_class, path = MODELS[model_type]
+    model = model_class()
+    model.load_state_dict(torch.load(path, weights_only=True))
+    model.eval()
+    return model
+
+
+def load_test_set(limit=None):
+    """(images (N, 28, 28) normalized float32, labels (N,)) tensors."""
+    samples = np.asarray(open_samples()[:limit])
+    images = samples[:, :784].reshape(-1, 28, 28).astype(np.float32) / np.float32(255)
+    images = (images - MNIST_MEAN) / MNIST_STD
+    return torch.from_numpy(images), torch.from_numpy(samples[:, 784].astype(np.int64))
+
+
+def probabilities(model, images, batch_size=1000):
+    return torch.cat([
+        torch.softmax(model(images[i:i + batch_size].unsqueeze(1)), dim=1)
+        for i in range(0, len(images), batch_size)
+    ])
+
+
+def median_ms(run, repeat):
+    """Median time of `repeat` calls, after a few warm-up calls."""
+    for _ in range(3):
+        run()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return round(statistics.median(times) * 1000, 3)
+
+
+def bench(model_types, backends, images, labels, batch_sizes, repeat):
+    results = []
+    options = ActivationOptions(encoding="u8")
+    one = images[:1]
+    for model_type in model_types:
+        eager = load_eager(model_type)
+        with torch.no_grad():
+            reference = probabilities(eager, images)
+
+        for backend in backends:
+            start = time.perf_counter()
+            model = build_backend(load_eager(model_type), backend)
+            build_ms = round((time.perf_counter() - start) * 1000, 1)
+
+            with torch.no_grad():
+                probs = probabilities(model, images)
+                predictions = probs.argmax(dim=1)
+                entry = {
+                    "model": model_type,
+                    "backend": backend,
+                    "build_ms": build_ms,
+                    "accuracy": round(predictions.eq(labels).float().mean().item() * 100, 2),
+                    "agreement": round(
+                        predictions.eq(reference.argmax(dim=1)).float().mean().item() * 100, 2),
+                    "max_prob_diff": round((probs - reference).abs().max().item(), 6),
+                    "batch1_ms": median_ms(lambda: model(one.unsqueeze(1)), repeat),
+                    "batch1_activations_ms": median_ms(
+                        lambda: extract_activations(model, one, options), repeat),
+                }
+                for batch_size in batch_sizes:
+                    batch = images[:batch_size].unsqueeze(1)
+                    ms = median_ms(lambda: model(batch), max(1, repeat // 10))
+                    entry[f"batch{batch_size}_images_per_sec"] = round(len(batch) / ms * 1000)
+
+            results.append(entry)
+            print(f"  {model_type:4s} {backend:12s} acc {entry['accuracy']:6.2f}% "
+                  f"agree {entry['agreement']:6.2f}% batch1 {entry['batch1_ms']:7.3f} ms "
+                  f"with activations {entry['batch1_activations_ms']:7.3f} ms", file=sys.stderr)
+    return results
+
+
+def markdown_rows(results):
+    """Rows of the DOCKER.md backend table."""
+    return [
+        f"| {entry['model']} | `{entry['backend']}` | {entry['batch1_ms']:.3f} ms "
+        f"| {entry['batch1_activations_ms']:.3f} ms | {entry['accuracy']:.2f}% "
+        f"| {entry['agreement']:.2f}% |"
+        for entry in results
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models", nargs="+", choices=sorted(MODELS), default=["nn", "cnn"])
+    parser.add_argument("--backends", nargs="+", choices=INFERENCE_BACKENDS,
+                        default=list(INFERENCE_BACKENDS))
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[32, 256])
+    parser.add_argument("--repeat", type=int, default=200,
+                        help="timed calls per single-image latency (a tenth for batches)")
+    parser.add_argument("--limit", type=int, default=None,
+                        help="test images used for accuracy (default: all)")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="torch intra-op threads (default: torch's)")
+    parser.add_argument("--output", help="write the JSON here (default: stdout)")
+    parser.add_argument("--markdown", action="store_true",
+                        help="also print the results as DOCKER.md table rows (stderr)")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    images, labels = load_test_set(args.limit)
+    results = bench(args.models, args.backends, images, labels, args.batch_sizes, args.repeat)
+    report = {
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "platform": platform.platform(),
+        "threads": torch.get_num_threads(),
+        "test_images": len(images),
+        "results": results,
+    }
+
+    if args.markdown:
+        print("\n".join(markdown_rows(results)), file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
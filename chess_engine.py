@@ -1,10 +1,19 @@
 """Chess engine with Alpha-Beta pruning and tree recording for visualization."""
 
+import ast
+import ctypes
+import hashlib
 import math
+import multiprocessing
 import threading
 import time
+import types
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, wait
 
 import chess
+import chess.polyglot
 
 # ============================================================
 # DEFAULT EVALUATION FUNCTION
@@ -65,18 +74,92 @@ RESTRICTED_BUILTINS = {
 }
 
 
-def compile_user_eval(code_string):
-    """Compile the user evaluation function.
+EVAL_COMPILE_CACHE_SIZE = 64
+
+# Successful validate-eval results kept per compiled eval
+EVAL_VALIDATIONS_PER_CODE = 32
+
+
+def normalize_eval_code(code_string):
+    """Eval source as compiled and hashed: LF line endings, no trailing
+    whitespace (leading lines are kept so error line numbers match)."""
+    return code_string.replace("\r\n", "\n").rstrip()
+
+
+def eval_code_hash(code_string):
+    """Content hash of an eval source (see normalize_eval_code)."""
+    return hashlib.sha256(normalize_eval_code(code_string).encode()).hexdigest()
+
+
+DEFAULT_EVAL_HASH = eval_code_hash(DEFAULT_EVAL_CODE)
+
+
+def is_default_eval(code_string):
+    """True when the submitted code is the unmodified DEFAULT_EVAL_CODE."""
+    return eval_code_hash(code_string) == DEFAULT_EVAL_HASH
+
+
+# Name of check_eval_timeout in the namespace of user code
+EVAL_GUARD_NAME = "__check_eval_timeout__"
+
+
+class _TimeoutGuards(ast.NodeTransformer):
+    """Call check_eval_timeout first in every handler that can swallow an
+    exception: except clauses, finally blocks and __exit__ methods."""
+
+    def _guarded(self, body, node):
+        guard = ast.Expr(ast.Call(ast.Name(EVAL_GUARD_NAME, ast.Load()), [], []))
+        return [ast.copy_location(guard, node), *body]
+
+    def visit_ExceptHandler(self, node):
+        self.generic_visit(node)
+        node.body = self._guarded(node.body, node)
+        return node
+
+    def visit_Try(self, node):
+        self.generic_visit(node)
+        if node.finalbody:
+            node.finalbody = self._guarded(node.finalbody, node.finalbody[0])
+        return node
+
+    visit_TryStar = visit_Try
 
-    Returns (eval_fn, error_string). eval_fn is None on error.
+    def visit_FunctionDef(self, node):
+        self.generic_visit(node)
+        if node.name in ("__exit__", "__aexit__"):
+            node.body = self._guarded(node.body, node.body[0])
+        return node
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+
+def _compile_user_eval(code_string):
+    """Compile the user code: (code object, error_string)."""
+    if EVAL_GUARD_NAME in code_string:
+        return None, f"Erreur de syntaxe: nom reserve {EVAL_GUARD_NAME}"
+    try:
+        tree = ast.fix_missing_locations(_TimeoutGuards().visit(ast.parse(code_string)))
+        return compile(tree, "<string>", "exec"), None
+    except Exception as e:
+        return None, f"Erreur de syntaxe: {e}"
+
+
+def _exec_user_eval(code):
+    """Run compiled user code in a fresh namespace: (eval_fn, error_string).
+
+    The namespace gets its own copy of the chess module's attributes, so
+    module-level state and rebound names stay within one search.
     """
+    chess_module = types.ModuleType("chess")
+    chess_module.__dict__.update(chess.__dict__)
     namespace = {
-        "chess": chess,
+        "chess": chess_module,
         "__builtins__": RESTRICTED_BUILTINS,
+        EVAL_GUARD_NAME: check_eval_timeout,
     }
 
     try:
-        exec(code_string, namespace)
+        exec(code, namespace)
     except Exception as e:
         return None, f"Erreur de syntaxe: {e}"
 
@@ -89,6 +172,104 @@ def compile_user_eval(code_string):
     return namespace["evaluate"], None
 
 
+class CompiledEval:
+    """A compiled evaluation function and what is known about it.
+
+    code: normalized source; code_hash: eval_code_hash(code)
+    error: compile error, or error of the first run of the module code
+    is_default: the code is DEFAULT_EVAL_CODE (native evaluator available)
+    validations: FEN -> score of successful validate-eval runs (bounded LRU)
+
+    Only the code object is shared: new_eval_fn() runs it in a fresh
+    namespace for each search, so requests never share user globals.
+    """
+
+    def __init__(self, code_string, code_hash):
+        self.code = normalize_eval_code(code_string)
+        self.code_hash = code_hash
+        self.code_object, self.error = _compile_user_eval(self.code)
+        if self.error is None:
+            _, self.error = _exec_user_eval(self.code_object)
+        self.is_default = code_hash == DEFAULT_EVAL_HASH
+        self.validations = OrderedDict()
+        self.lock = threading.Lock()
+
+    def new_eval_fn(self):
+        """A new evaluate function, or None on error."""
+        if self.error is not None:
+            return None
+        eval_fn, _ = _exec_user_eval(self.code_object)
+        return eval_fn
+
+    def get_validation(self, fen):
+        with self.lock:
+            score = self.validations.get(fen)
+            if score is not None:
+                self.validations.move_to_end(fen)
+            return score
+
+    def set_validation(self, fen, score):
+        with self.lock:
+            self.validations[fen] = score
+            if len(self.validations) > EVAL_VALIDATIONS_PER_CODE:
+                self.validations.popitem(last=False)
+
+
+class EvalCompileCache:
+    """Bounded LRU of CompiledEval keyed by content hash (one per process)."""
+
+    def __init__(self, size=EVAL_COMPILE_CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, code_string):
+        code_hash = eval_code_hash(code_string)
+        with self.lock:
+            compiled = self.entries.get(code_hash)
+            if compiled is not None:
+                self.entries.move_to_end(code_hash)
+                self.hits += 1
+                return compiled
+            self.misses += 1
+
+        # Compile outside the lock; a concurrent miss on the same code just
+        # compiles it twice
+        compiled = CompiledEval(code_string, code_hash)
+        with self.lock:
+            self.entries[code_hash] = compiled
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        return compiled
+
+    def get_stats(self):
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+compiled_evals = EvalCompileCache()
+
+
+def get_compiled_eval(code_string):
+    """Return the CompiledEval of code_string, compiling it on a cache miss."""
+    return compiled_evals.get(code_string)
+
+
+def compile_user_eval(code_string):
+    """Compile the user evaluation function (cached by content hash).
+
+    Returns (eval_fn, error_string). eval_fn is None on error; each call
+    returns a function with its own namespace.
+    """
+    compiled = compiled_evals.get(code_string)
+    return compiled.new_eval_fn(), compiled.error
+
+
 def execute_eval(eval_fn, board, timeout=2):
     """Execute the evaluation function with a timeout.
 
@@ -116,35 +297,941 @@ def execute_eval(eval_fn, board, timeout=2):
     return result_holder[0], None
 
 
+def _set_async_exc(thread_id, exc_type):
+    """Raise exc_type asynchronously in a thread (None clears a pending one)."""
+    ctypes.pythonapi.PyThreadState_SetAsyncExc(
+        ctypes.c_ulong(thread_id), ctypes.py_object(exc_type) if exc_type else None
+    )
+
+
+class EvalTimeout(BaseException):
+    """Raised inside user code when its time budget is exhausted.
+
+    Derives from BaseException so that `except Exception` in user code
+    cannot swallow it; handlers that catch it anyway raise it again (see
+    check_eval_timeout).
+    """
+
+
+# InlineEvaluator running user code in this thread
+_inline_calls = threading.local()
+
+
+def check_eval_timeout():
+    """Raise EvalTimeout if this thread's user eval call is past its
+    deadline.
+
+    Called first thing in every exception handler, finally block and
+    __exit__ method of user code (see _exec_user_eval): a bare `except:`
+    can then catch the watchdog's EvalTimeout but not keep running.
+    """
+    evaluator = getattr(_inline_calls, "evaluator", None)
+    if evaluator is not None and evaluator._call is not None \
+            and evaluator._fired == evaluator._call:
+        raise EvalTimeout
+
+
+class InlineEvaluator:
+    """Run evaluate(board) directly in the search thread.
+
+    Instead of spawning a thread per leaf, a single watchdog thread per
+    search checks the deadline of the running call and, when it passes,
+    raises EvalTimeout inside the search thread (PyThreadState_SetAsyncExc).
+    After a timeout the evaluator stops calling user code and returns 0.0
+    for the remaining leaves, so a slow evaluation costs at most one timeout
+    per search. Other exceptions only score their own leaf 0.0; the first
+    one is reported in `error`.
+
+    Each call gets a token: the watchdog only targets the call whose token
+    is current, and the token is cleared before anything else runs when the
+    call returns. The pending exception is then dropped under the
+    watchdog's lock, so it cannot reach the search outside user code.
+
+    The exception is raised again on every interval until the call
+    returns, and handlers in user code that catch it raise it again (see
+    check_eval_timeout), so a catch-all loop cannot keep running. A call
+    that swallowed the exception and returned still counts as timed out.
+
+    Calls into C code (e.g. sum(range(10**12))) are only interrupted once
+    they return to Python.
+    """
+
+    WATCHDOG_INTERVAL = 0.05
+
+    def __init__(self, eval_fn, timeout=2):
+        self.eval_fn = eval_fn
+        self.timeout = timeout
+        self.error = None
+        self.timed_out = False
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._call = None  # token of the running call
+        self._fired = None  # token of the last call EvalTimeout was raised in
+        self._deadline = 0.0
+        self._thread_id = None
+        self._stop = threading.Event()
+        self._watchdog = None
+
+    def _watch(self):
+        while not self._stop.wait(self.WATCHDOG_INTERVAL):
+            with self._lock:
+                call = self._call
+                if call is not None and time.perf_counter() > self._deadline:
+                    self._fired = call
+                    _set_async_exc(self._thread_id, EvalTimeout)
+
+    def _start_watchdog(self):
+        self._thread_id = threading.get_ident()
+        _inline_calls.evaluator = self
+        self._watchdog = threading.Thread(target=self._watch, daemon=True)
+        self._watchdog.start()
+
+    def close(self):
+        """Stop the watchdog thread."""
+        self._stop.set()
+        if getattr(_inline_calls, "evaluator", None) is self:
+            _inline_calls.evaluator = None
+
+    def __call__(self, board):
+        if self.timed_out:
+            return 0.0
+        if self._watchdog is None:
+            self._start_watchdog()
+        self.calls += 1
+        token = self.calls
+        position = board.copy(stack=False)
+        score = 0.0
+        try:
+            self._deadline = time.perf_counter() + self.timeout
+            self._call = token
+            try:
+                score = float(self.eval_fn(position))
+            finally:
+                # Plain store first: no call, so no async exception in between
+                self._call = None
+                with self._lock:
+                    # Drop a timeout that was raised but not yet delivered
+                    _set_async_exc(self._thread_id, None)
+        except EvalTimeout:
+            pass
+        except Exception as e:
+            if self.error is None and self._fired != token:
+                self.error = f"Erreur d'execution: {e}"
+        if self._fired == token:
+            # Also when user code caught the timeout and returned a score
+            self.timed_out = True
+            self.error = f"Temps d'execution depasse ({self.timeout}s)"
+            return 0.0
+        return score
+
+
+class ThreadEvaluator:
+    """Run evaluate(board) through execute_eval (one thread per call)."""
+
+    def __init__(self, eval_fn, timeout=2):
+        self.eval_fn = eval_fn
+        self.timeout = timeout
+        self.error = None
+        self.calls = 0
+
+    def close(self):
+        pass
+
+    def __call__(self, board):
+        self.calls += 1
+        score, err = execute_eval(self.eval_fn, board, timeout=self.timeout)
+        if err:
+            if self.error is None:
+                self.error = err
+            return 0.0
+        return score
+
+
+EVALUATORS = {
+    "inline": InlineEvaluator,
+    "thread": ThreadEvaluator,
+}
+
+
 # ============================================================
-# ALPHA-BETA WITH TREE RECORDING
+# BUILT-IN EVALUATOR AND EVAL CACHE
 # ============================================================
 
-CHECKMATE_SCORE = 99999
+# Same values as DEFAULT_EVAL_CODE
+MATERIAL_VALUES = (
+    (chess.PAWN, 100),
+    (chess.KNIGHT, 320),
+    (chess.BISHOP, 330),
+    (chess.ROOK, 500),
+    (chess.QUEEN, 900),
+)
 
+EVAL_CACHE_SIZE = 1 << 17
 
-def _order_moves(board):
-    """Order moves: captures first (MVV-LVA), then checks, then rest."""
-    captures = []
-    checks = []
-    others = []
 
-    for move in board.legal_moves:
-        if board.is_capture(move):
-            # MVV-LVA ordering
-            victim = board.piece_type_at(move.to_square) or 0
-            attacker = board.piece_type_at(move.from_square) or 0
-            captures.append((move, victim * 10 - attacker))
-        else:
+class MaterialEvaluator:
+    """Native version of DEFAULT_EVAL_CODE, used when the user keeps it.
+
+    Counts material with popcounts on the python-chess bitboards instead of
+    running board.piece_map() through exec'd code, and gives exactly the same
+    scores. Same interface as InlineEvaluator.
+    """
+
+    def __init__(self):
+        self.error = None
+        self.calls = 0
+
+    def close(self):
+        pass
+
+    def __call__(self, board):
+        self.calls += 1
+        score = 0
+        for piece_type, value in MATERIAL_VALUES:
+            score += value * (board.pieces_mask(piece_type, chess.WHITE).bit_count()
+                              - board.pieces_mask(piece_type, chess.BLACK).bit_count())
+        return float(score)
+
+
+class EvalCache:
+    """Bounded LRU cache of evaluations keyed by (Zobrist hash, code hash).
+
+    Shared by all the searches of a process: the code hash keeps the scores
+    of different evaluation functions apart.
+    """
+
+    def __init__(self, size=EVAL_CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            score = self.entries.get(key)
+            if score is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return score
+
+    def put(self, key, score):
+        with self.lock:
+            self.entries[key] = score
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get_stats(self):
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+eval_cache = EvalCache()
+
+
+class CachedEvaluator:
+    """Wrap an evaluator with the eval cache.
+
+    Scores are only cached while the wrapped evaluator has no error (after an
+    error it returns placeholder zeros). Hits and misses of this search are
+    counted on the wrapper.
+    """
+
+    def __init__(self, evaluator, code_hash, cache=None):
+        self.evaluator = evaluator
+        self.code_hash = code_hash
+        self.cache = cache or eval_cache
+        self.calls = 0
+        self.hits = 0
+        self.misses = 0
+        if hasattr(evaluator, "prefetch"):
+            self.prefetch = self._prefetch
+
+    @property
+    def error(self):
+        return self.evaluator.error
+
+    @error.setter
+    def error(self, value):
+        self.evaluator.error = value
+
+    def close(self):
+        self.evaluator.close()
+
+    def _prefetch(self, board, moves):
+        """Forward the moves whose positions are not cached yet."""
+        missing = []
+        for move in moves:
             board.push(move)
-            if board.is_check():
-                checks.append(move)
-            else:
-                others.append(move)
+            if (chess.polyglot.zobrist_hash(board), self.code_hash) not in self.cache.entries:
+                missing.append(move)
             board.pop()
+        if missing:
+            self.evaluator.prefetch(board, missing)
+
+    def __call__(self, board):
+        self.calls += 1
+        key = (chess.polyglot.zobrist_hash(board), self.code_hash)
+        score = self.cache.get(key)
+        if score is not None:
+            self.hits += 1
+            return score
+        self.misses += 1
+        score = self.evaluator(board)
+        if self.evaluator.error is None:
+            self.cache.put(key, score)
+        return score
+
+    def get_stats(self):
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / self.calls, 3) if self.calls else None}
+
+
+def make_evaluator(compiled, eval_mode="inline", timeout=2):
+    """Build the evaluator of a search from a CompiledEval.
+
+    The unmodified default code runs natively (MaterialEvaluator). Other code
+    runs according to eval_mode, behind the eval cache. In sandbox mode, use
+    make_sandbox_evaluator(): user code must not be compiled in this process.
+    """
+    if compiled.is_default:
+        return MaterialEvaluator()
+    evaluator = EVALUATORS[eval_mode](compiled.new_eval_fn(), timeout=timeout)
+    return CachedEvaluator(evaluator, compiled.code_hash)
+
+
+def make_sandbox_evaluator(eval_code, timeout=2):
+    """Build a sandbox evaluator of user code: (evaluator, error).
+
+    The code is compiled, and its module-level statements run, in the
+    sandbox process only. evaluator is None when loading failed.
+    """
+    from eval_sandbox import SandboxEvaluator
+    evaluator = SandboxEvaluator(eval_code, timeout=timeout)
+    error = evaluator.load()
+    if error is not None:
+        evaluator.close()
+        return None, error
+    return CachedEvaluator(evaluator, eval_code_hash(eval_code)), None
+
+
+def search_evaluator(eval_code, eval_mode="inline"):
+    """Evaluator of a search: (evaluator, eval_error, code).
+
+    After a compile error the default evaluation is used, and code is
+    DEFAULT_EVAL_CODE.
+    """
+    if eval_mode == "sandbox" and not is_default_eval(eval_code):
+        evaluator, error = make_sandbox_evaluator(eval_code)
+        if evaluator is not None:
+            return evaluator, None, eval_code
+    else:
+        compiled = get_compiled_eval(eval_code)
+        error = compiled.error
+        if compiled.error is None:
+            return make_evaluator(compiled, eval_mode), None, eval_code
+
+    # Fallback: use default eval
+    return make_evaluator(get_compiled_eval(DEFAULT_EVAL_CODE)), error, DEFAULT_EVAL_CODE
+
+
+# ============================================================
+# TRANSPOSITION TABLE
+# ============================================================
+
+TT_SIZE = 1 << 16
+
+TT_EXACT = 0
+TT_LOWER = 1  # value is a lower bound (search failed high)
+TT_UPPER = 2  # value is an upper bound (search failed low)
+
+# Approximate size of a stored entry (tuple, its ints/float and the move)
+TT_ENTRY_BYTES = 200
+
+
+class TranspositionTable:
+    """Bounded transposition table keyed by the Polyglot Zobrist hash.
+
+    Entries are stored in a fixed number of slots (key modulo size), so memory
+    never grows past `size` entries. Replacement policy: a slot is overwritten
+    when it holds an entry from an older search, or when the new entry was
+    searched at least as deep as the one in place.
+
+    Entries from older searches are still probed: a table may only be reused
+    across searches with the same evaluation and quiescence setting.
+    """
+
+    def __init__(self, size=TT_SIZE):
+        self.size = size
+        # Each slot: (key, depth, flag, value, best_move, generation)
+        self.slots = [None] * size
+        self.used = 0
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+        self.cutoffs = 0
+        self.stores = 0
+        self.collisions = 0
+
+    def new_search(self):
+        """Age existing entries and reset the per-search counters."""
+        self.generation += 1
+        self.probes = 0
+        self.hits = 0
+        self.cutoffs = 0
+        self.stores = 0
+        self.collisions = 0
+
+    def probe(self, key):
+        """Return the entry stored for `key`, or None."""
+        self.probes += 1
+        entry = self.slots[key % self.size]
+        if entry is None:
+            return None
+        if entry[0] != key:
+            self.collisions += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def store(self, key, depth, flag, value, best_move):
+        index = key % self.size
+        entry = self.slots[index]
+        if (entry is not None and entry[0] != key
+                and entry[5] == self.generation and entry[1] > depth):
+            return
+        if entry is None:
+            self.used += 1
+        self.slots[index] = (key, depth, flag, value, best_move, self.generation)
+        self.stores += 1
+
+    def approx_bytes(self):
+        """Rough memory footprint, used to cap the tables kept between moves."""
+        return 8 * self.size + TT_ENTRY_BYTES * self.used
+
+    def get_stats(self):
+        return {
+            "probes": self.probes,
+            "hits": self.hits,
+            "cutoffs": self.cutoffs,
+            "stores": self.stores,
+            "collisions": self.collisions,
+        }
+
+    def __getstate__(self):
+        """Compact pickled form: the used slots as typed arrays (a table
+        goes to a search process and back for every job in process mode)."""
+        state = self.__dict__.copy()
+        used = [(index, entry) for index, entry in enumerate(self.slots) if entry is not None]
+        indexes = [index for index, _ in used]
+        entries = [entry for _, entry in used]
+        keys, depths, flags, values, moves, generations = zip(*entries) if entries else [()] * 6
+        state["slots"] = (
+            array("I", indexes), array("Q", keys), array("h", depths), array("b", flags),
+            array("d", values), array("H", [_pack_move(move) for move in moves]),
+            array("I", generations),
+        )
+        return state
+
+    def __setstate__(self, state):
+        indexes, keys, depths, flags, values, moves, generations = state.pop("slots")
+        self.__dict__.update(state)
+        self.slots = slots = [None] * self.size
+        entries = zip(keys, depths, flags, values, map(_unpack_move, moves), generations)
+        for index, entry in zip(indexes, entries):
+            slots[index] = entry
+
+
+def _pack_move(move):
+    """16-bit form of a move (or None) for TranspositionTable pickles."""
+    if move is None:
+        return 0xFFFF
+    return move.from_square | move.to_square << 6 | (move.promotion or 0) << 12
+
+
+def _unpack_move(packed):
+    if packed == 0xFFFF:
+        return None
+    return chess.Move(packed & 63, packed >> 6 & 63, packed >> 12 or None)
+
+
+# ============================================================
+# COMPACT SEARCH TREE
+# ============================================================
+
+NODE_MAXIMIZING = 1
+NODE_LEAF = 2
+NODE_PRUNED = 4
+NODE_TERMINAL = 8
+NODE_TT_HIT = 16
+NODE_BEST_PATH = 32
+NODE_QUIESCENCE = 64
+
+NAN = float("nan")
 
-    captures.sort(key=lambda x: -x[1])
-    return [m for m, _ in captures] + checks + others
+
+def _encode_move(move):
+    """Pack a move into 16 bits (0 means no move: a1a1 is never legal)."""
+    if move is None:
+        return 0
+    return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+
+
+def _decode_move(code):
+    if code == 0:
+        return None
+    return chess.Move(code & 63, (code >> 6) & 63, (code >> 12) or None)
+
+
+class SearchTree:
+    """Search tree recorded as parallel arrays (struct of arrays).
+
+    Node i is described by parent[i] (-1 for the root), move[i] (encoded move
+    leading to it), depth[i], flags[i] (NODE_* bits), value[i], alpha[i],
+    beta[i] and eval_score[i] (NaN when unset). Nodes are appended in
+    pre-order, so node ids are array indices. SAN strings and nested dicts
+    are only built by render() for the part of the tree that is returned.
+    """
+
+    def __init__(self, root_board):
+        self.root_board = root_board.copy(stack=False)
+        self.parent = array("i")
+        self.move = array("H")
+        self.depth = array("b")
+        self.flags = array("B")
+        self.value = array("d")
+        self.alpha = array("d")
+        self.beta = array("d")
+        self.eval_score = array("d")
+        self._children = None
+
+    def __len__(self):
+        return len(self.parent)
+
+    def add_node(self, parent, move, depth, maximizing, alpha, beta, flags=0):
+        self.parent.append(parent)
+        self.move.append(_encode_move(move))
+        self.depth.append(depth)
+        self.flags.append(flags | (NODE_MAXIMIZING if maximizing else 0))
+        self.value.append(NAN)
+        self.alpha.append(alpha)
+        self.beta.append(beta)
+        self.eval_score.append(NAN)
+        self._children = None
+        return len(self.parent) - 1
+
+    def set_leaf(self, node_id, value, eval_score=NAN, flags=0):
+        self.flags[node_id] |= NODE_LEAF | flags
+        self.value[node_id] = value
+        self.eval_score[node_id] = eval_score
+
+    def children(self, node_id):
+        """Child ids of a node, in search order."""
+        if self._children is None:
+            children = [[] for _ in range(len(self))]
+            for child, parent in enumerate(self.parent):
+                if parent >= 0:
+                    children[parent].append(child)
+            self._children = children
+        return self._children[node_id]
+
+    def mark_best_path(self):
+        """Flag the nodes on the best path (child value equals parent value)."""
+        node_id = 0
+        while node_id is not None:
+            self.flags[node_id] |= NODE_BEST_PATH
+            value = self.value[node_id]
+            node_id = next(
+                (c for c in self.children(node_id)
+                 if not self.flags[c] & NODE_PRUNED and self.value[c] == value),
+                None,
+            )
+
+    def principal_variation(self):
+        """Moves along the marked best path."""
+        pv = []
+        node_id = 0
+        while True:
+            node_id = next(
+                (c for c in self.children(node_id) if self.flags[c] & NODE_BEST_PATH),
+                None,
+            )
+            if node_id is None:
+                return pv
+            pv.append(_decode_move(self.move[node_id]))
+
+    def graft(self, parent, other):
+        """Append the subtrees under other's root (node 0) as children of parent."""
+        offset = len(self) - 1
+        self.parent.extend(
+            parent if other_parent == 0 else other_parent + offset
+            for other_parent in other.parent[1:]
+        )
+        self.move.extend(other.move[1:])
+        self.depth.extend(other.depth[1:])
+        self.flags.extend(other.flags[1:])
+        self.value.extend(other.value[1:])
+        self.alpha.extend(other.alpha[1:])
+        self.beta.extend(other.beta[1:])
+        self.eval_score.extend(other.eval_score[1:])
+        self._children = None
+
+    def board_at(self, node_id):
+        """Board of the position at a node (replayed from the root)."""
+        path = []
+        while node_id > 0:
+            path.append(_decode_move(self.move[node_id]))
+            node_id = self.parent[node_id]
+        board = self.root_board.copy(stack=False)
+        for move in reversed(path):
+            board.push(move)
+        return board
+
+    def _select(self, node_id, max_depth, max_children, max_nodes):
+        """Pick the nodes to render, breadth-first, within the caps."""
+        selected = {node_id: []}
+        budget = max_nodes - 1 if max_nodes is not None else math.inf
+        queue = deque([(node_id, 0)])
+        while queue:
+            current, level = queue.popleft()
+            if max_depth is not None and level >= max_depth:
+                continue
+            children = self.children(current)
+            if max_children is not None and len(children) > max_children:
+                best = [c for c in children if self.flags[c] & NODE_BEST_PATH]
+                others = [c for c in children if not self.flags[c] & NODE_BEST_PATH]
+                keep = set(best[:1] + others[:max_children - len(best[:1])])
+                children = [c for c in children if c in keep]
+            for child in children:
+                if budget <= 0:
+                    break
+                budget -= 1
+                selected[current].append(child)
+                selected[child] = []
+                queue.append((child, level + 1))
+        return selected
+
+    def _node_dict(self, node_id, san):
+        flags = self.flags[node_id]
+        value = self.value[node_id]
+        eval_score = self.eval_score[node_id]
+        return {
+            "id": node_id,
+            "move": san,
+            "depth": self.depth[node_id],
+            "is_maximizing": bool(flags & NODE_MAXIMIZING),
+            "alpha": _fmt_val(self.alpha[node_id]),
+            "beta": _fmt_val(self.beta[node_id]),
+            "value": None if math.isnan(value) else _fmt_val(value),
+            "is_leaf": bool(flags & NODE_LEAF),
+            "is_pruned": bool(flags & NODE_PRUNED),
+            "is_terminal": bool(flags & NODE_TERMINAL),
+            "is_tt_hit": bool(flags & NODE_TT_HIT),
+            "is_quiescence": bool(flags & NODE_QUIESCENCE),
+            "eval_score": None if math.isnan(eval_score) else _fmt_val(eval_score),
+            "children": [],
+            "is_best_path": bool(flags & NODE_BEST_PATH),
+        }
+
+    def render(self, node_id=0, max_depth=None, max_children=None, max_nodes=None,
+               format="nested"):
+        """Materialize the subtree under node_id for JSON output.
+
+        Args:
+            node_id: root of the returned subtree
+            max_depth: number of levels below node_id to include
+            max_children: children kept per node (the best-path child plus
+                the first siblings in search order)
+            max_nodes: overall node cap, filled breadth-first
+            format: "nested" (dicts with "children", the historical format)
+                or "arrays" (struct of arrays with parent indexes)
+
+        Children left out are counted in "children_omitted" (nested format).
+        """
+        selected = self._select(node_id, max_depth, max_children, max_nodes)
+        board = self.board_at(self.parent[node_id]) if node_id > 0 else None
+        san = board.san(_decode_move(self.move[node_id])) if board else None
+
+        if format == "arrays":
+            ids = sorted(selected)
+            return {
+                "id": ids,
+                "parent": [self.parent[i] if i != node_id else -1 for i in ids],
+                "move": [_decode_move(self.move[i]).uci() if i != 0 else None for i in ids],
+                "depth": [self.depth[i] for i in ids],
+                "value": [None if math.isnan(self.value[i]) else _fmt_val(self.value[i])
+                          for i in ids],
+                "flags": [self.flags[i] for i in ids],
+            }
+
+        board = self.board_at(node_id)
+
+        def build(current, current_san):
+            node = self._node_dict(current, current_san)
+            for child in selected[current]:
+                move = _decode_move(self.move[child])
+                child_san = board.san(move)
+                board.push(move)
+                node["children"].append(build(child, child_san))
+                board.pop()
+            omitted = len(self.children(current)) - len(selected[current])
+            if omitted:
+                node["children_omitted"] = omitted
+            return node
+
+        return build(node_id, san)
+
+
+# ============================================================
+# ALPHA-BETA WITH TREE RECORDING
+# ============================================================
+
+CHECKMATE_SCORE = 99999
+
+# Nodes between two on_progress callbacks
+PROGRESS_INTERVAL_NODES = 1000
+
+# Quiescence nodes allowed per iteration; past it, leaves stand pat
+QUIESCENCE_NODE_LIMIT = 20000
+
+# Delta pruning: captured piece values (indexed by piece type) and safety
+# margin, in the units of the default evaluation (centipawns). User
+# evaluations have no known scale, so it only applies to the default one.
+QUIESCENCE_PIECE_VALUES = [0, 100, 320, 330, 500, 900, 0]
+QUIESCENCE_DELTA_MARGIN = 200
+
+
+def default_quiescence(eval_code, eval_mode="inline"):
+    """Whether searches run quiescence unless asked otherwise.
+
+    Off for user code in sandbox mode, where each quiescence node costs a
+    round trip to the evaluator process.
+    """
+    return eval_mode != "sandbox" or is_default_eval(eval_code)
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the context deadline has passed."""
+
+
+class SearchCancelled(SearchTimeout):
+    """Raised inside the search when the caller cancelled it."""
+
+
+class SearchContext:
+    """Per-search state shared by every node of alphabeta_with_tree.
+
+    tree: SearchTree the nodes are recorded into
+    tt: TranspositionTable or None
+    deadline: time.perf_counter() value after which the search aborts
+    pv: principal variation (list of moves) of the previous iteration
+    orderer: MoveOrderer (killers, history, ordering statistics)
+    cancel: threading.Event that aborts the search when set
+    on_progress: callable(counter) invoked every PROGRESS_INTERVAL_NODES nodes
+    quiescence: search captures below depth-0 nodes (see quiescence())
+    delta_pruning: skip hopeless captures in quiescence (builtin evaluation
+        only, see QUIESCENCE_DELTA_MARGIN)
+    qnode_limit: quiescence nodes allowed per iteration
+    show_quiescence: record quiescence nodes in the tree (otherwise only
+        their value is kept on the depth-0 node)
+    keys: Zobrist keys of the positions before the current node, from the
+        game history (see _history_keys) and the search path, used to
+        detect repetitions
+    """
+
+    def __init__(self, tree=None, tt=None, deadline=None, pv=None, orderer=None,
+                 cancel=None, on_progress=None, quiescence=True, delta_pruning=False,
+                 qnode_limit=QUIESCENCE_NODE_LIMIT, show_quiescence=False):
+        self.tree = tree
+        self.quiescence = quiescence
+        self.delta_pruning = delta_pruning
+        self.qnode_limit = qnode_limit
+        self.show_quiescence = show_quiescence
+        self.keys = []
+        self.tt = tt
+        self.orderer = orderer or MoveOrderer()
+        self.deadline = deadline
+        self.pv = pv or []
+        self.cancel = cancel
+        self.on_progress = on_progress
+        self.next_report = PROGRESS_INTERVAL_NODES
+
+    def poll(self, counter):
+        """Abort on deadline or cancellation; report progress periodically."""
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        if self.cancel is not None and self.cancel.is_set():
+            raise SearchCancelled()
+        if self.on_progress is not None and counter[0] >= self.next_report:
+            self.next_report = counter[0] + PROGRESS_INTERVAL_NODES
+            self.on_progress(counter)
+
+
+def _history_keys(board):
+    """Zobrist keys of the earlier game positions that can still repeat
+    (since the last capture or pawn move), oldest first."""
+    board = board.copy()
+    keys = []
+    for _ in range(min(board.halfmove_clock, len(board.move_stack))):
+        board.pop()
+        keys.append(chess.polyglot.zobrist_hash(board))
+    keys.reverse()
+    return keys
+
+
+def _is_repetition(keys, key, halfmove_clock):
+    """True if the position `key` occurred twice before (threefold).
+
+    Only the last halfmove_clock positions can match: a capture or pawn
+    move makes every earlier position unreachable.
+    """
+    if halfmove_clock < 4:
+        return False
+    return keys[-halfmove_clock:].count(key) >= 2
+
+
+def _check_squares(board):
+    """Squares from which each piece type of the side to move would give a
+    direct check to the enemy king, indexed by piece type.
+
+    Computed once per node so that spotting checking moves needs no
+    push/pop (board.gives_check pushes and pops the move). Discovered
+    checks are not detected, which is fine for ordering.
+    """
+    king = board.king(not board.turn)
+    if king is None:
+        return [0] * 7
+    occupied = board.occupied
+    diagonal = chess.BB_DIAG_ATTACKS[king][chess.BB_DIAG_MASKS[king] & occupied]
+    straight = (chess.BB_RANK_ATTACKS[king][chess.BB_RANK_MASKS[king] & occupied]
+                | chess.BB_FILE_ATTACKS[king][chess.BB_FILE_MASKS[king] & occupied])
+    return [
+        0,
+        chess.BB_PAWN_ATTACKS[not board.turn][king],
+        chess.BB_KNIGHT_ATTACKS[king],
+        diagonal,
+        straight,
+        diagonal | straight,
+        0,
+    ]
+
+
+class MoveOrderer:
+    """Move ordering for one search, with its quality statistics.
+
+    Order: hash/PV move, captures (MVV-LVA), killer moves of the ply,
+    checking moves, then quiet moves by history score. Killers and history
+    are updated on beta cutoffs and persist across iterations.
+    """
+
+    def __init__(self):
+        self.killers = {}  # ply -> up to 2 quiet moves that caused cutoffs
+        self.history = [0] * (2 * 64 * 64)  # [turn][from][to] -> score
+        self.nodes = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.cutoff_index_sum = 0
+        self.time = 0.0
+
+    def order(self, board, moves, ply, hash_move=None):
+        """Order `moves` (the legal moves of board)."""
+        start = time.perf_counter()
+        self.nodes += 1
+        check_squares = _check_squares(board)
+        killers = self.killers.get(ply, ())
+        history = self.history
+        base = 4096 if board.turn else 0
+
+        first = []
+        captures = []
+        killer_moves = []
+        checks = []
+        quiets = []
+
+        for move in moves:
+            if move == hash_move:
+                first.append(move)
+            elif board.is_capture(move):
+                # MVV-LVA ordering
+                victim = board.piece_type_at(move.to_square) or 0
+                attacker = board.piece_type_at(move.from_square) or 0
+                captures.append((victim * 10 - attacker, move))
+            elif move in killers:
+                killer_moves.append(move)
+            else:
+                piece = move.promotion or board.piece_type_at(move.from_square)
+                if check_squares[piece] & chess.BB_SQUARES[move.to_square]:
+                    checks.append(move)
+                else:
+                    score = history[base + move.from_square * 64 + move.to_square]
+                    quiets.append((score, move))
+
+        captures.sort(key=lambda x: -x[0])
+        quiets.sort(key=lambda x: -x[0])
+        ordered = (first + [m for _, m in captures] + killer_moves + checks
+                   + [m for _, m in quiets])
+        self.time += time.perf_counter() - start
+        return ordered
+
+    def record_cutoff(self, board, move, ply, depth, index):
+        """Update statistics and heuristics after `move` (the index-th tried)
+        caused a cutoff. `board` is the position before the move."""
+        self.cutoffs += 1
+        self.cutoff_index_sum += index
+        if index == 0:
+            self.first_move_cutoffs += 1
+        if board.is_capture(move):
+            return
+        killers = self.killers.setdefault(ply, [])
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[2:]
+        base = 4096 if board.turn else 0
+        self.history[base + move.from_square * 64 + move.to_square] += depth * depth
+
+    def add_stats(self, stats):
+        """Add counters from another orderer's get_stats() (parallel workers)."""
+        self.nodes += stats["nodes"]
+        self.cutoffs += stats["cutoffs"]
+        self.first_move_cutoffs += stats["first_move_cutoffs"]
+        self.cutoff_index_sum += stats["cutoff_index_sum"]
+        self.time += stats["time_ms"] / 1000
+
+    def get_stats(self):
+        return {
+            "nodes": self.nodes,
+            "cutoffs": self.cutoffs,
+            "first_move_cutoffs": self.first_move_cutoffs,
+            "first_move_cutoff_rate": (
+                round(self.first_move_cutoffs / self.cutoffs, 3) if self.cutoffs else None
+            ),
+            "cutoff_index_sum": self.cutoff_index_sum,
+            "avg_cutoff_index": (
+                round(self.cutoff_index_sum / self.cutoffs, 2) if self.cutoffs else None
+            ),
+            "time_ms": round(self.time * 1000, 1),
+        }
+
+
+def _pv_move(board, ctx, ply):
+    """Return the previous iteration's PV move if this node lies on the PV."""
+    if ctx is None or ply >= len(ctx.pv):
+        return None
+    if ply and board.move_stack[-ply:] != ctx.pv[:ply]:
+        return None
+    return ctx.pv[ply]
 
 
 def _fmt_val(v):
@@ -156,7 +1243,85 @@ def _fmt_val(v):
     return round(v, 1)
 
 
-def alphabeta_with_tree(board, depth, alpha, beta, maximizing, eval_fn, counter):
+def _ordered_captures(board):
+    """Legal captures sorted by MVV-LVA, with the captured piece's value."""
+    captures = []
+    for move in board.generate_legal_captures():
+        victim = board.piece_type_at(move.to_square) or chess.PAWN  # en passant
+        attacker = board.piece_type_at(move.from_square)
+        captures.append((victim * 10 - attacker, QUIESCENCE_PIECE_VALUES[victim], move))
+    captures.sort(key=lambda x: -x[0])
+    return [(value, move) for _, value, move in captures]
+
+
+def quiescence(board, alpha, beta, maximizing, stand_pat, eval_fn, counter, ctx,
+               node_id, qdepth=1):
+    """Capture-only search below a depth-0 node (limits the horizon effect).
+
+    The side to move may "stand pat" on the static evaluation or try its
+    captures (MVV-LVA order). With ctx.delta_pruning, captures that cannot
+    bring the score back to the window even when winning the piece plus a
+    margin are skipped. Once ctx.qnode_limit quiescence nodes (counter[2]) have been
+    searched in the iteration, positions are no longer expanded.
+
+    Args:
+        stand_pat: static evaluation of the current position
+        node_id: tree node of the current position; quiescence nodes are
+            recorded under it only when ctx.show_quiescence is set
+        qdepth: plies below the depth-0 node (recorded as negative depths)
+
+    Returns:
+        value of the position
+    """
+    best = stand_pat
+    if maximizing:
+        if best >= beta:
+            return best
+        alpha = max(alpha, best)
+    else:
+        if best <= alpha:
+            return best
+        beta = min(beta, best)
+
+    tree = ctx.tree
+    counter[3] += 1
+    for victim_value, move in _ordered_captures(board):
+        if counter[2] >= ctx.qnode_limit:
+            break
+        if ctx.delta_pruning:
+            if maximizing and stand_pat + victim_value + QUIESCENCE_DELTA_MARGIN <= alpha:
+                continue
+            if not maximizing and stand_pat - victim_value - QUIESCENCE_DELTA_MARGIN >= beta:
+                continue
+
+        ctx.poll(counter)
+        counter[2] += 1
+        board.push(move)
+        child_id = node_id
+        if ctx.show_quiescence:
+            child_id = tree.add_node(node_id, move, -qdepth, not maximizing, alpha, beta,
+                                     NODE_QUIESCENCE)
+        child_stand_pat = eval_fn(board)
+        value = quiescence(board, alpha, beta, not maximizing, child_stand_pat, eval_fn,
+                           counter, ctx, child_id, qdepth + 1)
+        board.pop()
+        if ctx.show_quiescence:
+            tree.set_leaf(child_id, value, child_stand_pat, NODE_QUIESCENCE)
+
+        if maximizing:
+            best = max(best, value)
+            alpha = max(alpha, value)
+        else:
+            best = min(best, value)
+            beta = min(beta, value)
+        if beta <= alpha:
+            break
+
+    return best
+
+
+def alphabeta_with_tree(board, depth, alpha, beta, maximizing, eval_fn, counter,
+                        ctx, ply=0, parent=-1):
     """Alpha-beta search that records the full tree for visualization.
 
     Args:
@@ -165,165 +1330,468 @@ def alphabeta_with_tree(board, depth, alpha, beta, maximizing, eval_fn, counter)
         alpha: alpha bound
         beta: beta bound
         maximizing: True for white (max), False for black (min)
-        eval_fn: callable(board) -> float
-        counter: [node_count, pruned_count] mutable list
+        eval_fn: callable(board) -> float, e.g. an InlineEvaluator
+        counter: [node_count, pruned_count, quiescence_node_count,
+                  movegen_calls] mutable list
+        ctx: SearchContext (search tree, transposition table, ...)
+        ply: distance from the root of the search
+        parent: id of the parent node in ctx.tree (-1 for the root)
 
     Returns:
-        (value, tree_node_dict)
+        (value, node_id) -- the node is recorded in ctx.tree
     """
+    ctx.poll(counter)
+
     counter[0] += 1
-    node_id = counter[0]
+    tree = ctx.tree
+    node_id = tree.add_node(
+        parent, board.peek() if parent >= 0 else None, depth, maximizing, alpha, beta
+    )
 
-    node = {
-        "id": node_id,
-        "move": None,
-        "depth": depth,
-        "is_maximizing": maximizing,
-        "alpha": _fmt_val(alpha),
-        "beta": _fmt_val(beta),
-        "value": None,
-        "is_leaf": False,
-        "is_pruned": False,
-        "is_terminal": False,
-        "eval_score": None,
-        "children": [],
-        "is_best_path": False,
-    }
+    key = chess.polyglot.zobrist_hash(board)
+
+    # Draws by rule. The root is always searched: callers only search
+    # positions where the game goes on.
+    if ply > 0 and (board.is_insufficient_material() or board.halfmove_clock >= 100
+                    or _is_repetition(ctx.keys, key, board.halfmove_clock)):
+        tree.set_leaf(node_id, 0.0, 0.0, NODE_TERMINAL)
+        return 0.0, node_id
+
+    # Transposition table lookup (never cut at the root: we need its children).
+    # Terminal positions are never stored, so a hit needs no mate check.
+    tt = ctx.tt
+    hash_move = None
+    if tt is not None:
+        entry = tt.probe(key)
+        if entry is not None:
+            _, tt_depth, tt_flag, tt_value, hash_move, _ = entry
+            if ply > 0 and tt_depth >= depth and (
+                tt_flag == TT_EXACT
+                or (tt_flag == TT_LOWER and tt_value >= beta)
+                or (tt_flag == TT_UPPER and tt_value <= alpha)
+            ):
+                tt.cutoffs += 1
+                tree.set_leaf(node_id, tt_value, flags=NODE_TT_HIT)
+                return tt_value, node_id
+
+    # Legal moves are generated once per node; mate and stalemate follow
+    # from them. Leaves only need to know whether one legal move exists.
+    counter[3] += 1
+    if depth == 0:
+        legal_moves = None
+        has_moves = any(board.generate_legal_moves())
+    else:
+        legal_moves = list(board.generate_legal_moves())
+        has_moves = bool(legal_moves)
 
-    # Terminal or leaf node
-    if board.is_checkmate():
-        score = -CHECKMATE_SCORE if maximizing else CHECKMATE_SCORE
-        node["is_leaf"] = True
-        node["is_terminal"] = True
-        node["eval_score"] = _fmt_val(score)
-        node["value"] = _fmt_val(score)
-        return score, node
-
-    if board.is_stalemate() or board.is_insufficient_material() or board.can_claim_draw():
-        node["is_leaf"] = True
-        node["is_terminal"] = True
-        node["eval_score"] = 0.0
-        node["value"] = 0.0
-        return 0.0, node
+    if not has_moves:
+        if board.is_check():
+            score = -CHECKMATE_SCORE if maximizing else CHECKMATE_SCORE
+        else:
+            score = 0.0
+        tree.set_leaf(node_id, score, score, NODE_TERMINAL)
+        return score, node_id
 
     if depth == 0:
-        score, err = execute_eval(eval_fn, board, timeout=2)
-        if err:
-            score = 0.0
-        node["is_leaf"] = True
-        node["eval_score"] = _fmt_val(score)
-        node["value"] = _fmt_val(score)
-        return score, node
+        stand_pat = eval_fn(board)
+        if ctx.quiescence:
+            score = quiescence(board, alpha, beta, maximizing, stand_pat, eval_fn,
+                               counter, ctx, node_id)
+        else:
+            score = stand_pat
+        tree.set_leaf(node_id, score, stand_pat)
+        if tt is not None:
+            # Quiescence values are bounds when they fall outside the window
+            if not ctx.quiescence or alpha < score < beta:
+                flag = TT_EXACT
+            elif score <= alpha:
+                flag = TT_UPPER
+            else:
+                flag = TT_LOWER
+            tt.store(key, 0, flag, score, None)
+        return score, node_id
+
+    alpha_orig, beta_orig = alpha, beta
+    pv_move = _pv_move(board, ctx, ply)
+    ordered_moves = ctx.orderer.order(board, legal_moves, ply, pv_move or hash_move)
+    best_move = None
 
-    ordered_moves = _order_moves(board)
+    # Evaluators that batch work (sandbox processes) get all leaves at once
+    if depth == 1 and hasattr(eval_fn, "prefetch"):
+        eval_fn.prefetch(board, ordered_moves)
 
+    ctx.keys.append(key)
     if maximizing:
         max_eval = -math.inf
-        for move in ordered_moves:
+        for index, move in enumerate(ordered_moves):
             board.push(move)
-            child_val, child_node = alphabeta_with_tree(
-                board, depth - 1, alpha, beta, False, eval_fn, counter
+            child_val, _ = alphabeta_with_tree(
+                board, depth - 1, alpha, beta, False, eval_fn, counter, ctx,
+                ply + 1, node_id
             )
             board.pop()
 
-            child_node["move"] = board.san(move)
-            node["children"].append(child_node)
-
-            max_eval = max(max_eval, child_val)
+            if child_val > max_eval:
+                max_eval = child_val
+                best_move = move
             alpha = max(alpha, child_val)
 
             if beta <= alpha:
                 counter[1] += 1
+                ctx.orderer.record_cutoff(board, move, ply, depth, index)
                 # Mark remaining moves as pruned stubs
-                remaining = ordered_moves[ordered_moves.index(move) + 1:]
-                for pruned_move in remaining:
+                for pruned_move in ordered_moves[index + 1:]:
                     counter[0] += 1
                     counter[1] += 1
-                    stub = {
-                        "id": counter[0],
-                        "move": board.san(pruned_move),
-                        "depth": depth - 1,
-                        "is_maximizing": False,
-                        "alpha": _fmt_val(alpha),
-                        "beta": _fmt_val(beta),
-                        "value": None,
-                        "is_leaf": True,
-                        "is_pruned": True,
-                        "is_terminal": False,
-                        "eval_score": None,
-                        "children": [],
-                        "is_best_path": False,
-                    }
-                    node["children"].append(stub)
+                    tree.add_node(node_id, pruned_move, depth - 1, False, alpha, beta,
+                                  NODE_LEAF | NODE_PRUNED)
                 break
 
-        node["value"] = _fmt_val(max_eval)
-        node["alpha"] = _fmt_val(alpha)
-        node["beta"] = _fmt_val(beta)
-        return max_eval, node
+        best_value = max_eval
 
     else:
         min_eval = math.inf
-        for move in ordered_moves:
+        for index, move in enumerate(ordered_moves):
             board.push(move)
-            child_val, child_node = alphabeta_with_tree(
-                board, depth - 1, alpha, beta, True, eval_fn, counter
+            child_val, _ = alphabeta_with_tree(
+                board, depth - 1, alpha, beta, True, eval_fn, counter, ctx,
+                ply + 1, node_id
             )
             board.pop()
 
-            child_node["move"] = board.san(move)
-            node["children"].append(child_node)
-
-            min_eval = min(min_eval, child_val)
+            if child_val < min_eval:
+                min_eval = child_val
+                best_move = move
             beta = min(beta, child_val)
 
             if beta <= alpha:
                 counter[1] += 1
-                remaining = ordered_moves[ordered_moves.index(move) + 1:]
-                for pruned_move in remaining:
+                ctx.orderer.record_cutoff(board, move, ply, depth, index)
+                for pruned_move in ordered_moves[index + 1:]:
                     counter[0] += 1
                     counter[1] += 1
-                    stub = {
-                        "id": counter[0],
-                        "move": board.san(pruned_move),
-                        "depth": depth - 1,
-                        "is_maximizing": True,
-                        "alpha": _fmt_val(alpha),
-                        "beta": _fmt_val(beta),
-                        "value": None,
-                        "is_leaf": True,
-                        "is_pruned": True,
-                        "is_terminal": False,
-                        "eval_score": None,
-                        "children": [],
-                        "is_best_path": False,
-                    }
-                    node["children"].append(stub)
+                    tree.add_node(node_id, pruned_move, depth - 1, True, alpha, beta,
+                                  NODE_LEAF | NODE_PRUNED)
                 break
 
-        node["value"] = _fmt_val(min_eval)
-        node["alpha"] = _fmt_val(alpha)
-        node["beta"] = _fmt_val(beta)
-        return min_eval, node
+        best_value = min_eval
+    ctx.keys.pop()
+
+    if tt is not None:
+        if best_value <= alpha_orig:
+            flag = TT_UPPER
+        elif best_value >= beta_orig:
+            flag = TT_LOWER
+        else:
+            flag = TT_EXACT
+        tt.store(key, depth, flag, best_value, best_move)
+
+    tree.value[node_id] = best_value
+    tree.alpha[node_id] = alpha
+    tree.beta[node_id] = beta
+    return best_value, node_id
 
 
-def mark_best_path(node, target_value=None):
-    """Mark the best path in the tree by setting is_best_path flags."""
-    if target_value is None:
-        target_value = node["value"]
+# ============================================================
+# PARALLEL ROOT SEARCH
+# ============================================================
 
-    node["is_best_path"] = True
+# Concurrent searches that can be cancelled through one pool
+ROOT_CANCEL_SLOTS = 64
 
-    if not node["children"]:
-        return
+_root_pool = None
+_root_pool_lock = threading.Lock()
 
-    # Find the child whose value matches the target
-    for child in node["children"]:
-        if child["is_pruned"]:
-            continue
-        if child["value"] == node["value"]:
-            mark_best_path(child, child["value"])
-            break
+# Set in the pool processes by _init_root_process
+_root_cancel_flags = None
+
+
+def _init_root_process(cancel_flags):
+    global _root_cancel_flags
+    _root_cancel_flags = cancel_flags
+
+
+class _RootCancel:
+    """Event-like view of one search's cancel flag (pool process side)."""
+
+    def __init__(self, slot):
+        self.slot = slot
+
+    def is_set(self):
+        return _root_cancel_flags[self.slot] == 1
+
+
+class _RootPool:
+    """Process pool of the root splitting, with a shared cancel flag per
+    search using it: future.cancel() cannot stop a task already running.
+
+    A search takes a slot before submitting its tasks; the slot is freed
+    once all of them are done, so a flag is never reset under a task still
+    reading it.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context(
+            "forkserver" if "forkserver" in methods else "spawn"
+        )
+        self.cancel_flags = context.Array("b", ROOT_CANCEL_SLOTS, lock=False)
+        self.free_slots = list(range(ROOT_CANCEL_SLOTS))
+        self.lock = threading.Lock()
+        self.executor = ProcessPoolExecutor(
+            workers, mp_context=context,
+            initializer=_init_root_process, initargs=(self.cancel_flags,),
+        )
+
+    def submit(self, tasks):
+        """Submit the tasks of one search: (futures, slot).
+
+        slot is None when every slot is taken; the tasks then only stop
+        at their deadline.
+        """
+        with self.lock:
+            slot = self.free_slots.pop() if self.free_slots else None
+            if slot is not None:
+                self.cancel_flags[slot] = 0
+        futures = [
+            self.executor.submit(_search_root_moves, dict(task, slot=slot))
+            for task in tasks
+        ]
+        if slot is not None:
+            remaining = [len(futures)]
+
+            def task_done(_):
+                with self.lock:
+                    remaining[0] -= 1
+                    if remaining[0] == 0:
+                        self.free_slots.append(slot)
+
+            for future in futures:
+                future.add_done_callback(task_done)
+        return futures, slot
+
+    def cancel(self, futures, slot):
+        """Stop the tasks of one search, queued or running."""
+        for future in futures:
+            future.cancel()
+        if slot is not None:
+            with self.lock:
+                self.cancel_flags[slot] = 1
+
+
+def _get_root_pool(workers):
+    """Return the process pool used for root splitting, with at least
+    `workers` processes.
+
+    There is one pool per process, created on first use. A search asking
+    for more workers than it has replaces it; the old pool is shut down
+    once the searches still using it are done. A search asking for fewer
+    submits fewer tasks, so it never uses more processes than it asked for.
+    """
+    global _root_pool
+    with _root_pool_lock:
+        if _root_pool is None or _root_pool.workers < workers:
+            if _root_pool is not None:
+                _root_pool.executor.shutdown(wait=False)
+            _root_pool = _RootPool(workers)
+        return _root_pool
+
+
+def _search_root_moves(task):
+    """Worker process: search a subset of the root moves.
+
+    The subtrees are recorded under a root node of a fresh SearchTree, which
+    is sent back to be grafted into the main tree.
+    """
+    start = time.process_time()
+    board = chess.Board(task["fen"])
+    for uci in task["history"]:
+        board.push_uci(uci)
+
+    # Same evaluator as the sequential search (eval_code already fell back to
+    # the default code if it did not compile)
+    evaluator, _, _ = search_evaluator(task["eval_code"], task["eval_mode"])
+    depth = task["depth"]
+    maximizing = task["maximizing"]
+    alpha, beta = task["alpha"], task["beta"]
+
+    tree = SearchTree(board)
+    root = tree.add_node(-1, None, depth, maximizing, alpha, beta)
+    deadline = task["time_left"]
+    ctx = SearchContext(
+        tree=tree, tt=TranspositionTable(TT_SIZE),
+        deadline=time.perf_counter() + deadline if deadline is not None else None,
+        cancel=_RootCancel(task["slot"]) if task["slot"] is not None else None,
+        quiescence=task["quiescence"], delta_pruning=task["delta_pruning"],
+        qnode_limit=task["qnode_limit"], show_quiescence=task["show_quiescence"],
+    )
+    ctx.keys = _history_keys(board) + [chess.polyglot.zobrist_hash(board)]
+    counter = [0, 0, 0, 0]
+    values = []
+    search_ms = 0.0
+    timed_out = False
+
+    try:
+        for uci in task["root_moves"]:
+            move_start = time.process_time()
+            board.push_uci(uci)
+            value, _ = alphabeta_with_tree(
+                board, depth - 1, alpha, beta, not maximizing, evaluator, counter,
+                ctx, 1, root
+            )
+            board.pop()
+            search_ms += (time.process_time() - move_start) * 1000
+            values.append(value)
+            # Bounds found here only tighten this worker's own window
+            if maximizing:
+                alpha = max(alpha, value)
+            else:
+                beta = min(beta, value)
+    except SearchTimeout:
+        timed_out = True
+    finally:
+        evaluator.close()
+
+    return {
+        "tree": tree,
+        "values": values,
+        "nodes": counter[0],
+        "pruned": counter[1],
+        "qnodes": counter[2],
+        "movegen_calls": counter[3],
+        "tt": ctx.tt.get_stats(),
+        "ordering": ctx.orderer.get_stats(),
+        "eval_calls": evaluator.calls,
+        "eval_cache": (evaluator.get_stats()
+                       if isinstance(evaluator, CachedEvaluator) else None),
+        "eval_error": evaluator.error,
+        "cpu_ms": (time.process_time() - start) * 1000,
+        "search_ms": search_ms,
+        "timed_out": timed_out,
+    }
+
+
+def _parallel_root_search(board, depth, maximizing, eval_code, eval_mode, eval_fn,
+                          counter, ctx, workers, parallel_stats):
+    """Root-splitting search across a process pool.
+
+    The first root move (PV / best ordered move) is searched locally to get a
+    bound; the remaining root moves are dealt round-robin to `workers`
+    processes which search them with that bound as their initial window.
+    Their subtrees are grafted under the root of ctx.tree, so the result has
+    the same shape as a sequential search.
+
+    Returns the root value.
+    """
+    counter[3] += 1
+    ordered_moves = ctx.orderer.order(
+        board, list(board.generate_legal_moves()), 0, _pv_move(board, ctx, 0)
+    )
+    if len(ordered_moves) < 2:
+        value, _ = alphabeta_with_tree(
+            board, depth, -math.inf, math.inf, maximizing, eval_fn, counter, ctx
+        )
+        return value
+
+    start = time.perf_counter()
+    cpu_start = time.thread_time()
+    tree = ctx.tree
+    counter[0] += 1
+    root = tree.add_node(-1, None, depth, maximizing, -math.inf, math.inf)
+
+    ctx.keys.append(chess.polyglot.zobrist_hash(board))
+    board.push(ordered_moves[0])
+    best_value, _ = alphabeta_with_tree(
+        board, depth - 1, -math.inf, math.inf, not maximizing, eval_fn, counter,
+        ctx, 1, root
+    )
+    board.pop()
+    ctx.keys.pop()
+    local_cpu_ms = (time.thread_time() - cpu_start) * 1000
+
+    if maximizing:
+        alpha, beta = best_value, math.inf
+    else:
+        alpha, beta = -math.inf, best_value
+
+    time_left = None
+    if ctx.deadline is not None:
+        time_left = max(0.0, ctx.deadline - time.perf_counter())
+
+    root_board = board.root()
+    base_task = {
+        "fen": root_board.fen(),
+        "history": [m.uci() for m in board.move_stack],
+        "eval_code": eval_code,
+        "eval_mode": eval_mode,
+        "depth": depth,
+        "maximizing": maximizing,
+        "alpha": alpha,
+        "beta": beta,
+        "time_left": time_left,
+        "quiescence": ctx.quiescence,
+        "delta_pruning": ctx.delta_pruning,
+        "show_quiescence": ctx.show_quiescence,
+    }
+    rest = ordered_moves[1:]
+    tasks = min(workers, len(rest))
+    # Split what is left of the iteration's quiescence budget between workers
+    base_task["qnode_limit"] = max(0, ctx.qnode_limit - counter[2]) // tasks
+    pool = _get_root_pool(workers)
+    futures, slot = pool.submit([
+        dict(base_task, root_moves=[m.uci() for m in rest[i::workers]])
+        for i in range(workers) if rest[i::workers]
+    ])
+
+    # Wait for the workers, staying responsive to cancellation
+    pending = set(futures)
+    while pending:
+        if ctx.cancel is not None and ctx.cancel.is_set():
+            pool.cancel(pending, slot)
+            raise SearchCancelled()
+        _, pending = wait(pending, timeout=0.1)
+
+    worker_cpu_ms = 0.0
+    worker_search_ms = 0.0
+    for future in futures:
+        result = future.result()
+        if result["timed_out"]:
+            raise SearchTimeout()
+        tree.graft(root, result["tree"])
+        counter[0] += result["nodes"]
+        counter[1] += result["pruned"]
+        counter[2] += result["qnodes"]
+        counter[3] += result["movegen_calls"]
+        worker_cpu_ms += result["cpu_ms"]
+        worker_search_ms += result["search_ms"]
+        if ctx.tt is not None:
+            for key, count in result["tt"].items():
+                setattr(ctx.tt, key, getattr(ctx.tt, key) + count)
+        ctx.orderer.add_stats(result["ordering"])
+        if hasattr(eval_fn, "calls"):
+            eval_fn.calls += result["eval_calls"]
+        if result["eval_cache"] and hasattr(eval_fn, "hits"):
+            eval_fn.hits += result["eval_cache"]["hits"]
+            eval_fn.misses += result["eval_cache"]["misses"]
+        if result["eval_error"] and getattr(eval_fn, "error", None) is None:
+            eval_fn.error = result["eval_error"]
+        for value in result["values"]:
+            if (value > best_value) if maximizing else (value < best_value):
+                best_value = value
+
+    wall_ms = (time.perf_counter() - start) * 1000
+    tree.value[root] = best_value
+    if maximizing:
+        tree.alpha[root] = best_value
+    else:
+        tree.beta[root] = best_value
+
+    parallel_stats["tasks"] += len(futures)
+    parallel_stats["cpu_time_ms"] += local_cpu_ms + worker_cpu_ms
+    parallel_stats["root_moves_time_ms"] += local_cpu_ms + worker_search_ms
+    parallel_stats["wall_time_ms"] += wall_ms
+    return best_value
 
 
 # ============================================================
@@ -362,67 +1830,311 @@ def get_game_status(board):
     return "playing"
 
 
+# ============================================================
+# PRE-SEARCH SHORTCUTS
+# ============================================================
+
+_book_readers = {}
+_book_readers_lock = threading.Lock()
+
+
+def _get_book_reader(path):
+    """Return the Polyglot reader for path, opened once per process.
+
+    python-chess memory-maps the book and binary-searches the Zobrist key,
+    so a lookup does not read the file. None if the book cannot be opened.
+    """
+    with _book_readers_lock:
+        if path not in _book_readers:
+            try:
+                _book_readers[path] = chess.polyglot.open_reader(path)
+            except OSError as e:
+                print(f"Opening book {path} unavailable: {e}")
+                _book_readers[path] = None
+        return _book_readers[path]
+
+
+def find_shortcut(board, book_path=None):
+    """Decide the move without searching when the position allows it.
+
+    Checked in order: Polyglot opening book (most weighted move), single
+    legal move, mate in one.
+
+    Returns (move, reason, value) or None. value is None when unknown.
+    """
+    if book_path:
+        reader = _get_book_reader(book_path)
+        if reader is not None:
+            entry = reader.get(board)
+            if entry is not None:
+                return entry.move, "book", None
+
+    legal_moves = list(board.legal_moves)
+    if len(legal_moves) == 1:
+        return legal_moves[0], "single_move", None
+
+    for move in legal_moves:
+        board.push(move)
+        mate = board.is_checkmate()
+        board.pop()
+        if mate:
+            value = CHECKMATE_SCORE if board.turn == chess.WHITE else -CHECKMATE_SCORE
+            return move, "mate_in_1", value
+
+    return None
+
+
+def _shortcut_result(board, move, reason, value, evaluator, eval_error, eval_mode,
+                     tree_options, elapsed_ms):
+    """find_best_move result for a shortcut: the root and the chosen move.
+
+    The stats have the same keys as a search's, with nothing counted.
+    """
+    builtin_eval = isinstance(evaluator, MaterialEvaluator)
+    value = NAN if value is None else value
+    tree = SearchTree(board)
+    root = tree.add_node(-1, None, 0, board.turn == chess.WHITE, -math.inf, math.inf)
+    child = tree.add_node(root, move, 0, board.turn != chess.WHITE, -math.inf, math.inf)
+    flags = NODE_BEST_PATH | (NODE_TERMINAL if reason == "mate_in_1" else 0)
+    tree.set_leaf(child, value, flags=flags)
+    tree.value[root] = value
+    tree.flags[root] |= NODE_BEST_PATH
+
+    return {
+        "ai_move": move.uci(),
+        "ai_move_san": board.san(move),
+        "tree": tree.render(**tree_options),
+        "search_tree": tree,
+        "eval_error": eval_error,
+        "pv": [move.uci()],
+        "stats": {
+            "nodes_explored": 0,
+            "nodes_pruned": 0,
+            "quiescence_nodes": 0,
+            "movegen": {"calls": 0, "per_node": None},
+            "search_time_ms": elapsed_ms,
+            "max_depth": 0,
+            "tt": {"probes": 0, "hits": 0, "cutoffs": 0, "stores": 0, "collisions": 0},
+            "ordering": MoveOrderer().get_stats(),
+            "iterations": [],
+            "eval_calls": 0,
+            "eval_mode": eval_mode,
+            "eval_builtin": builtin_eval,
+            "eval_cache": None if builtin_eval else evaluator.get_stats(),
+            "compile_cache": compiled_evals.get_stats(),
+            "cancelled": False,
+            "shortcut": reason,
+        },
+    }
+
+
 # ============================================================
 # MAIN SEARCH FUNCTION
 # ============================================================
 
-def find_best_move(board, eval_code, depth=3):
+def find_best_move(board, eval_code, depth=3, tt=None, time_ms=None,
+                   eval_mode="inline", tree_options=None, progress=None,
+                   cancel=None, workers=1, quiescence=None, show_quiescence=False,
+                   shortcuts=False, book_path=None, pv=None):
     """Run alpha-beta search and return the best move with the full tree.
 
+    With `time_ms`, the search runs in iterative-deepening mode: depths 1, 2,
+    ... up to `depth` are searched in turn, each one trying the previous
+    principal variation first, until the time budget is spent. The tree of
+    the deepest completed iteration is returned.
+
     Args:
         board: chess.Board instance (AI's turn to move)
         eval_code: Python source code with evaluate(board) function
-        depth: search depth
+        depth: search depth (maximum depth in iterative-deepening mode)
+        tt: optional TranspositionTable to reuse (a fresh one otherwise)
+        time_ms: optional wall-clock budget in milliseconds
+        eval_mode: "inline" (evaluated in the search thread under a
+            watchdog), "thread" (one thread per leaf evaluation) or
+            "sandbox" (resource-limited evaluator process, see eval_sandbox)
+        tree_options: optional SearchTree.render() arguments capping the
+            returned tree (max_depth, max_children, max_nodes, format)
+        progress: optional callable(event_dict) receiving "progress" events
+            while searching and an "iteration" event (with its rendered
+            tree) after each completed iteration
+        cancel: optional threading.Event; setting it stops the search, which
+            then returns the deepest completed iteration (if any)
+        workers: number of processes for root splitting (1 = sequential).
+            Ignored in sandbox mode, where user code must stay in the
+            resource-limited evaluator processes.
+        quiescence: extend depth-0 nodes with a capture-only search (None:
+            default_quiescence())
+        show_quiescence: include the quiescence nodes in the returned tree
+            (flagged is_quiescence, negative depths); otherwise they are
+            collapsed into the value of their depth-0 node
+        shortcuts: play without searching when find_shortcut() decides
+            the move (book move, single legal move, mate in one); the
+            returned tree then holds the root and that move only
+        book_path: Polyglot opening book used by the shortcuts
+        pv: expected principal variation from this position as chess.Move
+            objects (e.g. the rest of the previous move's PV), tried first
+            to warm-start the search
 
     Returns dict with keys:
         ai_move: UCI string of best move (or None)
         ai_move_san: SAN string of best move (or None)
-        tree: tree node dict
+        tree: rendered tree (nested node dicts by default)
+        search_tree: SearchTree of the returned iteration, to render
+            subtrees later
         eval_error: error string or None
-        stats: { nodes_explored, nodes_pruned, search_time_ms }
+        pv: principal variation (UCI strings), starting with ai_move
+        stats: { nodes_explored, nodes_pruned, quiescence_nodes,
+                 search_time_ms, max_depth, tt,
+                 iterations, cancelled, shortcut, ... }
     """
-    # Compile eval function
-    eval_fn, error = compile_user_eval(eval_code)
+    tree_options = tree_options or {}
+    start_time = time.time()
 
-    if eval_fn is None:
-        # Fallback: use default eval
-        fallback_fn, _ = compile_user_eval(DEFAULT_EVAL_CODE)
-        eval_fn = fallback_fn
-        eval_error = error
-    else:
-        eval_error = None
+    # Compile eval function (cached across searches, in the sandbox
+    # process in sandbox mode)
+    evaluator, eval_error, search_code = search_evaluator(eval_code, eval_mode)
+    builtin_eval = isinstance(evaluator, MaterialEvaluator)
+
+    if shortcuts:
+        shortcut = find_shortcut(board, book_path)
+        if shortcut is not None:
+            evaluator.close()
+            move, reason, value = shortcut
+            return _shortcut_result(board, move, reason, value, evaluator, eval_error,
+                                    eval_mode, tree_options,
+                                    round((time.time() - start_time) * 1000))
 
     # AI plays as black (minimizing)
     maximizing = board.turn == chess.WHITE
 
-    counter = [0, 0]  # [nodes_explored, nodes_pruned]
-    start_time = time.time()
+    if tt is None:
+        tt = TranspositionTable(TT_SIZE)
+    tt.new_search()
+    if pv and not board.is_legal(pv[0]):
+        pv = None
+    if quiescence is None:
+        quiescence = default_quiescence(eval_code, eval_mode)
+    ctx = SearchContext(tt=tt, pv=pv, cancel=cancel, quiescence=quiescence,
+                        delta_pruning=builtin_eval, show_quiescence=show_quiescence)
+
+    if eval_mode == "sandbox" and not builtin_eval:
+        # Each pool task would start its own sandbox process
+        workers = 1
+    parallel_stats = {"workers": workers, "tasks": 0, "cpu_time_ms": 0.0,
+                      "root_moves_time_ms": 0.0, "wall_time_ms": 0.0}
+
+    if time_ms is None:
+        depths = [depth]
+    else:
+        depths = range(1, depth + 1)
+        deadline = time.perf_counter() + time_ms / 1000
+
+    # [nodes_explored, nodes_pruned, quiescence_nodes, movegen_calls] per search
+    totals = [0, 0, 0, 0]
+    history_keys = _history_keys(board)
+    iterations = []
+    tree = None
+    completed_depth = 0
+    stack_size = len(board.move_stack)
+    cancelled = False
+
+    if progress is not None:
+        def report(counter):
+            elapsed = time.time() - start_time
+            nodes = totals[0] + counter[0]
+            progress({
+                "type": "progress",
+                "depth": ctx.tree.depth[0],
+                "nodes_explored": nodes,
+                "nodes_pruned": totals[1] + counter[1],
+                "quiescence_nodes": totals[2] + counter[2],
+                "elapsed_ms": round(elapsed * 1000),
+                "nodes_per_sec": round(nodes / elapsed) if elapsed > 0 else None,
+                "best_move": ctx.pv[0].uci() if ctx.pv else None,
+            })
+        ctx.on_progress = report
 
-    value, tree = alphabeta_with_tree(
-        board, depth, -math.inf, math.inf, maximizing, eval_fn, counter
-    )
+    try:
+        for current_depth in depths:
+            if time_ms is not None and iterations:
+                # Do not start an iteration that has little chance to finish
+                if (time.time() - start_time) * 1000 >= time_ms / 2:
+                    break
+                ctx.deadline = deadline
+
+            counter = [0, 0, 0, 0]
+            ctx.keys = list(history_keys)
+            ctx.tree = SearchTree(board)
+            iteration_start = time.time()
+            try:
+                if workers > 1 and current_depth > 1:
+                    value = _parallel_root_search(
+                        board, current_depth, maximizing, search_code, eval_mode,
+                        evaluator, counter, ctx, workers, parallel_stats
+                    )
+                else:
+                    value, _ = alphabeta_with_tree(
+                        board, current_depth, -math.inf, math.inf, maximizing,
+                        evaluator, counter, ctx
+                    )
+            except SearchTimeout as e:
+                cancelled = isinstance(e, SearchCancelled)
+                while len(board.move_stack) > stack_size:
+                    board.pop()
+                totals[0] += counter[0]
+                totals[1] += counter[1]
+                totals[2] += counter[2]
+                totals[3] += counter[3]
+                iterations.append({
+                    "depth": current_depth,
+                    "completed": False,
+                    "nodes_explored": counter[0],
+                    "nodes_pruned": counter[1],
+                    "quiescence_nodes": counter[2],
+                    "time_ms": round((time.time() - iteration_start) * 1000),
+                    "best_move": None,
+                    "value": None,
+                })
+                break
+
+            totals[0] += counter[0]
+            totals[1] += counter[1]
+            totals[2] += counter[2]
+            totals[3] += counter[3]
+
+            # Mark the best path
+            tree = ctx.tree
+            tree.mark_best_path()
+            completed_depth = current_depth
+            ctx.pv = tree.principal_variation()
+
+            iterations.append({
+                "depth": current_depth,
+                "completed": True,
+                "nodes_explored": counter[0],
+                "nodes_pruned": counter[1],
+                "quiescence_nodes": counter[2],
+                "time_ms": round((time.time() - iteration_start) * 1000),
+                "best_move": ctx.pv[0].uci() if ctx.pv else None,
+                "value": _fmt_val(value),
+            })
+            if progress is not None:
+                progress(dict(iterations[-1], type="iteration",
+                              tree=tree.render(**tree_options)))
+    finally:
+        evaluator.close()
 
     elapsed_ms = round((time.time() - start_time) * 1000)
 
-    # Mark the best path
-    mark_best_path(tree)
+    if eval_error is None:
+        eval_error = evaluator.error
 
-    # The root node represents the current position; best move is the child on best path
+    # The root node represents the current position; best move starts the PV
     best_move = None
     best_move_san = None
-    for child in tree["children"]:
-        if child["is_best_path"] and not child["is_pruned"]:
-            best_move_san = child["move"]
-            break
-
-    # Convert SAN to UCI
-    if best_move_san:
-        try:
-            move = board.parse_san(best_move_san)
-            best_move = move.uci()
-        except ValueError:
-            best_move = None
-            best_move_san = None
+    if ctx.pv:
+        best_move = ctx.pv[0].uci()
+        best_move_san = board.san(ctx.pv[0])
 
     # Fallback if no best move found
     if best_move is None:
@@ -432,15 +2144,53 @@ def find_best_move(board, eval_code, depth=3):
             best_move = move.uci()
             best_move_san = board.san(move)
 
+    # Visited nodes: explored nodes without the pruned stubs (every cutoff
+    # counts one pruned node plus its stubs), plus quiescence nodes
+    visited = totals[0] - (totals[1] - ctx.orderer.cutoffs) + totals[2]
+    stats = {
+        "nodes_explored": totals[0],
+        "nodes_pruned": totals[1],
+        "quiescence_nodes": totals[2],
+        # Legal move generations (full, "any legal move" or captures only)
+        # per visited node, to profile the search
+        "movegen": {
+            "calls": totals[3],
+            "per_node": round(totals[3] / visited, 2) if visited else None,
+        },
+        "search_time_ms": elapsed_ms,
+        "max_depth": completed_depth,
+        "tt": tt.get_stats(),
+        "ordering": ctx.orderer.get_stats(),
+        "iterations": iterations,
+        "eval_calls": evaluator.calls,
+        "eval_mode": eval_mode,
+        "eval_builtin": builtin_eval,
+        "eval_cache": None if builtin_eval else evaluator.get_stats(),
+        "compile_cache": compiled_evals.get_stats(),
+        "cancelled": cancelled,
+        "shortcut": None,
+    }
+    if workers > 1:
+        # CPU time the root moves took to search, summed over the
+        # processes, over the wall time of the split iterations: the speedup
+        # over searching the same moves one after the other in one process.
+        # Pool start-up and result transfer only count in the wall time. A
+        # sequential search also passes tighter bounds from move to move, so
+        # it can prune more than this baseline.
+        wall = parallel_stats["wall_time_ms"]
+        parallel_stats["speedup"] = (
+            round(parallel_stats["root_moves_time_ms"] / wall, 2) if wall else None
+        )
+        for key in ("cpu_time_ms", "root_moves_time_ms", "wall_time_ms"):
+            parallel_stats[key] = round(parallel_stats[key])
+        stats["parallel"] = parallel_stats
+
     return {
         "ai_move": best_move,
         "ai_move_san": best_move_san,
-        "tree": tree,
+        "tree": tree.render(**tree_options) if tree is not None else None,
+        "pv": [move.uci() for move in ctx.pv] if tree is not None else [],
+        "search_tree": tree,
         "eval_error": eval_error,
-        "stats": {
-            "nodes_explored": counter[0],
-            "nodes_pruned": counter[1],
-            "search_time_ms": elapsed_ms,
-            "max_depth": depth,
-        },
+        "stats": stats,
     }
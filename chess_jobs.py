@@ -0,0 +1,486 @@
+"""Background chess searches.
+
+Searches are queued as jobs and run by a fixed number of runners, so a web
+request never has to hold its thread (or, in "process" mode, the GIL) for
+the length of a search: clients submit a job, then poll its status, which
+carries the search's progress events and finally the response payload.
+
+Jobs are recorded in the ChessStore shared by the web workers (see
+chess_store.py): a poll or a cancel request may reach any worker, and the
+queue and per-client limits hold for the whole server. Submissions past
+either limit are rejected (HTTP 429). A job runs in the worker that
+accepted it, which applies the cancel requests recorded by other workers.
+
+In "process" mode each runner hands its search to its own search process
+and relays the progress events and cancellation through a multiprocessing
+queue and a shared array of cancel flags (one slot per runner); the game's
+transposition table goes to the search process and back. A search that
+does not stop once cancelled, or runs past its wall-clock limit (e.g.
+stuck in user evaluation code), has its process killed and replaced. In
+"thread" mode the search runs in the runner thread, and can only stop by
+itself.
+"""
+
+import multiprocessing
+import os
+import queue
+import select
+import signal
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+import chess
+
+from chess_engine import find_best_move
+
+JOB_MODES = ("process", "thread")
+
+# Finished jobs kept for polling, beyond the TTL limit
+MAX_FINISHED_JOBS = 256
+
+# Seconds between two checks for cancel requests made through other workers
+CANCEL_POLL_SECONDS = 0.1
+
+# Seconds a cancelled search process gets to stop before it is killed
+KILL_GRACE_SECONDS = 2
+
+# Seconds a search process may run past the search's time_ms before it is
+# killed (a depth-only search gets the queue's max_search_seconds)
+TIME_LIMIT_GRACE_SECONDS = 5
+
+SEARCH_KILLED = "Recherche interrompue (delai depasse)"
+
+
+class JobRejected(Exception):
+    """Submission refused: queue full or client limit reached."""
+
+
+class JobFailed(Exception):
+    """Raised by a job's finish() to fail it with this message."""
+
+
+# ============================================================
+# SEARCH TASKS
+# ============================================================
+
+def run_search_task(task, progress=None, cancel=None):
+    """Run find_best_move for a task dict (position as FEN + UCI history)."""
+    board = chess.Board(task["fen"])
+    for uci in task["history"]:
+        board.push_uci(uci)
+    pv = [chess.Move.from_uci(uci) for uci in task["pv"]] if task["pv"] else None
+    return find_best_move(
+        board, task["eval_code"], task["depth"], tt=task.get("tt"), pv=pv,
+        time_ms=task["time_ms"], eval_mode=task["eval_mode"],
+        tree_options=task["tree_options"], workers=task["workers"],
+        quiescence=task["quiescence"], show_quiescence=task["show_quiescence"],
+        shortcuts=task["shortcuts"], book_path=task["book_path"],
+        progress=progress, cancel=cancel,
+    )
+
+
+_progress_queue = None
+_cancel_flags = None
+
+
+def _init_search_process(progress_queue, cancel_flags, owner_alive):
+    global _progress_queue, _cancel_flags
+    _progress_queue = progress_queue
+    _cancel_flags = cancel_flags
+    if hasattr(os, "fork"):
+        _start_owner_guard(owner_alive)
+
+
+def _start_owner_guard(owner_alive):
+    """Fork a small guard that kills the search process once its web worker
+    is gone, even in the middle of a search.
+
+    owner_alive is the read end of a pipe whose write end only the web
+    worker holds, so it reaches EOF as soon as the worker exits. The guard
+    is a separate process because a thread of the search process cannot
+    run while user code holds the GIL in a long C call (sum(range(...))).
+    It also exits when the search process dies first (search_alive EOF).
+    """
+    search_pid = os.getpid()
+    search_alive, search_alive_w = os.pipe()
+    if os.fork() == 0:
+        try:
+            os.close(search_alive_w)
+            ready, _, _ = select.select([owner_alive, search_alive], [], [])
+            if search_alive not in ready:
+                os.kill(search_pid, signal.SIGKILL)
+        finally:
+            os._exit(0)
+    # search_alive_w stays open until the search process exits
+    os.close(search_alive)
+
+
+class _SlotCancel:
+    """Event-like view of one runner's cancel flag (search process side)."""
+
+    def __init__(self, slot):
+        self.slot = slot
+
+    def is_set(self):
+        return _cancel_flags[self.slot] == 1
+
+
+def _search_in_process(task):
+    job_id = task.pop("job_id")
+    slot = task.pop("slot")
+
+    def progress(event):
+        _progress_queue.put((job_id, event))
+
+    result = run_search_task(task, progress, _SlotCancel(slot))
+    # The table was filled in this process: send it back with the result
+    result["tt"] = task["tt"]
+    return result
+
+
+# ============================================================
+# JOBS
+# ============================================================
+
+class ChessJob:
+    """One search request accepted by this worker.
+
+    finish(result) turns the search result into the response payload (it
+    runs in the runner thread, once the search is done) or raises JobFailed.
+    The job's status, events and payload are mirrored to the store, where
+    polls read them.
+    """
+
+    def __init__(self, client, task, finish, search_id, store):
+        self.id = uuid.uuid4().hex
+        self.client = client
+        self.task = task
+        self.finish = finish
+        self.search_id = search_id
+        self.store = store
+        self.status = "queued"  # queued, running, done, failed, cancelled
+        self.created = time.time()
+        self.started = None
+        self.event_count = 0  # "iteration" events stored so far
+        self.payload = None
+        self.error = None
+        self.slot = None
+        self.cancel_event = threading.Event()
+        self.keep_result = True  # cleared by a cancel that drops the result
+        self.done = threading.Event()
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def add_event(self, event):
+        event = dict(event)
+        name = event.pop("type")
+        with self._lock:
+            if name == "progress":
+                self.store.update_job(self.id, progress=event)
+            else:
+                self.store.add_event(self.id, self.event_count, {"type": name, **event})
+                self.event_count += 1
+            for listener in self._listeners:
+                listener.put((name, event))
+
+    def listen(self):
+        """Queue receiving (name, event) for every later event, then None
+        once the job is over."""
+        listener = queue.Queue()
+        with self._lock:
+            self._listeners.append(listener)
+            if self.done.is_set():
+                listener.put(None)
+        return listener
+
+    def _end(self, status, payload=None, error=None):
+        with self._lock:
+            self.status = status
+            self.payload = payload
+            self.error = error
+            self.store.update_job(self.id, status=status, finished=time.time(),
+                                  result=payload, error=error)
+            self.done.set()
+            for listener in self._listeners:
+                listener.put(None)
+
+
+class ChessJobQueue:
+    """Bounded job queue served by `workers` runners in this process.
+
+    Runner threads (and, in process mode, the process pool) start on the
+    first submission, i.e. in the web worker rather than in a preloading
+    master process. The counters of get_stats() are this worker's; the
+    queued and running counts cover every worker.
+    """
+
+    def __init__(self, store, workers=1, mode="process", max_queued=16, per_client=2,
+                 ttl=300, max_search_seconds=60):
+        self.store = store
+        self.workers = workers
+        self.mode = mode
+        self.max_queued = max_queued
+        self.per_client = per_client
+        self.ttl = ttl
+        self.max_search_seconds = max_search_seconds
+        self._jobs = {}  # job_id -> ChessJob, queued or running here
+        self._waiting = deque()  # queued jobs, in order
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+        self._pools = {}  # runner slot -> its search process (process mode)
+        self._progress_queue = None
+        self._cancel_flags = None
+        self._owner_alive = None  # pipe ends, see _exit_with_owner
+        self.counts = {"submitted": 0, "done": 0, "failed": 0, "cancelled": 0,
+                       "rejected_full": 0, "rejected_client": 0, "killed": 0}
+        self.started_count = 0
+        self.wait_time = 0.0  # summed over started jobs
+        self.run_time = 0.0  # summed over finished jobs
+
+    def submit(self, client, task, finish, search_id=None):
+        """Queue a search; raises JobRejected past the queue or client limit."""
+        self.store.expire(self.ttl, MAX_FINISHED_JOBS)
+        job = ChessJob(client, task, finish, search_id, self.store)
+        rejected = self.store.add_job(job.id, client, search_id,
+                                      self.max_queued, self.per_client)
+        with self._lock:
+            if rejected == "full":
+                self.counts["rejected_full"] += 1
+                raise JobRejected("File de recherche pleine, reessayez plus tard")
+            if rejected == "client":
+                self.counts["rejected_client"] += 1
+                raise JobRejected("Trop de recherches en cours pour ce client")
+
+            self._jobs[job.id] = job
+            self._waiting.append(job)
+            self.counts["submitted"] += 1
+            if not self._started:
+                self._start()
+        self._queue.put(job)
+        return job
+
+    def poll(self, job_id, since=0):
+        """Status of a job accepted by any worker, its "iteration" events
+        from index `since` on, the latest progress and, once done, the
+        payload; None if unknown or expired."""
+        return self.store.get_job(job_id, since)
+
+    def position(self, job):
+        """1-based place of a queued job in its worker's queue (None otherwise)."""
+        return self.store.position(job.id)
+
+    def cancel(self, job_id=None, search_id=None, keep_result=False):
+        """Cancel a queued or running job, by id or by search_id; False if
+        unknown or already over.
+
+        With keep_result, a running search stops early but its best move so
+        far still finishes the job; otherwise the job ends as cancelled. A
+        job of another worker stops once that worker sees the request.
+        """
+        found = self.store.request_cancel(job_id, search_id, keep_result)
+        if found is None:
+            return False
+        job_id, owner, keep_result = found
+        if owner == os.getpid():
+            self._apply_cancel(job_id, keep_result)
+        return True
+
+    def _apply_cancel(self, job_id, keep_result):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.done.is_set():
+                return
+            job.cancel_event.set()
+            job.keep_result = job.keep_result and keep_result
+            if job.status == "queued":
+                self._waiting.remove(job)
+                del self._jobs[job.id]
+                self.counts["cancelled"] += 1
+                job._end("cancelled")
+            elif job.slot is not None and self._cancel_flags is not None:
+                self._cancel_flags[job.slot] = 1
+
+    def _watch_cancels(self):
+        """Apply the cancel requests recorded by other workers."""
+        pid = os.getpid()
+        while True:
+            time.sleep(CANCEL_POLL_SECONDS)
+            with self._lock:
+                idle = not self._jobs
+            if idle:
+                continue
+            try:
+                requests = self.store.cancel_requests(pid)
+            except Exception as e:
+                print(f"Chess job cancel check failed: {e}")
+                continue
+            for job_id, keep_result in requests:
+                self._apply_cancel(job_id, keep_result)
+
+    def _start(self):
+        self._started = True
+        if self.mode == "process":
+            context = self._mp_context()
+            self._progress_queue = context.Queue()
+            self._cancel_flags = context.Array("b", self.workers, lock=False)
+            self._owner_alive = context.Pipe(duplex=False)
+            threading.Thread(target=self._relay_progress, name="chess-job-progress",
+                             daemon=True).start()
+        threading.Thread(target=self._watch_cancels, name="chess-job-cancels",
+                         daemon=True).start()
+        for slot in range(self.workers):
+            threading.Thread(target=self._run, args=(slot,), name=f"chess-job-{slot}",
+                             daemon=True).start()
+
+    @staticmethod
+    def _mp_context():
+        methods = multiprocessing.get_all_start_methods()
+        return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+    def _get_pool(self, slot):
+        """The search process of a runner (a pool of one), started on first
+        use: killing it cannot affect another runner's search."""
+        pool = self._pools.get(slot)
+        if pool is None:
+            pool = self._pools[slot] = ProcessPoolExecutor(
+                1, mp_context=self._mp_context(),
+                initializer=_init_search_process,
+                initargs=(self._progress_queue, self._cancel_flags, self._owner_alive[0]),
+            )
+        return pool
+
+    def _kill_pool(self, slot, pool):
+        """Terminate a runner's search process; the next search starts a
+        new one."""
+        with self._lock:
+            if self._pools.get(slot) is pool:
+                del self._pools[slot]
+            self.counts["killed"] += 1
+        # No public API before Python 3.14 (terminate_workers)
+        for process in list(pool._processes.values()):
+            process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def search_limit(self, task):
+        """Wall-clock seconds a search process may run before it is killed."""
+        if task["time_ms"] is not None:
+            return task["time_ms"] / 1000 + TIME_LIMIT_GRACE_SECONDS
+        return self.max_search_seconds
+
+    def _relay_progress(self):
+        while True:
+            job_id, event = self._progress_queue.get()
+            with self._lock:
+                job = self._jobs.get(job_id)
+            if job is not None and not job.done.is_set():
+                try:
+                    job.add_event(event)
+                except Exception as e:
+                    print(f"Chess job progress relay failed: {e}")
+
+    def _run(self, slot):
+        while True:
+            job = self._queue.get()
+            with self._lock:
+                if job.status != "queued":
+                    continue  # cancelled while waiting
+                self._waiting.remove(job)
+                job.status = "running"
+                job.started = time.time()
+                job.slot = slot
+                self.started_count += 1
+                self.wait_time += job.started - job.created
+
+            try:
+                self.store.update_job(job.id, status="running", started=job.started)
+                if self.mode == "process":
+                    result = self._search_in_pool(job, slot)
+                else:
+                    result = run_search_task(job.task, job.add_event, job.cancel_event)
+                if job.cancel_event.is_set() and not job.keep_result:
+                    status, payload, error = "cancelled", None, None
+                else:
+                    status, payload, error = "done", job.finish(result), None
+            except JobFailed as e:
+                status, payload, error = "failed", None, str(e)
+            except Exception as e:
+                status, payload, error = "failed", None, f"Erreur de recherche: {e}"
+            if status == "failed" and job.cancel_event.is_set() and not job.keep_result:
+                # E.g. the search process was killed after the cancel request
+                status, error = "cancelled", None
+
+            with self._lock:
+                job.slot = None
+                del self._jobs[job.id]
+                self.counts[status] += 1
+                if status != "cancelled":
+                    self.run_time += time.time() - job.started
+            try:
+                job._end(status, payload, error)
+            except Exception as e:
+                # The store is unavailable: local waiters still get the result
+                print(f"Chess job {job.id} could not be stored: {e}")
+                job.done.set()
+
+    def _search_in_pool(self, job, slot):
+        """Run a job's search in the runner's process and wait for it.
+
+        Searches poll their cancel flag, except while user code runs: a
+        search still running KILL_GRACE_SECONDS after a cancel request, or
+        past search_limit(), has its process killed and fails.
+        """
+        task = dict(job.task, job_id=job.id, slot=slot)
+        with self._lock:
+            # Under the lock, so a cancel cannot land between the check and
+            # the reset of the flag
+            self._cancel_flags[slot] = 1 if job.cancel_event.is_set() else 0
+            pool = self._get_pool(slot)
+        deadline = job.started + self.search_limit(job.task)
+        cancelled_at = None
+        try:
+            future = pool.submit(_search_in_process, task)
+            while True:
+                try:
+                    return future.result(timeout=CANCEL_POLL_SECONDS)
+                except FutureTimeout:
+                    pass
+                now = time.time()
+                if job.cancel_event.is_set() and cancelled_at is None:
+                    cancelled_at = now
+                if now > deadline or (cancelled_at is not None
+                                      and now - cancelled_at > KILL_GRACE_SECONDS):
+                    self._kill_pool(slot, pool)
+                    raise JobFailed(SEARCH_KILLED)
+        except BrokenProcessPool:
+            # The search process died (e.g. killed): start a new one next time
+            with self._lock:
+                if self._pools.get(slot) is pool:
+                    del self._pools[slot]
+            raise
+
+    def get_stats(self):
+        counts = self.store.job_counts()
+        with self._lock:
+            started = self.started_count
+            finished = self.counts["done"] + self.counts["failed"]
+            return {
+                **counts,
+                "worker": os.getpid(),
+                **self.counts,
+                "avg_wait_ms": round(self.wait_time / started * 1000, 1) if started else None,
+                "avg_run_ms": round(self.run_time / finished * 1000, 1) if finished else None,
+                "config": {
+                    "mode": self.mode,
+                    "workers": self.workers,
+                    "max_queued": self.max_queued,
+                    "per_client": self.per_client,
+                    "ttl": self.ttl,
+                    "max_search_seconds": self.max_search_seconds,
+                },
+            }
@@ -0,0 +1,294 @@
+"""Chess state shared by the web worker processes.
+
+Gunicorn runs several worker processes (see gunicorn.conf.py) and a
+client's requests may reach any of them. Search jobs are therefore
+recorded in a SQLite database that every worker opens: any worker can
+answer a poll, cancel a job or check the queue limits, while the search
+itself runs in the worker that accepted it (its "owner").
+
+The database is created, or emptied, when the app is imported: in the
+gunicorn master when the app is preloaded, so the workers it forks share
+it and a restart starts from a clean state.
+"""
+
+import json
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    client TEXT NOT NULL,
+    owner INTEGER NOT NULL,
+    search_id TEXT,
+    status TEXT NOT NULL,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    progress TEXT,
+    result TEXT,
+    error TEXT,
+    cancel INTEGER NOT NULL DEFAULT 0,
+    keep_result INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS jobs_search_id ON jobs (search_id);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+CREATE TABLE IF NOT EXISTS job_events (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+CREATE TABLE IF NOT EXISTS search_trees (
+    search_id TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    used REAL NOT NULL
+);
+"""
+
+ACTIVE = ("queued", "running")
+
+OWNER_LOST = "Recherche interrompue (processus arrete)"
+
+
+def default_store_path():
+    """Database file of this server: named after the importing (master)
+    process, in the temporary directory."""
+    return os.path.join(tempfile.gettempdir(), f"neura-chess-{os.getpid()}.sqlite3")
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class ChessStore:
+    """Job records, their events and cancel requests, and recent search
+    trees, in a SQLite file.
+
+    Each thread of each process gets its own connection; writes go through
+    short BEGIN IMMEDIATE transactions, so a check and the write depending
+    on it (e.g. the queue limits and the insertion of a job) are atomic
+    across processes.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_store_path()
+        self.creator = os.getpid()
+        self._local = threading.local()
+        db = self._connect()
+        try:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(SCHEMA)
+            db.execute("DELETE FROM jobs")
+            db.execute("DELETE FROM job_events")
+            db.execute("DELETE FROM search_trees")
+        finally:
+            db.close()
+
+    def remove(self):
+        """Delete the database files; only done by the process that created
+        them (forked workers exit before the server does)."""
+        if os.getpid() != self.creator:
+            return
+        for suffix in ("", "-wal", "-shm"):
+            try:
+                os.remove(self.path + suffix)
+            except FileNotFoundError:
+                pass
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None,
+                             check_same_thread=False)
+        db.row_factory = sqlite3.Row
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def _db(self):
+        # A forked process must not reuse its parent's connections
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            local.db = self._connect()
+            local.pid = os.getpid()
+        return local.db
+
+    @contextmanager
+    def _transaction(self):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def add_job(self, job_id, client, search_id, max_queued, per_client):
+        """Record a queued job owned by this process.
+
+        Returns None, or "full" / "client" when the queue or the client's
+        limit (over every worker) is reached and the job was not added.
+        """
+        with self._transaction() as db:
+            self._reap(db)
+            queued = db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= max_queued:
+                return "full"
+            active = db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE client = ? AND status IN (?, ?)",
+                (client, *ACTIVE)).fetchone()[0]
+            if active >= per_client:
+                return "client"
+            db.execute(
+                "INSERT INTO jobs (id, client, owner, search_id, status, created) "
+                "VALUES (?, ?, ?, ?, 'queued', ?)",
+                (job_id, client, os.getpid(), search_id, time.time()))
+        return None
+
+    def update_job(self, job_id, **fields):
+        """Set columns of a job; result and progress are stored as JSON."""
+        for name in ("result", "progress"):
+            if fields.get(name) is not None:
+                fields[name] = json.dumps(fields[name])
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        self._db().execute(f"UPDATE jobs SET {columns} WHERE id = ?",
+                           (*fields.values(), job_id))
+
+    def add_event(self, job_id, seq, event):
+        self._db().execute("INSERT INTO job_events (job_id, seq, data) VALUES (?, ?, ?)",
+                           (job_id, seq, json.dumps(event)))
+
+    def get_job(self, job_id, since=0):
+        """Poll response of a job (see ChessJobQueue.poll), or None."""
+        db = self._db()
+        row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        if row["status"] in ACTIVE and not _process_alive(row["owner"]):
+            with self._transaction() as db:
+                self._reap(db)
+            row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+        events = db.execute(
+            "SELECT seq, data FROM job_events WHERE job_id = ? AND seq >= ? ORDER BY seq",
+            (job_id, since)).fetchall()
+        data = {
+            "job_id": job_id,
+            "status": row["status"],
+            "position": self._position(db, row) if row["status"] == "queued" else None,
+            "events": [json.loads(event["data"]) for event in events],
+            "next": events[-1]["seq"] + 1 if events else since,
+            "progress": json.loads(row["progress"]) if row["progress"] else None,
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+        }
+        if row["started"] is not None:
+            end = row["finished"] or time.time()
+            data["run_ms"] = round((end - row["started"]) * 1000)
+        return data
+
+    def position(self, job_id):
+        """1-based place of a queued job among its owner's queued jobs."""
+        db = self._db()
+        row = db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None or row["status"] != "queued":
+            return None
+        return self._position(db, row)
+
+    @staticmethod
+    def _position(db, row):
+        return db.execute(
+            "SELECT COUNT(*) FROM jobs WHERE owner = ? AND status = 'queued' AND created <= ?",
+            (row["owner"], row["created"])).fetchone()[0]
+
+    def request_cancel(self, job_id=None, search_id=None, keep_result=False):
+        """Flag a queued or running job for cancellation.
+
+        Returns (job_id, owner pid, keep_result) or None if the job is
+        unknown or already over. keep_result stays set only if every
+        cancel request asked for it.
+        """
+        column, value = ("id", job_id) if job_id is not None else ("search_id", search_id)
+        with self._transaction() as db:
+            row = db.execute(
+                f"SELECT id, owner, keep_result FROM jobs "
+                f"WHERE {column} = ? AND status IN (?, ?)", (value, *ACTIVE)).fetchone()
+            if row is None:
+                return None
+            keep = bool(row["keep_result"] and keep_result)
+            db.execute("UPDATE jobs SET cancel = 1, keep_result = ? WHERE id = ?",
+                       (int(keep), row["id"]))
+        return row["id"], row["owner"], keep
+
+    def cancel_requests(self, owner):
+        """(job_id, keep_result) of the owner's active jobs flagged for
+        cancellation."""
+        rows = self._db().execute(
+            "SELECT id, keep_result FROM jobs "
+            "WHERE owner = ? AND cancel = 1 AND status IN (?, ?)", (owner, *ACTIVE)).fetchall()
+        return [(row["id"], bool(row["keep_result"])) for row in rows]
+
+    def expire(self, ttl, max_finished):
+        """Drop finished jobs past the TTL or beyond the max_finished most
+        recent ones."""
+        with self._transaction() as db:
+            db.execute("DELETE FROM jobs WHERE status NOT IN (?, ?) AND finished < ?",
+                       (*ACTIVE, time.time() - ttl))
+            db.execute(
+                "DELETE FROM jobs WHERE id IN (SELECT id FROM jobs WHERE status NOT IN (?, ?) "
+                "ORDER BY finished DESC LIMIT -1 OFFSET ?)", (*ACTIVE, max_finished))
+            db.execute("DELETE FROM job_events WHERE job_id NOT IN (SELECT id FROM jobs)")
+
+    def job_counts(self):
+        rows = self._db().execute(
+            "SELECT status, COUNT(*) FROM jobs WHERE status IN (?, ?) GROUP BY status",
+            ACTIVE).fetchall()
+        counts = dict.fromkeys(ACTIVE, 0)
+        counts.update({status: count for status, count in rows})
+        return counts
+
+    @staticmethod
+    def _reap(db):
+        """Fail the active jobs of processes that no longer exist (a worker
+        killed by gunicorn, e.g. after a timeout)."""
+        owners = [row[0] for row in db.execute(
+            "SELECT DISTINCT owner FROM jobs WHERE status IN (?, ?)", ACTIVE)]
+        for owner in owners:
+            if not _process_alive(owner):
+                db.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, finished = ? "
+                    "WHERE owner = ? AND status IN (?, ?)",
+                    (OWNER_LOST, time.time(), owner, *ACTIVE))
+
+    def add_tree(self, search_id, tree, max_trees):
+        """Keep a SearchTree (pickled), dropping the least recently used
+        ones beyond max_trees."""
+        data = pickle.dumps(tree, pickle.HIGHEST_PROTOCOL)
+        with self._transaction() as db:
+            db.execute("INSERT OR REPLACE INTO search_trees (search_id, data, used) "
+                       "VALUES (?, ?, ?)", (search_id, data, time.time()))
+            db.execute(
+                "DELETE FROM search_trees WHERE search_id IN (SELECT search_id FROM "
+                "search_trees ORDER BY used DESC LIMIT -1 OFFSET ?)", (max_trees,))
+
+    def get_tree(self, search_id):
+        """The stored SearchTree of a search, or None."""
+        db = self._db()
+        row = db.execute("SELECT data FROM search_trees WHERE search_id = ?",
+                         (search_id,)).fetchone()
+        if row is None:
+            return None
+        db.execute("UPDATE search_trees SET used = ? WHERE search_id = ?",
+                   (time.time(), search_id))
+        return pickle.loads(row["data"])
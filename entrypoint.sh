@@ -12,6 +12,10 @@ else
     echo "Models found. Skipping training."
 fi
 
-# Start the application with Gunicorn
+# Memory-mapped MNIST test set served by /api/sample (built once)
+uv run python mnist_samples.py
+
+# Start the application with Gunicorn (one preloaded worker per core,
+# see gunicorn.conf.py)
 echo "Starting Neura-TN on http://0.0.0.0:5000"
-exec uv run gunicorn --bind 0.0.0.0:5000 --workers 1 --threads 2 --timeout 120 app:app
+exec uv run gunicorn -c gunicorn.conf.py app:app
@@ -0,0 +1,255 @@
+"""Process-pool sandbox for user chess evaluation code.
+
+Untrusted evaluate(board) functions run in pre-started evaluator processes
+with hard resource limits (RLIMIT_CPU / RLIMIT_AS) instead of inside the web
+worker. A search borrows one process, sends it the eval code once, then sends
+positions as FEN batches. A process that times out, crashes or hits its limits
+is killed and replaced, so a runaway evaluation can never keep burning CPU in
+the server process.
+"""
+
+import multiprocessing
+import os
+import threading
+
+import chess
+
+from chess_engine import compile_user_eval
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+SANDBOX_WORKERS = int(os.environ.get("CHESS_SANDBOX_WORKERS", "2"))
+SANDBOX_CPU_SECONDS = int(os.environ.get("CHESS_SANDBOX_CPU_SECONDS", "60"))
+SANDBOX_MEMORY_MB = int(os.environ.get("CHESS_SANDBOX_MEMORY_MB", "256"))
+# Recycle a process after this many positions (resets its CPU-time usage)
+SANDBOX_MAX_POSITIONS = int(os.environ.get("CHESS_SANDBOX_MAX_POSITIONS", "200000"))
+
+
+# ============================================================
+# EVALUATOR PROCESS
+# ============================================================
+
+def _apply_limits(cpu_seconds, memory_mb):
+    if resource is None:
+        return
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+    memory = memory_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+
+
+def _worker_main(conn, cpu_seconds, memory_mb):
+    """Evaluator process loop.
+
+    Messages are (kind, payload) tuples:
+        ("load", code)  -> error string or None
+        ("eval", fens)  -> ("ok", [scores]) or ("error", message)
+    """
+    _apply_limits(cpu_seconds, memory_mb)
+    eval_fn = None
+
+    while True:
+        try:
+            kind, payload = conn.recv()
+        except (EOFError, OSError):
+            return
+
+        if kind == "load":
+            eval_fn, error = compile_user_eval(payload)
+            conn.send(error)
+
+        elif kind == "eval":
+            try:
+                scores = [float(eval_fn(chess.Board(fen))) for fen in payload]
+                conn.send(("ok", scores))
+            except MemoryError:
+                conn.send(("error", "Memoire depassee"))
+            except Exception as e:
+                conn.send(("error", f"Erreur d'execution: {e}"))
+
+
+class _Worker:
+    """Handle on one evaluator process."""
+
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_main,
+            args=(child_conn, SANDBOX_CPU_SECONDS, SANDBOX_MEMORY_MB),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.positions = 0
+
+    def kill(self):
+        self.conn.close()
+        self.process.kill()
+        self.process.join()
+
+
+# ============================================================
+# POOL
+# ============================================================
+
+class SandboxPool:
+    """Fixed-size pool of evaluator processes.
+
+    acquire() blocks until a process is idle. release(worker, healthy=False)
+    replaces the process instead of returning it to the pool.
+    """
+
+    def __init__(self, size=SANDBOX_WORKERS):
+        methods = multiprocessing.get_all_start_methods()
+        self.context = multiprocessing.get_context(
+            "forkserver" if "forkserver" in methods else "spawn"
+        )
+        self.size = size
+        self.recycled = 0
+        self._idle = [_Worker(self.context) for _ in range(size)]
+        self._available = threading.Condition()
+
+    def acquire(self):
+        with self._available:
+            while not self._idle:
+                self._available.wait()
+            return self._idle.pop()
+
+    def release(self, worker, healthy=True):
+        if not healthy or worker.positions >= SANDBOX_MAX_POSITIONS:
+            worker.kill()
+            worker = _Worker(self.context)
+            self.recycled += 1
+        with self._available:
+            self._idle.append(worker)
+            self._available.notify()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the per-process sandbox pool, starting it on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SandboxPool()
+        return _pool
+
+
+# ============================================================
+# SEARCH EVALUATOR
+# ============================================================
+
+class SandboxEvaluator:
+    """Evaluator that runs user code in a sandbox process.
+
+    Same interface as chess_engine.InlineEvaluator. The process is borrowed
+    for the whole search; prefetch() lets the search send all the children
+    of a depth-1 node as a single batch.
+    """
+
+    def __init__(self, eval_code, timeout=2, pool=None):
+        self.eval_code = eval_code
+        self.timeout = timeout
+        self.pool = pool or get_pool()
+        self.error = None
+        self.calls = 0
+        self.batches = 0
+        self._worker = None
+        self._healthy = True
+        self._prefetched = {}
+
+    def _start(self):
+        self._worker = self.pool.acquire()
+        self._worker.conn.send(("load", self.eval_code))
+        reply = self._request()
+        if self.error is None and reply is not None:
+            self.error = reply
+
+    def load(self):
+        """Borrow a process and compile the code there.
+
+        Returns the error (compile error, timeout or resource limit hit
+        while running the module code) or None.
+        """
+        if self._worker is None:
+            self._start()
+        return self.error
+
+    def _request(self):
+        """Wait for the worker's reply; recycle it on timeout or crash."""
+        try:
+            if self._worker.conn.poll(self.timeout):
+                return self._worker.conn.recv()
+            self.error = f"Temps d'execution depasse ({self.timeout}s)"
+        except (EOFError, OSError):
+            self.error = "Processus d'evaluation arrete (limite de ressources)"
+        self._healthy = False
+        return None
+
+    def _evaluate_fens(self, fens):
+        if self._worker is None:
+            self._start()
+        if self.error is not None:
+            return None
+        self.batches += 1
+        self._worker.positions += len(fens)
+        self._worker.conn.send(("eval", fens))
+        reply = self._request()
+        if reply is None:
+            return None
+        status, result = reply
+        if status != "ok":
+            self.error = result
+            return None
+        return result
+
+    def prefetch(self, board, moves):
+        """Evaluate the positions after each of `moves` in one batch."""
+        if self.error is not None:
+            return
+        fens = []
+        for move in moves:
+            board.push(move)
+            fens.append(board.fen())
+            board.pop()
+        scores = self._evaluate_fens(fens)
+        if scores is not None:
+            self._prefetched = dict(zip(fens, scores))
+
+    def __call__(self, board):
+        if self.error is not None:
+            return 0.0
+        self.calls += 1
+        fen = board.fen()
+        if fen in self._prefetched:
+            return self._prefetched.pop(fen)
+        scores = self._evaluate_fens([fen])
+        return scores[0] if scores else 0.0
+
+    def close(self):
+        """Return the process to the pool (replaced if it misbehaved)."""
+        if self._worker is not None:
+            self.pool.release(self._worker, healthy=self._healthy)
+            self._worker = None
+
+
+def validate_eval(eval_code, board, timeout=2):
+    """(score, error) of evaluate(board), compiled and run in a sandbox
+    process. score is None on error."""
+    evaluator = SandboxEvaluator(eval_code, timeout=timeout)
+    try:
+        error = evaluator.load()
+        if error is None:
+            score = evaluator(board)
+            error = evaluator.error
+    finally:
+        evaluator.close()
+    if error is not None:
+        return None, error
+    return score, None
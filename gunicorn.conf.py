@@ -0,0 +1,75 @@
+"""Gunicorn configuration: preloaded app, one worker process per core.
+
+The master imports the app and loads torch, both models and the MNIST test
+set once before forking (preload_app + on_starting), so the workers share
+those pages copy-on-write instead of each loading its own copy. Each worker
+then gets its share of the cores for torch's intra-op threads.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+Environment: WEB_WORKERS (default: available cores), WEB_THREADS (default
+2), TORCH_THREADS (default: cores / workers, at least 1).
+"""
+
+import gc
+import os
+
+
+def available_cores():
+    """CPUs this process may use: affinity mask, capped by a cgroup quota."""
+    cores = len(os.sched_getaffinity(0))
+    quota = None
+    try:
+        # cgroup v2: "max 100000" or "<quota> <period>"
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            limit, period = f.read().split()
+            if limit != "max":
+                quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            # cgroup v1
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+                limit = int(f.read())
+            with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+                period = int(f.read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    if quota is not None:
+        cores = min(cores, max(1, int(quota)))
+    return cores
+
+
+CORES = available_cores()
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+# Predictions and chess searches are CPU bound: one process per core, a
+# second thread each so streamed searches do not block the worker
+workers = int(os.environ.get("WEB_WORKERS", "0")) or CORES
+threads = int(os.environ.get("WEB_THREADS", "2"))
+timeout = 120
+preload_app = True
+
+TORCH_THREADS = int(os.environ.get("TORCH_THREADS", "0")) or max(1, CORES // workers)
+
+# The master never runs torch in parallel: an OpenMP pool started before
+# fork would not exist in the workers
+os.environ.setdefault("OMP_NUM_THREADS", "1")
+
+
+def on_starting(server):
+    import app
+    app.load_mnist()
+    # Objects loaded so far never get collected: keep the collector from
+    # writing to (and so un-sharing) their pages in every worker
+    gc.freeze()
+    server.log.info("Preloaded MNIST models; %d workers x %d threads, "
+                    "%d torch threads each (%d cores)",
+                    workers, threads, TORCH_THREADS, CORES)
+
+
+def post_fork(server, worker):
+    import app
+    app.get_torch().set_num_threads(TORCH_THREADS)
+    app.warm_up()
@@ -0,0 +1,69 @@
+"""Inference backends of the MNIST models.
+
+"eager": the trained float32 nn.Module, as defined in train.py.
+"int8": dynamic int8 quantization of the nn.Linear layers (int8 weights,
+activations quantized on the fly per batch); convolutions stay float32 and
+the activations are recorded by the same hooks as in eager mode.
+"torchscript": the model traced and frozen to a TorchScript graph that
+returns the logits and every exposed layer, so activations need no hooks.
+
+Backends are built from the eager model when it is loaded, in a few
+milliseconds: there is no export artifact to keep in sync with the weights.
+bench_inference.py compares their accuracy and latency.
+
+Both optimized backends use deprecated torch APIs. torch.jit.trace and
+torch.jit.freeze emit a FutureWarning on every call (TorchScript is being
+replaced by torch.compile / torch.export); trace_layers() silences these
+warnings, since a model is traced in every worker. torch.ao.quantization
+emits a DeprecationWarning. Both still work with the torch version of
+uv.lock (2.10) and with 2.14; "eager" uses neither.
+"""
+
+from activations import activation_layers, trace_layers
+
+INFERENCE_BACKENDS = ("eager", "int8", "torchscript")
+
+
+# ============================================================================
+# BACKENDS
+# ============================================================================
+
+def quantize_linear(model):
+    """Copy of model with its nn.Linear layers dynamically quantized to int8."""
+    import torch
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class TracedModel:
+    """Frozen TorchScript graph of a model, exposing the same layers.
+
+    Calling it returns the logits; forward_layers() also returns the layer
+    outputs (see activations.record_layers). Inputs are (N, 1, 28, 28)
+    batches, or (N, 28, 28) for the fully connected model. The eager model
+    stays available as .module, e.g. for its weights.
+    """
+
+    def __init__(self, model):
+        import torch
+        self.module = model
+        self.ACTIVATION_LAYERS = activation_layers(model)
+        self.names = [name for name, _, _ in self.ACTIVATION_LAYERS]
+        self.graph = trace_layers(model, torch.zeros(1, 1, 28, 28))
+
+    def __call__(self, x):
+        return self.graph(x)[0]
+
+    def forward_layers(self, x):
+        logits, *outputs = self.graph(x)
+        return logits, dict(zip(self.names, outputs))
+
+
+def build_backend(model, backend):
+    """Inference model of an eager model in eval mode for one backend."""
+    if backend == "eager":
+        return model
+    if backend == "int8":
+        return quantize_linear(model)
+    if backend == "torchscript":
+        return TracedModel(model)
+    raise ValueError(f"Unknown inference backend: {backend}")
@@ -0,0 +1,141 @@
+"""Load test a running server: concurrent clients for a fixed duration.
+
+Each client sends requests back to back and records latencies; the report
+gives throughput and latency percentiles as JSON. Prediction images are
+random 8-bit digits-like images, a new one per request unless --same-image
+(which then measures the response cache).
+
+    python load_test.py --scenario predict-cnn --clients 8 --duration 20
+    python load_test.py --url http://localhost:5000 --scenario chess
+"""
+
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+MNIST_MEAN = 0.1307
+MNIST_STD = 0.3081
+
+
+def random_image(rng):
+    """Normalized 28x28 image with a few bright strokes, like the canvas."""
+    pixels = [[0] * 28 for _ in range(28)]
+    for _ in range(rng.randint(3, 6)):
+        x, y = rng.randint(4, 23), rng.randint(4, 23)
+        dx, dy = rng.choice([-1, 0, 1]), rng.choice([-1, 0, 1])
+        for _ in range(rng.randint(5, 12)):
+            if 0 <= x < 28 and 0 <= y < 28:
+                pixels[y][x] = 255
+            x, y = x + dx, y + dy
+    return [[(v / 255 - MNIST_MEAN) / MNIST_STD for v in row] for row in pixels]
+
+
+def scenario_request(scenario, rng, image):
+    """(path, JSON body or None for GET) of one request."""
+    if scenario == "sample":
+        return "/api/sample", None
+    if scenario == "chess":
+        return "/api/chess/move", {
+            "fen": "r1bqkbnr/pppp1ppp/2n5/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4",
+            "user_move": "e1g1", "depth": 3, "shortcuts": False, "max_depth": 1,
+        }
+    model = "cnn" if scenario.endswith("cnn") else "nn"
+    body = {"model": model, "image": image or random_image(rng)}
+    if scenario.startswith("predict-only"):
+        body["activations"] = False
+    return "/api/predict", body
+
+
+SCENARIOS = ["predict-nn", "predict-cnn", "predict-only-nn", "predict-only-cnn",
+             "sample", "chess"]
+
+
+def client(url, scenario, deadline, seed, same_image, latencies, errors, rejected):
+    rng = random.Random(seed)
+    image = random_image(rng) if same_image else None
+    while time.perf_counter() < deadline:
+        path, body = scenario_request(scenario, rng, image)
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(url + path, data=data,
+                                     headers={"Content-Type": "application/json"})
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=120) as response:
+                response.read()
+        except urllib.error.HTTPError as e:
+            # 429: the server's chess search queue or client limit is full
+            (rejected if e.code == 429 else errors).append(1)
+            continue
+        except (urllib.error.URLError, OSError):
+            errors.append(1)
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def run(url, scenario, clients, duration, same_image):
+    latencies, errors, rejected = [], [], []
+    deadline = time.perf_counter() + duration
+    threads = [
+        threading.Thread(target=client, args=(url, scenario, deadline, seed,
+                                              same_image, latencies, errors, rejected))
+        for seed in range(clients)
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    def ms(value):
+        return round(value * 1000, 1) if value is not None else None
+
+    return {
+        "scenario": scenario,
+        "clients": clients,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rejected": len(rejected),
+        "seconds": round(elapsed, 2),
+        "requests_per_sec": round(len(latencies) / elapsed, 1),
+        "p50_ms": ms(percentile(latencies, 0.5)),
+        "p95_ms": ms(percentile(latencies, 0.95)),
+        "p99_ms": ms(percentile(latencies, 0.99)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:5000")
+    parser.add_argument("--scenario", choices=SCENARIOS, nargs="+", default=["predict-cnn"])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 8],
+                        help="concurrent clients (one run per value)")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per run")
+    parser.add_argument("--same-image", action="store_true",
+                        help="resend one image per client instead of new ones")
+    args = parser.parse_args()
+
+    results = []
+    for scenario in args.scenario:
+        for clients in args.clients:
+            result = run(args.url, scenario, clients, args.duration, args.same_image)
+            results.append(result)
+            print(f"  {scenario:16s} {clients:3d} clients {result['requests_per_sec']:8.1f} req/s "
+                  f"p50 {result['p50_ms']} ms p95 {result['p95_ms']} ms", file=sys.stderr)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
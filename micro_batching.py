@@ -0,0 +1,99 @@
+"""Dynamic micro-batching for model inference.
+
+Concurrent requests each submit one item; a scheduler thread collects the
+items arriving within a short window and runs them as a single batch, then
+hands every request its own result. This turns many batch-of-one forward
+passes into a few larger ones.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """Collect submitted items into batches for run_batch.
+
+    run_batch(items) -> list of results (same order). A batch starts with the
+    first waiting item and closes when it holds max_batch_size items or
+    max_wait_ms after that first item arrived, whichever comes first.
+    """
+
+    def __init__(self, run_batch, max_batch_size=32, max_wait_ms=5.0, name="batcher"):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.max_batch_seen = 0
+        self.batch_sizes = {}  # size -> number of batches
+        self.wait_time = 0.0  # summed over items: submit -> batch start
+        self.run_time = 0.0  # summed over batches
+        self._thread = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """Queue item and wait for its result (exceptions are re-raised)."""
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future.result()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = batch[0][2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            start = time.perf_counter()
+            try:
+                results = self.run_batch([item for item, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                results = None
+            else:
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                size = len(batch)
+                self.batches += 1
+                self.items += size
+                self.max_batch_seen = max(self.max_batch_seen, size)
+                self.batch_sizes[size] = self.batch_sizes.get(size, 0) + 1
+                self.wait_time += sum(start - submitted for _, _, submitted in batch)
+                self.run_time += elapsed
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "batches": self.batches,
+                "items": self.items,
+                "avg_batch_size": round(self.items / self.batches, 2) if self.batches else None,
+                "max_batch_size": self.max_batch_seen,
+                "batch_sizes": dict(sorted(self.batch_sizes.items())),
+                "avg_wait_ms": (round(self.wait_time / self.items * 1000, 2)
+                                if self.items else None),
+                "avg_batch_ms": (round(self.run_time / self.batches * 1000, 2)
+                                 if self.batches else None),
+                "config": {
+                    "max_batch_size": self.max_batch_size,
+                    "max_wait_ms": self.max_wait * 1000,
+                },
+            }
@@ -0,0 +1,79 @@
+"""Preprocessed MNIST test set, memory-mapped for /api/sample.
+
+The 10k test images and their labels are written once to a uint8 .npy file
+of shape (N, 785): 784 pixels then the label. Workers open it with
+mmap_mode="r", so they all share the page cache copy instead of holding
+their own datasets, and a sample is one 785-byte row: the raw and
+normalized images are derived from it on the fly.
+
+    python mnist_samples.py    # build data/mnist_test_uint8.npy if missing
+"""
+
+import os
+
+import numpy as np
+
+DATA_DIR = "data"
+SAMPLES_FILE = "mnist_test_uint8.npy"
+
+# Same normalization as training (transforms.Normalize)
+MNIST_MEAN = np.float32(0.1307)
+MNIST_STD = np.float32(0.3081)
+
+
+def _read_idx(path, header_bytes):
+    with open(path, "rb") as f:
+        return np.frombuffer(f.read(), dtype=np.uint8, offset=header_bytes)
+
+
+def _load_test_set(data_dir):
+    """(images (N, 28, 28), labels (N,)) as uint8 arrays."""
+    raw_dir = os.path.join(data_dir, "MNIST", "raw")
+    images_path = os.path.join(raw_dir, "t10k-images-idx3-ubyte")
+    labels_path = os.path.join(raw_dir, "t10k-labels-idx1-ubyte")
+    if os.path.exists(images_path) and os.path.exists(labels_path):
+        # IDX files: 16-byte header for images, 8 bytes for labels
+        images = _read_idx(images_path, 16).reshape(-1, 28, 28)
+        labels = _read_idx(labels_path, 8)
+        return images, labels
+
+    from torchvision import datasets
+    dataset = datasets.MNIST(data_dir, train=False, download=True)
+    return dataset.data.numpy(), dataset.targets.numpy().astype(np.uint8)
+
+
+def build_samples(data_dir=DATA_DIR):
+    """Write the (N, 785) uint8 sample file unless it exists; return its path."""
+    path = os.path.join(data_dir, SAMPLES_FILE)
+    if os.path.exists(path):
+        return path
+    images, labels = _load_test_set(data_dir)
+    samples = np.empty((len(images), 785), dtype=np.uint8)
+    samples[:, :784] = images.reshape(len(images), 784)
+    samples[:, 784] = labels
+
+    # Written aside then renamed: concurrent workers never see a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, samples)
+    os.replace(tmp_path, path)
+    return path
+
+
+def open_samples(data_dir=DATA_DIR):
+    """Read-only memory map of the sample file, built first if needed."""
+    return np.load(build_samples(data_dir), mmap_mode="r")
+
+
+def get_sample(samples, index):
+    """(normalized image, raw image, label) of one row, images as (28, 28)
+    float32 arrays computed like ToTensor() and Normalize()."""
+    row = samples[index]
+    raw = row[:784].reshape(28, 28).astype(np.float32) / np.float32(255)
+    normalized = (raw - MNIST_MEAN) / MNIST_STD
+    return normalized, raw, int(row[784])
+
+
+if __name__ == "__main__":
+    path = build_samples()
+    print(f"MNIST test samples: {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
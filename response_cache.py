@@ -0,0 +1,72 @@
+"""Bounded LRU cache of serialized responses.
+
+Entries are kept as the response bytes, so a hit skips both the work that
+produced the payload and its JSON serialization. The least recently used
+entries are evicted once the stored bytes exceed the memory budget.
+"""
+
+import threading
+from collections import OrderedDict
+
+# Approximate memory of one entry besides its body (key, node, bytes header)
+ENTRY_OVERHEAD_BYTES = 200
+
+
+class ResponseCache:
+    """Thread-safe LRU of key -> bytes, bounded by max_bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _size(body):
+        return len(body) + ENTRY_OVERHEAD_BYTES
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body):
+        size = self._size(body)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= self._size(previous)
+            self._entries[key] = body
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= self._size(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "evictions": self.evictions,
+            }
@@ -16,6 +16,7 @@ const FILES = "abcdefgh";
 // ============================================================
 
 let gameState = {
+    gameId: null,       // server-side game (keeps history and search state)
     fen: null,
     board: null,        // 8x8 array
     legalMoves: [],     // UCI strings
@@ -31,6 +32,7 @@ let fenHistory = [];        // FEN stack for undo
 let searchDepth = 3;
 let isThinking = false;
 let lastTree = null;
+let lastSearchId = null;    // search of lastTree, for /api/chess/tree
 let treeCollapsed = false;
 
 // ============================================================
@@ -186,21 +188,17 @@ async function makeMove(uciMove) {
     renderBoard();
 
     try {
-        const response = await fetch("/api/chess/move", {
-            method: "POST",
-            headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({
-                fen: gameState.fen,
-                user_move: uciMove,
-                eval_code: document.getElementById("eval-editor").value,
-                depth: searchDepth,
-            }),
-        });
-
-        const data = await response.json();
-
-        if (data.error) {
-            showStatus(data.error, true);
+        const data = await fetchMoveJob({
+            game_id: gameState.gameId,
+            fen: gameState.fen,
+            user_move: uciMove,
+            eval_code: document.getElementById("eval-editor").value,
+            depth: searchDepth,
+            tree_options: { max_children: MAX_CHILDREN_DISPLAY },
+        }, onSearchEvent);
+
+        if (!data || data.error) {
+            showStatus(data ? data.error : "Erreur de connexion au serveur", true);
             fenHistory.pop();
             isThinking = false;
             document.getElementById("thinking-overlay").style.display = "none";
@@ -208,6 +206,7 @@ async function makeMove(uciMove) {
         }
 
         // Update game state
+        gameState.gameId = data.game_id;
         gameState.fen = data.fen_after_ai || data.fen_after_user;
         gameState.board = data.board;
         gameState.legalMoves = data.legal_moves || [];
@@ -237,6 +236,7 @@ async function makeMove(uciMove) {
         // Render tree
         if (data.tree) {
             lastTree = data.tree;
+            lastSearchId = data.search_id;
             renderSearchTree(data.tree);
             document.getElementById("search-stats").style.display = "";
             updateStats(data.stats);
@@ -256,6 +256,64 @@ async function makeMove(uciMove) {
     document.getElementById("thinking-overlay").style.display = "none";
 }
 
+// Interval between two polls of a running search job
+const JOB_POLL_MS = 200;
+
+const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+
+// Queue a move request as a search job, then poll it until it is over.
+// Iterations and the latest progress go to onEvent; resolves with the
+// final result (or {error}, e.g. when the server's search queue is full).
+async function fetchMoveJob(body, onEvent) {
+    const response = await fetch("/api/chess/jobs", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify(body),
+    });
+    let job = await response.json();
+    if (!response.ok || job.status === "done") {
+        return job.result || job;
+    }
+
+    let since = 0;
+    while (true) {
+        await sleep(JOB_POLL_MS);
+        const poll = await fetch(`/api/chess/jobs/${job.job_id}?since=${since}`);
+        job = await poll.json();
+        if (!poll.ok) return job;
+
+        since = job.next;
+        for (const event of job.events) {
+            onEvent(event.type, event);
+        }
+        if (job.progress && job.status === "running") {
+            onEvent("progress", job.progress);
+        }
+        if (job.status === "done") return job.result;
+        if (job.status !== "queued" && job.status !== "running") {
+            return { error: job.error || "Recherche annulee" };
+        }
+    }
+}
+
+function onSearchEvent(name, event) {
+    if (name === "iteration" && event.tree) {
+        lastTree = event.tree;
+        lastSearchId = null;
+        renderSearchTree(event.tree);
+    }
+    if (name === "iteration" || name === "progress") {
+        document.getElementById("search-stats").style.display = "";
+        updateStats({
+            nodes_explored: event.nodes_explored,
+            nodes_pruned: event.nodes_pruned,
+            quiescence_nodes: event.quiescence_nodes,
+            search_time_ms: name === "iteration" ? event.time_ms : event.elapsed_ms,
+            max_depth: event.depth,
+        });
+    }
+}
+
 // ============================================================
 // MOVE HISTORY
 // ============================================================
@@ -319,6 +377,7 @@ function updateStats(stats) {
     if (!stats) return;
     document.getElementById("stat-nodes").textContent = stats.nodes_explored.toLocaleString();
     document.getElementById("stat-pruned").textContent = stats.nodes_pruned.toLocaleString();
+    document.getElementById("stat-qnodes").textContent = (stats.quiescence_nodes || 0).toLocaleString();
     document.getElementById("stat-time").textContent = stats.search_time_ms + " ms";
     document.getElementById("stat-depth").textContent = stats.max_depth;
 }
@@ -370,7 +429,7 @@ function createSVG(tag, attrs) {
 function prepareTreeForDisplay(node) {
     if (!node || !node.children) return;
 
-    if (node.children.length > MAX_CHILDREN_DISPLAY) {
+    if (node.children.length > MAX_CHILDREN_DISPLAY && !node._expanded) {
         const bestIdx = node.children.findIndex(c => c.is_best_path);
         let shown = [];
 
@@ -384,10 +443,10 @@ function prepareTreeForDisplay(node) {
         }
 
         node._displayChildren = shown;
-        node._omitted = node.children.length - shown.length;
+        node._omitted = node.children.length - shown.length + (node.children_omitted || 0);
     } else {
         node._displayChildren = node.children;
-        node._omitted = 0;
+        node._omitted = node.children_omitted || 0;
     }
 
     for (const child of node._displayChildren) {
@@ -523,7 +582,12 @@ function renderTreeNodeSVG(svg, node, cx, cy) {
             "font-weight": "600",
             "font-family": "Arial, sans-serif",
         });
-        if (node.is_leaf && node.eval_score !== null) {
+        if (node.is_tt_hit) {
+            valText.textContent = `TT=${fmtVal(node.value)}`;
+        } else if (node.is_leaf && node.eval_score !== null && node.value !== node.eval_score) {
+            // Value changed by the quiescence search below this leaf
+            valText.textContent = `q=${fmtVal(node.value)}`;
+        } else if (node.is_leaf && node.eval_score !== null) {
             valText.textContent = `eval=${fmtVal(node.eval_score)}`;
         } else {
             valText.textContent = `val=${fmtVal(node.value)}`;
@@ -589,10 +653,44 @@ function renderTreeNodeSVG(svg, node, cx, cy) {
             "font-family": "Arial, sans-serif",
         });
         omText.textContent = `+${node._omitted}`;
+        if (lastSearchId && node.id !== undefined) {
+            // Omitted children are fetched from the stored search tree
+            omText.setAttribute("style", "cursor: pointer; text-decoration: underline");
+            omText.addEventListener("click", () => expandTreeNode(node));
+        }
         svg.appendChild(omText);
     }
 }
 
+// Show every child of a node: the ones the server left out of the
+// response are fetched, with one level below them, and merged in.
+async function expandTreeNode(node) {
+    const searchId = lastSearchId;
+    if (node.children_omitted) {
+        let data;
+        try {
+            const response = await fetch(`/api/chess/tree/${searchId}/${node.id}?max_depth=1`);
+            data = await response.json();
+            if (!response.ok) {
+                showStatus(data.error || "Arbre indisponible", true);
+                return;
+            }
+        } catch (err) {
+            showStatus("Erreur de connexion au serveur", true);
+            return;
+        }
+        // A new search replaced the tree in the meantime
+        if (searchId !== lastSearchId) return;
+
+        // Children already shown keep their subtrees
+        const known = new Map(node.children.map(child => [child.id, child]));
+        node.children = data.tree.children.map(child => known.get(child.id) || child);
+        delete node.children_omitted;
+    }
+    node._expanded = true;
+    renderSearchTree(lastTree);
+}
+
 function renderSearchTree(tree) {
     const container = document.getElementById("tree-container");
     if (!tree) {
@@ -639,10 +737,11 @@ async function newGame(fen) {
         const response = await fetch("/api/chess/new", {
             method: "POST",
             headers: { "Content-Type": "application/json" },
-            body: JSON.stringify(fen ? { fen } : {}),
+            body: JSON.stringify(fen ? { fen, session: true } : { session: true }),
         });
         const data = await response.json();
 
+        gameState.gameId = data.game_id;
         gameState.fen = data.fen;
         gameState.board = data.board;
         gameState.legalMoves = data.legal_moves;
@@ -653,6 +752,7 @@ async function newGame(fen) {
         lastMoveFrom = null;
         lastMoveTo = null;
         lastTree = null;
+        lastSearchId = null;
 
         if (!fen) {
             moveHistory = [];
@@ -1414,7 +1414,8 @@ function initRealExample() {
             const predictResp = await fetch("/api/predict", {
                 method: "POST",
                 headers: { "Content-Type": "application/json" },
-                body: JSON.stringify({ model: "cnn", image: sampleData.image })
+                // Only the probabilities are shown: skip the other layers
+                body: JSON.stringify({ model: "cnn", image: sampleData.image, layers: [] })
             });
             const predictData = await predictResp.json();
             const pred = predictData.prediction;
@@ -177,12 +177,14 @@ async function doPredict() {
         const res = await fetch("/api/predict", {
             method: "POST",
             headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({ model: currentModel, image }),
+            // Activations as quantized typed arrays instead of nested JSON lists
+            body: JSON.stringify({ model: currentModel, image, encoding: "u8" }),
         });
         const data = await res.json();
+        const activations = decodeActivations(data.activations);
         predDisplay.textContent = data.prediction;
-        renderProbChart(data.activations.output);
-        renderVisualization(data.activations);
+        renderProbChart(activations.output);
+        renderVisualization(activations);
     } catch (e) {
         // ignore network errors during rapid drawing
     }
@@ -604,7 +606,7 @@ function drawFeatureMap(parent, data, cx, cy, size) {
     const startX = cx - (cols * pixSize) / 2;
     const startY = cy - (rows * pixSize) / 2;
 
-    const flat = data.flat();
+    const flat = flatten2D(data);
     const minV = Math.min(...flat);
     const maxV = Math.max(...flat);
 
@@ -651,9 +653,71 @@ function createSVG(tag, attrs = {}) {
 }
 
 function flatten2D(arr) {
+    if (ArrayBuffer.isView(arr[0])) return arr.flatMap(row => Array.from(row));
     if (!Array.isArray(arr[0])) return arr;
     return arr.flat();
 }
 
+// ============ Activation Decoding ============
+// Layers sent with an "encoding" arrive as {dtype, shape, data (base64)}:
+// decode them to typed arrays laid out like the JSON form (rows of 2D
+// layers, {shape, maps} for feature maps).
+function decodeActivations(act) {
+    const decoded = {};
+    for (const [name, layer] of Object.entries(act)) {
+        decoded[name] = layer && layer.dtype ? decodeLayer(layer) : layer;
+    }
+    return decoded;
+}
+
+function decodeLayer(layer) {
+    const bytes = Uint8Array.from(atob(layer.data), c => c.charCodeAt(0));
+    const shape = layer.shape;
+    let values;
+    if (layer.dtype === "float32") {
+        values = new Float32Array(bytes.buffer);
+    } else if (layer.dtype === "float16") {
+        values = halfToFloat32(new Uint16Array(bytes.buffer));
+    } else {
+        // uint8: value = min + q * scale, per feature map for 3D layers
+        values = new Float32Array(bytes.length);
+        const perMap = Array.isArray(layer.min);
+        const mapSize = perMap ? bytes.length / shape[0] : bytes.length;
+        for (let i = 0; i < bytes.length; i++) {
+            const m = perMap ? Math.floor(i / mapSize) : 0;
+            const min = perMap ? layer.min[m] : layer.min;
+            const scale = perMap ? layer.scale[m] : layer.scale;
+            values[i] = min + bytes[i] * scale;
+        }
+    }
+
+    if (shape.length === 1) return values;
+    const rowLen = shape[shape.length - 1];
+    const rows = [];
+    for (let i = 0; i < values.length; i += rowLen) {
+        rows.push(values.subarray(i, i + rowLen));
+    }
+    if (shape.length === 2) return rows;
+    const maps = [];
+    for (let i = 0; i < rows.length; i += shape[1]) {
+        maps.push(rows.slice(i, i + shape[1]));
+    }
+    return { shape, maps };
+}
+
+function halfToFloat32(halves) {
+    const out = new Float32Array(halves.length);
+    for (let i = 0; i < halves.length; i++) {
+        const h = halves[i];
+        const sign = h & 0x8000 ? -1 : 1;
+        const exp = (h >> 10) & 0x1f;
+        const frac = h & 0x3ff;
+        if (exp === 0) out[i] = sign * frac * 2 ** -24;
+        else if (exp === 31) out[i] = frac ? NaN : sign * Infinity;
+        else out[i] = sign * (1 + frac / 1024) * 2 ** (exp - 15);
+    }
+    return out;
+}
+
 // ============ Init ============
 clearProbChart();
@@ -0,0 +1,265 @@
+import os
+import subprocess
+import sys
+import time
+
+import chess
+import pytest
+
+import chess_jobs
+from chess_engine import DEFAULT_EVAL_CODE
+from chess_jobs import SEARCH_KILLED, ChessJobQueue, JobRejected
+from chess_store import ChessStore
+
+# Stuck in C code, where neither the eval timeout nor the cancel flag is seen
+STUCK_EVAL = "def evaluate(board):\n    return sum(range(10 ** 12))"
+
+
+def make_task(depth=2, time_ms=None):
+    return {
+        "fen": chess.STARTING_FEN,
+        "history": ["e2e4"],
+        "pv": None,
+        "eval_code": DEFAULT_EVAL_CODE,
+        "depth": depth,
+        "tt": None,
+        "time_ms": time_ms,
+        "eval_mode": "inline",
+        "tree_options": None,
+        "workers": 1,
+        "quiescence": False,
+        "show_quiescence": False,
+        "shortcuts": False,
+        "book_path": None,
+    }
+
+
+def long_task():
+    # Runs until cancelled (or a minute has passed)
+    return make_task(depth=30, time_ms=60_000)
+
+
+def finish(result):
+    return {"move": result["ai_move"]}
+
+
+def wait_for(jobs, job, *statuses, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        data = jobs.poll(job.id)
+        if data["status"] in statuses:
+            return data
+        time.sleep(0.02)
+    raise AssertionError(f"job still {data['status']}")
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ChessStore(str(tmp_path / "jobs.sqlite3"))
+    yield store
+    store.remove()
+
+
+@pytest.fixture
+def jobs(store):
+    jobs = ChessJobQueue(store, mode="thread", max_queued=2, per_client=2)
+    yield jobs
+    for job in list(jobs._jobs.values()):
+        jobs.cancel(job.id)
+        job.done.wait(10)
+
+
+def test_job_runs_and_returns_the_finish_payload(jobs):
+    job = jobs.submit("client", make_task(), finish)
+
+    data = wait_for(jobs, job, "done", "failed")
+
+    assert data["status"] == "done", data["error"]
+    assert chess.Move.from_uci(data["result"]["move"]) in chess.Board(
+        "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1").legal_moves
+    assert data["run_ms"] >= 0
+    assert jobs.get_stats()["done"] == 1
+
+
+def test_unknown_job_polls_as_none(jobs):
+    assert jobs.poll("missing") is None
+    assert not jobs.cancel("missing")
+
+
+def test_client_limit_is_rejected(jobs):
+    jobs.per_client = 1
+    jobs.submit("client", long_task(), finish)
+
+    with pytest.raises(JobRejected):
+        jobs.submit("client", make_task(), finish)
+    jobs.submit("other", make_task(), finish)
+    assert jobs.get_stats()["rejected_client"] == 1
+
+
+def test_full_queue_is_rejected(jobs):
+    jobs.max_queued = 1
+    running = jobs.submit("a", long_task(), finish)
+    wait_for(jobs, running, "running")
+    queued = jobs.submit("b", make_task(), finish)
+
+    with pytest.raises(JobRejected):
+        jobs.submit("c", make_task(), finish)
+    assert jobs.poll(queued.id)["position"] == 1
+    assert jobs.get_stats()["rejected_full"] == 1
+
+
+def test_cancel_queued_job(jobs):
+    running = jobs.submit("a", long_task(), finish)
+    wait_for(jobs, running, "running")
+    queued = jobs.submit("b", make_task(), finish)
+
+    assert jobs.cancel(queued.id)
+
+    assert jobs.poll(queued.id)["status"] == "cancelled"
+    assert jobs.poll(running.id)["status"] == "running"
+    assert not jobs.cancel(queued.id)
+
+
+def test_cancel_running_job_drops_the_result(jobs):
+    job = jobs.submit("a", long_task(), finish)
+    wait_for(jobs, job, "running")
+
+    assert jobs.cancel(job.id)
+
+    data = wait_for(jobs, job, "cancelled", "done", "failed", timeout=10)
+    assert data["status"] == "cancelled"
+    assert data["result"] is None
+
+
+def test_cancel_by_search_id_keeps_the_best_move(jobs):
+    job = jobs.submit("a", long_task(), finish, search_id="search-1")
+    wait_for(jobs, job, "running")
+    # Let the first iterations complete
+    time.sleep(0.3)
+
+    assert jobs.cancel(search_id="search-1", keep_result=True)
+
+    data = wait_for(jobs, job, "cancelled", "done", "failed", timeout=10)
+    assert data["status"] == "done"
+    assert data["result"]["move"]
+    assert data["events"]
+
+
+@pytest.fixture
+def process_jobs(store, monkeypatch):
+    monkeypatch.setattr(chess_jobs, "KILL_GRACE_SECONDS", 0.5)
+    monkeypatch.setattr(chess_jobs, "TIME_LIMIT_GRACE_SECONDS", 0.5)
+    jobs = ChessJobQueue(store, mode="process", max_queued=2, per_client=2)
+    yield jobs
+    for slot, pool in list(jobs._pools.items()):
+        jobs._kill_pool(slot, pool)
+
+
+def search_pids(jobs):
+    return [pid for pool in jobs._pools.values() for pid in pool._processes]
+
+
+def process_gone(pid, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        # Reap it if it is our child
+        try:
+            os.waitpid(pid, os.WNOHANG)
+        except ChildProcessError:
+            pass
+        time.sleep(0.05)
+    return False
+
+
+def test_stuck_search_process_is_killed_on_cancel(process_jobs):
+    stuck = process_jobs.submit("a", dict(make_task(depth=2), eval_code=STUCK_EVAL), finish)
+    wait_for(process_jobs, stuck, "running")
+    queued = process_jobs.submit("b", make_task(), finish)
+    time.sleep(0.5)
+    pids = search_pids(process_jobs)
+
+    assert process_jobs.cancel(stuck.id)
+
+    assert wait_for(process_jobs, stuck, "cancelled", "failed", "done")["status"] == "cancelled"
+    assert all(process_gone(pid) for pid in pids)
+    # The runner starts a new search process for the next job
+    assert wait_for(process_jobs, queued, "done", "failed")["status"] == "done"
+    assert process_jobs.get_stats()["killed"] == 1
+
+
+def test_search_past_its_time_budget_is_killed(process_jobs):
+    job = process_jobs.submit("a", dict(make_task(depth=2, time_ms=200), eval_code=STUCK_EVAL),
+                              finish)
+
+    data = wait_for(process_jobs, job, "cancelled", "failed", "done")
+
+    assert (data["status"], data["error"]) == ("failed", SEARCH_KILLED)
+
+
+# A web worker that leaves while its search is stuck, without cleaning up
+ORPHAN_SCRIPT = """
+import os, sys, time
+import chess_jobs, test_chess_jobs
+from chess_store import ChessStore
+jobs = chess_jobs.ChessJobQueue(ChessStore(sys.argv[1]), mode="process")
+task = dict(test_chess_jobs.make_task(), eval_code=test_chess_jobs.STUCK_EVAL)
+job = jobs.submit("a", task, test_chess_jobs.finish)
+test_chess_jobs.wait_for(jobs, job, "running")
+while not test_chess_jobs.search_pids(jobs):
+    time.sleep(0.02)
+with open(sys.argv[2], "w") as f:
+    f.write(" ".join(map(str, test_chess_jobs.search_pids(jobs))))
+os._exit(0)
+"""
+
+
+def test_search_process_exits_with_its_web_worker(tmp_path):
+    pid_file = tmp_path / "pids"
+    path = os.pathsep.join([os.path.dirname(__file__)] + sys.path)
+    subprocess.run([sys.executable, "-c", ORPHAN_SCRIPT, str(tmp_path / "state.sqlite3"),
+                    str(pid_file)], env=dict(os.environ, PYTHONPATH=path),
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=30, check=True)
+
+    pids = [int(pid) for pid in pid_file.read_text().split()]
+    assert pids
+    assert all(process_gone(pid) for pid in pids)
+
+
+def test_store_cancel_requests_are_seen_by_the_owner(store):
+    store.add_job("j1", "client", "s1", max_queued=4, per_client=4)
+    store.add_job("j2", "client", None, max_queued=4, per_client=4)
+
+    assert store.request_cancel(search_id="s1", keep_result=True)[2]
+    # A second request without keep_result clears it
+    job_id, owner, keep = store.request_cancel("j1")
+
+    assert (job_id, keep) == ("j1", False)
+    assert store.cancel_requests(owner) == [("j1", False)]
+    assert store.request_cancel("missing") is None
+
+
+def test_store_expires_finished_jobs(store):
+    for job_id in ("j1", "j2", "j3"):
+        store.add_job(job_id, "client", None, max_queued=4, per_client=4)
+    store.update_job("j1", status="done", finished=time.time() - 1000)
+    store.update_job("j2", status="done", finished=time.time())
+    store.add_event("j1", 0, {"type": "iteration"})
+
+    store.expire(ttl=300, max_finished=10)
+
+    assert store.get_job("j1") is None
+    assert store.get_job("j2")["status"] == "done"
+    assert store.job_counts() == {"queued": 1, "running": 0}
+
+
+def test_store_keeps_recent_search_trees(store):
+    for index in range(3):
+        store.add_tree(f"s{index}", {"nodes": index}, max_trees=2)
+        time.sleep(0.01)
+
+    assert store.get_tree("s0") is None
+    assert store.get_tree("s2") == {"nodes": 2}
@@ -0,0 +1,35 @@
+import os
+
+import pytest
+import torch
+
+os.environ.setdefault("CHESS_JOB_MODE", "thread")
+
+import app  # noqa: E402
+from inference import INFERENCE_BACKENDS  # noqa: E402
+from train import SimpleCNN  # noqa: E402
+
+
+@pytest.fixture
+def cnn(tmp_path, monkeypatch):
+    """Untrained CNN saved where app._load_model() reads it."""
+    torch.manual_seed(0)
+    model = SimpleCNN()
+    (tmp_path / "models").mkdir()
+    torch.save(model.state_dict(), tmp_path / "models" / "cnn_model.pth")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(app, "_components", {})
+    return model
+
+
+@pytest.mark.parametrize("backend", INFERENCE_BACKENDS)
+def test_cnn_filters_under_each_backend(cnn, backend, monkeypatch):
+    monkeypatch.setattr(app, "MNIST_BACKEND", backend)
+
+    response = app.app.test_client().get("/api/cnn-filters")
+
+    assert response.status_code == 200
+    filters = response.get_json()["filters"]
+    assert [f["index"] for f in filters] == list(range(8))
+    expected = cnn.conv1.weight.data[0, 0].tolist()
+    assert filters[0]["kernel"] == expected
@@ -0,0 +1,92 @@
+import base64
+
+import numpy as np
+import pytest
+import torch
+
+from activations import encode_array, split_activations
+
+DTYPES = {"float32": "<f4", "float16": "<f2", "uint8": "u1"}
+
+
+def decode(entry):
+    """Client-side decoding of an encode_array() entry."""
+    data = np.frombuffer(base64.b64decode(entry["data"]), dtype=DTYPES[entry["dtype"]])
+    values = data.astype(np.float64).reshape(entry["shape"])
+    if entry["dtype"] == "uint8":
+        low = np.asarray(entry["min"], dtype=np.float64)
+        scale = np.asarray(entry["scale"], dtype=np.float64)
+        if values.ndim == 3:
+            low, scale = low[:, None, None], scale[:, None, None]
+        values = low + values * scale
+    return values
+
+
+@pytest.fixture
+def maps():
+    generator = torch.Generator().manual_seed(0)
+    return torch.randn(4, 6, 6, generator=generator) * 3
+
+
+def test_f32_round_trip_is_exact(maps):
+    entry = encode_array(maps, "f32")
+
+    assert entry["dtype"] == "float32"
+    assert entry["shape"] == [4, 6, 6]
+    assert np.array_equal(decode(entry), maps.numpy())
+
+
+def test_f16_round_trip_within_half_precision(maps):
+    decoded = decode(encode_array(maps, "f16"))
+
+    assert np.allclose(decoded, maps.numpy(), rtol=1e-3, atol=1e-3)
+
+
+def test_u8_quantizes_each_feature_map(maps):
+    # Very different ranges per map must not share one scale
+    maps[0] *= 100
+    entry = encode_array(maps, "u8")
+
+    assert len(entry["min"]) == len(entry["scale"]) == 4
+    error = np.abs(decode(entry) - maps.numpy())
+    for index in range(4):
+        assert error[index].max() <= entry["scale"][index] / 2 + 1e-6
+
+
+def test_u8_quantizes_a_vector_as_a_whole():
+    values = torch.linspace(-1, 1, 10)
+    entry = encode_array(values, "u8")
+
+    assert isinstance(entry["min"], float)
+    assert np.abs(decode(entry) - values.numpy()).max() <= entry["scale"] / 2 + 1e-6
+
+
+def test_u8_constant_map_decodes_exactly():
+    values = torch.full((2, 3, 3), 0.25)
+
+    assert np.allclose(decode(encode_array(values, "u8")), 0.25)
+
+
+def test_split_activations_keeps_output_as_lists(maps):
+    layers = {
+        "output": torch.softmax(torch.randn(2, 10), dim=1),
+        "conv1": torch.stack([maps, maps * 2]),
+        "fc1": torch.randn(2, 8),
+    }
+
+    per_image = split_activations(layers, "u8")
+
+    assert len(per_image) == 2
+    assert per_image[1]["output"] == pytest.approx(layers["output"][1].tolist())
+    assert np.allclose(decode(per_image[1]["conv1"]), (maps * 2).numpy(),
+                       atol=max(per_image[1]["conv1"]["scale"]))
+    assert per_image[0]["fc1"]["shape"] == [8]
+
+
+def test_split_activations_json(maps):
+    layers = {"output": torch.tensor([[0.5, 0.5]]), "conv1": maps.unsqueeze(0)}
+
+    per_image = split_activations(layers)
+
+    assert per_image[0]["conv1"]["shape"] == [4, 6, 6]
+    assert np.allclose(per_image[0]["conv1"]["maps"], maps.numpy())
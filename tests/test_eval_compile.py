@@ -0,0 +1,71 @@
+import threading
+
+import chess
+
+from chess_engine import EVAL_VALIDATIONS_PER_CODE, compile_user_eval, get_compiled_eval
+
+STATEFUL = '''\
+calls = []
+
+def evaluate(board):
+    calls.append(1)
+    return len(calls)
+'''
+
+
+def test_each_function_has_its_own_globals():
+    first, _ = compile_user_eval(STATEFUL)
+    second, _ = compile_user_eval(STATEFUL)
+
+    assert [first(chess.Board()) for _ in range(3)] == [1.0, 2.0, 3.0]
+    assert second(chess.Board()) == 1.0
+
+
+def test_chess_module_changes_stay_in_one_namespace():
+    patched, _ = compile_user_eval('''\
+chess.WHITE = "patched"
+
+def evaluate(board):
+    return chess.WHITE
+''')
+    clean, _ = compile_user_eval("def evaluate(board):\n    return chess.WHITE")
+
+    assert patched(chess.Board()) == "patched"
+    assert clean(chess.Board()) is True
+    assert chess.WHITE is True
+
+
+def test_compiled_code_is_cached_once():
+    code = "def evaluate(board):\n    return 7"
+
+    assert get_compiled_eval(code) is get_compiled_eval(code + "\n")
+
+
+def test_errors_are_reported_without_a_function():
+    eval_fn, error = compile_user_eval("def evaluate(board)\n    return 0")
+    assert eval_fn is None and "syntaxe" in error
+
+    eval_fn, error = compile_user_eval("x = 1")
+    assert eval_fn is None and "non trouvee" in error
+
+
+def test_validations_are_thread_safe():
+    compiled = get_compiled_eval("def evaluate(board):\n    return 3")
+    errors = []
+
+    def fill(offset):
+        try:
+            for i in range(2000):
+                compiled.set_validation(f"fen-{(offset + i) % 50}", float(i))
+                compiled.get_validation(f"fen-{i % 50}")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=fill, args=(n * 7,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(compiled.validations) <= EVAL_VALIDATIONS_PER_CODE
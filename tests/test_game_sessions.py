@@ -0,0 +1,107 @@
+import os
+import time
+
+import chess
+import pytest
+
+# Searches run in the request's process; state goes to a throwaway database
+os.environ.setdefault("CHESS_JOB_MODE", "thread")
+
+import app  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def sessions():
+    with app.game_sessions_lock:
+        app.game_sessions.clear()
+    yield app.game_sessions
+    with app.game_sessions_lock:
+        app.game_sessions.clear()
+
+
+@pytest.fixture
+def client():
+    return app.app.test_client()
+
+
+def test_created_game_can_be_fetched(client):
+    game_id = app.create_game_session(chess.Board())
+
+    assert app.get_game_session(game_id)["version"] == 0
+    assert app.get_game_session("unknown") is None
+    assert client.get(f"/api/chess/game/{game_id}").get_json()["moves"] == []
+
+
+def test_idle_games_expire(sessions):
+    game_id = app.create_game_session(chess.Board())
+    sessions[game_id]["last_used"] = time.time() - app.CHESS_SESSION_TTL - 1
+
+    assert app.get_game_session(game_id) is None
+
+
+def test_least_recently_used_game_is_evicted_past_the_count(monkeypatch):
+    monkeypatch.setattr(app, "MAX_GAME_SESSIONS", 2)
+    first = app.create_game_session(chess.Board())
+    second = app.create_game_session(chess.Board())
+    app.get_game_session(first)
+
+    third = app.create_game_session(chess.Board())
+
+    assert app.get_game_session(second) is None
+    assert app.get_game_session(first) is not None
+    assert app.get_game_session(third) is not None
+
+
+def test_games_are_evicted_past_the_memory_budget(monkeypatch):
+    # An empty table counts 512 KB: two games fit in 1 MB, three do not
+    monkeypatch.setattr(app, "CHESS_SESSION_MEMORY_MB", 1)
+    monkeypatch.setattr(app, "SESSION_MOVE_BYTES", 0)
+    ids = [app.create_game_session(chess.Board()) for _ in range(3)]
+
+    assert [app.get_game_session(game_id) is not None for game_id in ids] == \
+        [False, True, True]
+
+
+def move_request(game_id):
+    session = app.get_game_session(game_id)
+    board = session["board"].copy()
+    board.push_uci("e2e4")
+    return {"session": session, "session_version": session["version"],
+            "board": board, "tt": session["tt"]}
+
+
+def test_save_stores_the_position_and_swaps_the_returned_table():
+    game_id = app.create_game_session(chess.Board())
+    request = move_request(game_id)
+    returned_tt = app.TranspositionTable()
+
+    assert app.save_game_session(request, {"tt": returned_tt, "pv": ["e7e5", "g1f3"]})
+
+    session = app.get_game_session(game_id)
+    assert session["version"] == 1
+    assert session["board"].move_stack == [chess.Move.from_uci("e2e4")]
+    assert session["tt"] is returned_tt
+    assert session["pv"] == ["g1f3"]
+
+
+def test_save_refuses_a_concurrent_move():
+    game_id = app.create_game_session(chess.Board())
+    first, second = move_request(game_id), move_request(game_id)
+
+    assert app.save_game_session(first)
+    assert not app.save_game_session(second)
+    assert app.get_game_session(game_id)["version"] == 1
+
+
+def test_moves_continue_a_server_side_game(client):
+    game_id = client.post("/api/chess/new", json={"session": True}).get_json()["game_id"]
+
+    data = client.post("/api/chess/move", json={
+        "game_id": game_id, "user_move": "e2e4", "depth": 1, "shortcuts": False,
+    }).get_json()
+
+    moves = client.get(f"/api/chess/game/{game_id}").get_json()["moves"]
+    assert moves == ["e2e4", data["ai_move"]]
+    assert client.post("/api/chess/move", json={
+        "game_id": "unknown", "user_move": "e2e4"}).status_code == 404
+    assert client.delete(f"/api/chess/game/{game_id}").get_json() == {"deleted": True}
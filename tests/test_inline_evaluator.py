@@ -0,0 +1,142 @@
+import threading
+import time
+
+import chess
+
+from chess_engine import InlineEvaluator, compile_user_eval, find_best_move
+
+SWALLOWING_LOOP = '''\
+def evaluate(board):
+    while True:
+        try:
+            while True:
+                pass
+        except:
+            pass
+'''
+
+STUBBORN = '''\
+def evaluate(board):
+    done = False
+    while not done:
+        try:
+            while True:
+                pass
+        except:
+            done = True
+    return 5.0
+'''
+
+
+def user_eval(code):
+    eval_fn, error = compile_user_eval(code)
+    assert error is None
+    return eval_fn
+
+
+def test_score_is_returned():
+    evaluator = InlineEvaluator(lambda board: len(board.piece_map()), timeout=0.2)
+
+    assert evaluator(chess.Board()) == 32.0
+    assert evaluator.error is None
+    evaluator.close()
+
+
+def test_timeout_stops_later_calls():
+    calls = []
+
+    def slow(board):
+        calls.append(board)
+        while True:
+            pass
+
+    evaluator = InlineEvaluator(slow, timeout=0.2)
+
+    assert evaluator(chess.Board()) == 0.0
+    assert evaluator(chess.Board()) == 0.0
+    assert evaluator.timed_out
+    assert len(calls) == 1
+    assert "depasse" in evaluator.error
+    evaluator.close()
+
+
+def test_catch_all_loop_cannot_outlive_its_deadline():
+    evaluator = InlineEvaluator(user_eval(SWALLOWING_LOOP), timeout=0.2)
+    start = time.perf_counter()
+
+    assert evaluator(chess.Board()) == 0.0
+
+    assert time.perf_counter() - start < 2
+    assert evaluator.timed_out
+    evaluator.close()
+
+
+def test_swallowed_timeout_still_counts_and_does_not_leak():
+    # Ignores the timeout delivered in its try block, then returns a score
+    evaluator = InlineEvaluator(user_eval(STUBBORN), timeout=0.1)
+
+    assert evaluator(chess.Board()) == 0.0
+    assert evaluator.timed_out
+    # No pending timeout reaches the caller once the call has returned
+    deadline = time.perf_counter() + 0.5
+    while time.perf_counter() < deadline:
+        pass
+    evaluator.close()
+
+
+def test_other_errors_only_score_their_leaf():
+    def flaky(board):
+        if board.turn == chess.BLACK:
+            raise ValueError("boom")
+        return 1.0
+
+    evaluator = InlineEvaluator(flaky, timeout=0.2)
+    black = chess.Board()
+    black.push_san("e4")
+
+    assert evaluator(black) == 0.0
+    assert evaluator(chess.Board()) == 1.0
+    assert not evaluator.timed_out
+    assert "boom" in evaluator.error
+    evaluator.close()
+
+
+def test_user_handlers_work_before_the_deadline():
+    evaluator = InlineEvaluator(user_eval('''\
+def evaluate(board):
+    try:
+        int("x")
+    except:
+        score = 1.0
+    finally:
+        score += 1
+    return score
+'''), timeout=0.2)
+
+    assert evaluator(chess.Board()) == 2.0
+    assert evaluator.error is None
+    evaluator.close()
+
+
+def test_guard_name_is_reserved():
+    eval_fn, error = compile_user_eval(
+        "__check_eval_timeout__ = None\ndef evaluate(board):\n    return 0")
+
+    assert eval_fn is None
+    assert "reserve" in error
+
+
+def test_search_with_catch_all_eval_finishes():
+    result = {}
+
+    def search():
+        result.update(find_best_move(chess.Board(), SWALLOWING_LOOP, depth=3, time_ms=500,
+                                     quiescence=False))
+
+    thread = threading.Thread(target=search, daemon=True)
+    thread.start()
+    thread.join(10)
+
+    assert not thread.is_alive()
+    assert result["ai_move"] is not None
+    assert "depasse" in result["eval_error"]
@@ -0,0 +1,99 @@
+import threading
+import time
+
+import pytest
+
+from micro_batching import MicroBatcher
+
+
+def submit_concurrently(batcher, items):
+    results = [None] * len(items)
+
+    def run(index):
+        results[index] = batcher.submit(items[index])
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(len(items))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+    return results
+
+
+def test_single_item_gets_its_result():
+    batcher = MicroBatcher(lambda items: [item * 2 for item in items], max_wait_ms=1)
+
+    assert batcher.submit(21) == 42
+
+
+def test_items_queued_during_a_batch_run_together():
+    batches = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def run_batch(items):
+        batches.append(list(items))
+        started.set()
+        release.wait(timeout=5)
+        return [item * 10 for item in items]
+
+    batcher = MicroBatcher(run_batch, max_batch_size=8, max_wait_ms=50)
+    first = threading.Thread(target=batcher.submit, args=(0,))
+    first.start()
+    assert started.wait(timeout=5)
+
+    # The scheduler is busy with the first item: the next ones queue up
+    results = {}
+    threads = [threading.Thread(target=lambda i=i: results.update({i: batcher.submit(i)}))
+               for i in range(1, 6)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while batcher.get_stats()["queue_depth"] < 5 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads + [first]:
+        thread.join(timeout=10)
+
+    assert results == {1: 10, 2: 20, 3: 30, 4: 40, 5: 50}
+    assert sorted(batches[1]) == [1, 2, 3, 4, 5]
+    assert batcher.get_stats()["batches"] == 2
+
+
+def test_batch_is_capped_at_max_batch_size():
+    sizes = []
+
+    def run_batch(items):
+        sizes.append(len(items))
+        return items
+
+    batcher = MicroBatcher(run_batch, max_batch_size=3, max_wait_ms=20)
+
+    assert submit_concurrently(batcher, list(range(10))) == list(range(10))
+    assert max(sizes) <= 3
+    assert sum(sizes) == 10
+
+
+def test_exception_reaches_every_item_of_the_batch():
+    def run_batch(items):
+        raise ValueError("boom")
+
+    batcher = MicroBatcher(run_batch, max_wait_ms=1)
+
+    with pytest.raises(ValueError, match="boom"):
+        batcher.submit(1)
+    # The scheduler keeps serving later batches
+    with pytest.raises(ValueError):
+        batcher.submit(2)
+
+
+def test_stats():
+    batcher = MicroBatcher(lambda items: items, max_batch_size=4, max_wait_ms=1)
+    batcher.submit(1)
+    batcher.submit(2)
+
+    stats = batcher.get_stats()
+    assert stats["batches"] == 2
+    assert stats["items"] == 2
+    assert stats["batch_sizes"] == {1: 2}
+    assert stats["config"] == {"max_batch_size": 4, "max_wait_ms": 1.0}
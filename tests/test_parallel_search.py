@@ -0,0 +1,62 @@
+import math
+
+import chess
+
+import chess_engine
+from chess_engine import DEFAULT_EVAL_CODE, find_best_move
+
+
+def search(workers, **kwargs):
+    board = chess.Board()
+    board.push_san("e4")
+    return find_best_move(board, kwargs.pop("eval_code", DEFAULT_EVAL_CODE), depth=3,
+                          workers=workers, **kwargs)
+
+
+def test_one_pool_serves_every_worker_count():
+    sequential = search(1)
+    first = search(3)
+    pool = chess_engine._root_pool
+
+    smaller = search(2)
+
+    assert chess_engine._root_pool is pool
+    assert pool.workers == 3
+    assert smaller["stats"]["parallel"]["tasks"] == 2
+    assert first["ai_move"] == smaller["ai_move"] == sequential["ai_move"]
+
+
+def test_parallel_stats_report_speedup_over_root_move_times():
+    search(2)  # start the pool
+
+    parallel = search(2)["stats"]["parallel"]
+
+    assert parallel["root_moves_time_ms"] > 0
+    # Rounded values: allow the rounding of both times
+    estimate = parallel["root_moves_time_ms"] / parallel["wall_time_ms"]
+    assert abs(parallel["speedup"] - estimate) < 0.1
+
+
+def test_pool_processes_use_the_requested_eval_mode(monkeypatch):
+    built = []
+    real = chess_engine.search_evaluator
+
+    def spy(eval_code, eval_mode="inline"):
+        built.append(eval_mode)
+        return real(eval_code, eval_mode)
+
+    monkeypatch.setattr(chess_engine, "search_evaluator", spy)
+    task = {
+        "fen": chess.STARTING_FEN, "history": ["e2e4"], "eval_code": "def evaluate(board):\n"
+        "    return len(board.pieces(chess.QUEEN, chess.WHITE))", "eval_mode": "thread",
+        "depth": 2, "maximizing": False, "alpha": -math.inf,
+        "beta": math.inf, "time_left": None, "quiescence": False,
+        "delta_pruning": False, "show_quiescence": False, "qnode_limit": 0, "slot": None,
+        "root_moves": ["e7e5", "d7d5"],
+    }
+
+    result = chess_engine._search_root_moves(task)
+
+    assert built == ["thread"]
+    assert len(result["values"]) == 2
+    assert result["eval_error"] is None
@@ -0,0 +1,45 @@
+import chess
+import chess.polyglot
+
+from chess_engine import DEFAULT_EVAL_CODE, _history_keys, _is_repetition, find_best_move
+
+# White has an extra queen: a draw by repetition is black's best result
+START = "rnbqkbnr/pppppppp/8/8/8/3Q4/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+SHUFFLE = ["g1f3", "g8f6", "f3g1", "f6g8", "g1f3", "g8f6", "f3g1"]
+
+
+def play(fen, moves):
+    board = chess.Board(fen)
+    for uci in moves:
+        board.push_uci(uci)
+    return board
+
+
+def test_history_keys_start_after_last_irreversible_move():
+    board = play(chess.STARTING_FEN, ["e2e4", "g8f6", "g1f3", "f6g8"])
+
+    keys = _history_keys(board)
+
+    # e2e4 reset the halfmove clock: the position before it cannot repeat
+    assert len(keys) == 3
+    assert keys[0] == chess.polyglot.zobrist_hash(play(chess.STARTING_FEN, ["e2e4"]))
+
+
+def test_is_repetition_needs_two_earlier_occurrences():
+    assert not _is_repetition([1, 2, 3, 4], 1, 4)
+    assert _is_repetition([1, 2, 1, 2, 3, 4], 1, 6)
+
+
+def test_is_repetition_ignores_positions_before_the_halfmove_clock():
+    assert not _is_repetition([1, 2, 1, 2, 3, 4], 1, 4)
+    assert not _is_repetition([1, 1, 1], 1, 3)
+
+
+def test_search_takes_the_repetition_draw():
+    board = play(START, SHUFFLE)
+
+    result = find_best_move(board, DEFAULT_EVAL_CODE, depth=2, shortcuts=False)
+
+    assert result["ai_move"] == "f6g8"
+    assert result["search_tree"].value[0] == 0.0
+
@@ -0,0 +1,82 @@
+from response_cache import ENTRY_OVERHEAD_BYTES, ResponseCache
+
+
+def entry_size(body):
+    return len(body) + ENTRY_OVERHEAD_BYTES
+
+
+def test_hit_and_miss_are_counted():
+    cache = ResponseCache(max_bytes=10_000)
+    cache.put("a", b"payload")
+
+    assert cache.get("a") == b"payload"
+    assert cache.get("b") is None
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_hit_rate_is_none_before_any_lookup():
+    assert ResponseCache(max_bytes=1000).get_stats()["hit_rate"] is None
+
+
+def test_least_recently_used_entry_is_evicted_by_bytes():
+    body = b"x" * 100
+    cache = ResponseCache(max_bytes=3 * entry_size(body))
+    for key in "abc":
+        cache.put(key, body)
+    cache.get("a")
+
+    cache.put("d", body)
+
+    assert cache.get("b") is None
+    assert all(cache.get(key) == body for key in "acd")
+    stats = cache.get_stats()
+    assert stats["evictions"] == 1
+    assert stats["bytes"] == 3 * entry_size(body) <= stats["max_bytes"]
+
+
+def test_large_entry_evicts_several_small_ones():
+    cache = ResponseCache(max_bytes=1000)
+    for key in "abc":
+        cache.put(key, b"x" * 50)
+
+    cache.put("big", b"y" * 500)
+
+    assert cache.get_stats()["evictions"] == 2
+    assert cache.get("c") == b"x" * 50
+    assert cache.get("big") == b"y" * 500
+
+
+def test_body_larger_than_budget_is_not_stored():
+    cache = ResponseCache(max_bytes=1000)
+    cache.put("a", b"small")
+
+    cache.put("huge", b"z" * 1000)
+
+    assert cache.get("huge") is None
+    assert cache.get("a") == b"small"
+    assert cache.get_stats()["evictions"] == 0
+
+
+def test_replacing_a_key_updates_bytes():
+    cache = ResponseCache(max_bytes=10_000)
+    cache.put("a", b"x" * 100)
+    cache.put("a", b"x" * 10)
+
+    stats = cache.get_stats()
+    assert (stats["entries"], stats["bytes"]) == (1, entry_size(b"x" * 10))
+    assert cache.get("a") == b"x" * 10
+
+
+def test_clear_empties_the_cache_but_keeps_counters():
+    cache = ResponseCache(max_bytes=10_000)
+    cache.put("a", b"payload")
+    cache.get("a")
+
+    cache.clear()
+
+    assert cache.get("a") is None
+    stats = cache.get_stats()
+    assert (stats["entries"], stats["bytes"], stats["hits"]) == (0, 0, 1)
+    assert set(stats) == {"entries", "bytes", "max_bytes", "hits", "misses",
+                          "hit_rate", "evictions"}
@@ -0,0 +1,84 @@
+import struct
+
+import chess
+import chess.polyglot
+import pytest
+
+from chess_engine import CHECKMATE_SCORE, DEFAULT_EVAL_CODE, find_best_move, find_shortcut
+
+
+def polyglot_move(move):
+    return (chess.square_file(move.to_square) | chess.square_rank(move.to_square) << 3
+            | chess.square_file(move.from_square) << 6
+            | chess.square_rank(move.from_square) << 9)
+
+
+@pytest.fixture
+def book(tmp_path):
+    """Book with two weighted replies to 1. e4."""
+    board = chess.Board()
+    board.push_san("e4")
+    key = chess.polyglot.zobrist_hash(board)
+    entries = [(key, polyglot_move(chess.Move.from_uci(uci)), weight)
+               for uci, weight in (("e7e5", 10), ("c7c5", 30))]
+    path = tmp_path / "book.bin"
+    path.write_bytes(b"".join(struct.pack(">QHHI", *entry, 0) for entry in sorted(entries)))
+    return str(path)
+
+
+def test_book_move_with_the_highest_weight(book):
+    board = chess.Board()
+    board.push_san("e4")
+
+    assert find_shortcut(board, book) == (chess.Move.from_uci("c7c5"), "book", None)
+
+
+def test_position_out_of_book_is_searched(book):
+    board = chess.Board()
+    board.push_san("d4")
+
+    assert find_shortcut(board, book) is None
+
+
+def test_missing_book_is_ignored(tmp_path):
+    board = chess.Board()
+    board.push_san("e4")
+
+    assert find_shortcut(board, str(tmp_path / "missing.bin")) is None
+
+
+def test_single_legal_move():
+    # Black king in check from the rook, a single escape square
+    board = chess.Board("k7/8/1K6/8/8/8/8/R7 b - - 0 1")
+
+    move, reason, value = find_shortcut(board)
+
+    assert (move.uci(), reason, value) == ("a8b8", "single_move", None)
+
+
+def test_mate_in_one():
+    board = chess.Board("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1")
+
+    assert find_shortcut(board) == (chess.Move.from_uci("a1a8"), "mate_in_1", CHECKMATE_SCORE)
+
+
+def test_search_plays_the_shortcut_without_nodes(book):
+    board = chess.Board()
+    board.push_san("e4")
+
+    result = find_best_move(board, DEFAULT_EVAL_CODE, depth=3, shortcuts=True,
+                            book_path=book)
+
+    assert result["ai_move"] == "c7c5"
+    assert result["stats"]["shortcut"] == "book"
+    assert result["stats"]["nodes_explored"] == 0
+
+
+def test_shortcuts_are_off_by_default(book):
+    board = chess.Board()
+    board.push_san("e4")
+
+    result = find_best_move(board, DEFAULT_EVAL_CODE, depth=1, book_path=book)
+
+    assert result["stats"]["shortcut"] is None
+    assert result["stats"]["nodes_explored"] > 0
@@ -0,0 +1,84 @@
+import pickle
+
+import chess
+
+from chess_engine import (
+    DEFAULT_EVAL_CODE, TT_EXACT, TT_LOWER, TranspositionTable, find_best_move,
+)
+
+
+def test_probe_returns_stored_entry():
+    tt = TranspositionTable(size=16)
+    move = chess.Move.from_uci("e2e4")
+    tt.store(5, 3, TT_EXACT, 1.5, move)
+
+    assert tt.probe(5) == (5, 3, TT_EXACT, 1.5, move, 0)
+    assert tt.probe(6) is None
+    assert tt.get_stats()["hits"] == 1
+
+
+def test_other_key_in_slot_counts_as_collision():
+    tt = TranspositionTable(size=16)
+    tt.store(5, 3, TT_EXACT, 1.5, None)
+
+    assert tt.probe(5 + 16) is None
+    assert tt.collisions == 1
+
+
+def test_deeper_entry_of_current_search_is_kept():
+    tt = TranspositionTable(size=16)
+    tt.store(5, 4, TT_EXACT, 1.0, None)
+    tt.store(5 + 16, 2, TT_LOWER, 2.0, None)
+
+    assert tt.probe(5)[1] == 4
+
+
+def test_entry_of_older_search_is_replaced():
+    tt = TranspositionTable(size=16)
+    tt.store(5, 4, TT_EXACT, 1.0, None)
+    tt.new_search()
+    tt.store(5 + 16, 2, TT_LOWER, 2.0, None)
+
+    assert tt.probe(5 + 16)[1:4] == (2, TT_LOWER, 2.0)
+    assert tt.used == 1
+
+
+def test_new_search_resets_counters_but_keeps_entries():
+    tt = TranspositionTable(size=16)
+    tt.store(5, 3, TT_EXACT, 1.5, None)
+    tt.probe(5)
+    tt.new_search()
+
+    assert tt.get_stats() == {"probes": 0, "hits": 0, "cutoffs": 0, "stores": 0,
+                              "collisions": 0}
+    assert tt.probe(5) is not None
+
+
+def test_pickle_round_trip():
+    tt = TranspositionTable(size=64)
+    tt.store(3, 2, TT_EXACT, -0.5, chess.Move.from_uci("g1f3"))
+    tt.store(7, 1, TT_LOWER, float("inf"), None)
+    tt.store(2**64 - 1, 5, TT_EXACT, 3.0, chess.Move.from_uci("a7a8q"))
+    tt.new_search()
+
+    copy = pickle.loads(pickle.dumps(tt))
+
+    assert copy.slots == tt.slots
+    assert (copy.size, copy.used, copy.generation) == (64, 3, 1)
+
+
+def test_pickle_round_trip_of_empty_table():
+    copy = pickle.loads(pickle.dumps(TranspositionTable(size=8)))
+
+    assert copy.slots == [None] * 8
+
+
+def test_table_reused_across_searches_gets_hits():
+    board = chess.Board()
+    tt = TranspositionTable()
+    first = find_best_move(board, DEFAULT_EVAL_CODE, depth=3, tt=tt, shortcuts=False)
+    second = find_best_move(board, DEFAULT_EVAL_CODE, depth=3, tt=tt, shortcuts=False)
+
+    assert second["ai_move"] == first["ai_move"]
+    assert second["stats"]["tt"]["hits"] > 0
+    assert second["stats"]["nodes_explored"] < first["stats"]["nodes_explored"]
@@ -12,6 +12,12 @@ from torch.utils.data import DataLoader
 
 class SimpleNN(nn.Module):
     """Fully connected neural network: 784 -> 128 -> 64 -> 10"""
+    # Activations shown by the visualizer: (name, module, call index)
+    ACTIVATION_LAYERS = [
+        ("fc1_relu", "relu", 0),
+        ("fc2_relu", "relu", 1),
+    ]
+
     def __init__(self):
         super().__init__()
         self.fc1 = nn.Linear(784, 128)
@@ -29,6 +35,15 @@ class SimpleNN(nn.Module):
 
 class SimpleCNN(nn.Module):
     """CNN: Conv(32) -> Pool -> Conv(64) -> Pool -> FC(128) -> FC(10)"""
+    # Activations shown by the visualizer: (name, module, call index)
+    ACTIVATION_LAYERS = [
+        ("conv1", "relu", 0),
+        ("pool1", "pool", 0),
+        ("conv2", "relu", 1),
+        ("pool2", "pool", 1),
+        ("fc1_relu", "relu", 2),
+    ]
+
     def __init__(self):
         super().__init__()
         self.conv1 = nn.Conv2d(1, 32, kernel_size=3, padding=1)